@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Makelaar Contract Generator - ASGI Entry Point
+Async deployment: trage uploads, downloads en SSE streams bezetten geen worker,
+enkel de verwerking van een request gebruikt een thread (ASGI_THREADS per worker).
+
+Starten:
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2 --limit-concurrency 1000 --timeout-keep-alive 30
+
+Of met gunicorn als process manager (herstart van workers, graceful reload):
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:$PORT --workers 2 --timeout 120
+
+Richtwaarden per worker: ASGI_THREADS=32 gelijktijdige Flask views, --limit-concurrency
+voor het totaal aantal open verbindingen (SSE streams en uploads tellen mee, views niet extra).
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from main import app as flask_app
+from backend.api import event_bus, warmup
+from backend.asgi import AsgiApp
+
+app = AsgiApp(flask_app, event_bus, startup=warmup.run)
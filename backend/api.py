@@ -4,40 +4,180 @@ Flask API voor Makelaar Contract Generator
 Production-ready version voor Replit deployment
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
+import io
 import os
 import json
+import re
+import time
 from datetime import datetime
 from pathlib import Path
 import uuid
 
+from backend.database import Database
+from backend.events import EventBus, parse_last_event_id, sse_handoff
+from backend.fields import DOCUMENT_TYPES, coerce
+from backend.generation import (
+    CONTRACTS_FOLDER, BulkGenerator, DocumentStore, contract_ids_with_status,
+    generation_error, record_generation
+)
+from backend.jobs import JobQueue
+from backend.pdf_export import ConversionError, PdfExporter
+from backend.profiling import RequestProfiler
+from backend.cache import ExtractionCache
+from backend.metrics import REQUEST_METRIC, STAGE_METRIC, metrics
+from backend.storage import BlobStore
+from backend.summary import SummaryCache, build_summary, summary_etag
+from backend.validation import (
+    current_validation, public_validation, revalidate, validate
+)
+from backend.warmup import Warmup
+from backend.uploads import (
+    ZIP_SIGNATURES, UploadError, doc_type_from_filename, iter_raw_chunks, iter_zip_documents,
+    sniff_chunks, stream_multipart_files, stream_multipart_upload
+)
+
 app = Flask(__name__)
 CORS(app)
 
 # Configuratie
 UPLOAD_FOLDER = 'backend/uploads'
-CONTRACTS_FOLDER = 'backend/generated_contracts'
 ALLOWED_EXTENSIONS = {'pdf', 'jpg', 'jpeg', 'png'}
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
 app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_FILE_SIZE', 16 * 1024 * 1024))
 
-# Simple in-memory database
-database = {
-    'contracts': {},
-    'documents': {}
-}
+# Gedeelde contract opslag (SQLite, WAL mode) - zichtbaar voor alle gunicorn workers
+database = Database()
+
+# Uploads: content-addressed, identieke bestanden worden één keer bewaard
+blob_store = BlobStore(database, UPLOAD_FOLDER)
+
+# Documentverwerking op de achtergrond (process pool per worker),
+# met een gedeelde cache op inhoud van het bestand
+extraction_cache = ExtractionCache(database)
+jobs = JobQueue(database, cache=extraction_cache)
+
+# Gegenereerde contracten: op schijf en/of in een LRU in geheugen (CONTRACT_STORAGE)
+documents = DocumentStore(CONTRACTS_FOLDER)
+
+# Bulk generatie over een eigen process pool (GENERATION_WORKERS)
+bulk_generator = BulkGenerator(database, documents)
+
+# PDF conversie door langlevende LibreOffice processen, op de achtergrond
+pdf_exporter = PdfExporter(database)
+
+# Samenvattingen per proces, ongeldig zodra de summary_revision van het contract wijzigt
+summary_cache = SummaryCache()
+
+# Server-sent events: de events tabel is de broker tussen workers
+event_bus = EventBus(database)
+
+# Imports, regexen, templates en een dummy render voor het eerste request (WARMUP)
+warmup = Warmup()
+
+# Latency histogrammen per proces, opgeteld in de metric_counters tabel (zie /api/metrics)
+metrics.bind(database)
+
+
+@app.before_request
+def start_request_timer():
+    request.environ['metrics.started'] = time.perf_counter()
+
+
+@app.after_request
+def record_request_duration(response):
+    # Bij streaming responses (SSE, downloads) enkel de tijd tot de eerste byte
+    started = request.environ.get('metrics.started')
+    if started is not None:
+        metrics.observe(
+            REQUEST_METRIC, time.perf_counter() - started,
+            endpoint=request.endpoint or 'unmatched', method=request.method,
+            status=response.status_code
+        )
+    return response
+
+
+# Profiling per request (X-Profile header); enkel met PROFILE_TOKEN, anders geen hooks
+profiler = RequestProfiler()
+
+
+def start_profile():
+    token = request.headers.get('X-Profile') or request.args.get('profile')
+    if token is not None and profiler.authorized(token):
+        request.environ['profile.sampler'] = profiler.start()
+        request.environ['profile.started'] = time.perf_counter()
+
+
+def save_profile(response):
+    sampler = request.environ.pop('profile.sampler', None)
+    if sampler is not None:
+        request_id = request.headers.get('X-Request-ID')
+        profile_id = profiler.profile_id(request_id)
+        profiler.save(profile_id, sampler, {
+            'request_id': request_id,
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - request.environ['profile.started']) * 1000, 1)
+        })
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+def stop_profile(exc):
+    # Onafgehandelde exception: after_request liep niet, de sampler moet toch stoppen
+    sampler = request.environ.pop('profile.sampler', None)
+    if sampler is not None:
+        sampler.stop()
+
+
+if profiler.enabled:
+    app.before_request(start_profile)
+    app.after_request(save_profile)
+    app.teardown_request(stop_profile)
+
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+# Segment van een ?fields= pad (form_data.koper_naam)
+FIELD_SEGMENT = re.compile(r'\w+')
+
+
+def check_doc_type(doc_type):
+    from backend.document_processor import DocumentProcessor
+    
+    if not doc_type:
+        raise UploadError('doc_type is verplicht')
+    if doc_type not in DocumentProcessor.PARSERS:
+        raise UploadError(f'Onbekend document type: {doc_type}')
+
+
+def check_filename(filename):
+    if not filename:
+        raise UploadError('Geen file geselecteerd')
+    if not allowed_file(filename):
+        raise UploadError('Invalid file type')
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint; pas gezond als de warmup klaar is"""
+    if not warmup.done:
+        warmup.start_background()
+        return jsonify({
+            'status': 'warming_up',
+            'timestamp': datetime.now().isoformat(),
+            'warmup': warmup.status()
+        }), 503
+
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
@@ -49,14 +189,15 @@ def health_check():
 def create_contract():
     """Maak een nieuw contract aan"""
     contract_id = str(uuid.uuid4())
-    database['contracts'][contract_id] = {
+    contract = {
         'id': contract_id,
         'created_at': datetime.now().isoformat(),
         'status': 'draft',
         'form_data': {},
-        'documents': {},
-        'validation': {}
+        'documents': {}
     }
+    contract['validation'] = validate(contract)
+    database.create_contract(contract)
     
     return jsonify({
         'success': True,
@@ -66,159 +207,474 @@ def create_contract():
 
 @app.route('/api/contract/<contract_id>/upload', methods=['POST'])
 def upload_document(contract_id):
-    """Upload en process een document"""
-    
-    if contract_id not in database['contracts']:
+    """
+    Upload een document
+    De body wordt in chunks gestreamd naar de blob store (geen buffering van
+    het hele bestand). Ondersteund:
+      - multipart/form-data met velden 'doc_type' en 'file'
+      - raw body (application/pdf, image/jpeg, image/png) met ?doc_type=&filename=
+    De extractie gebeurt op de achtergrond: het antwoord bevat een job id,
+    de status is op te volgen via /api/jobs/<job_id>.
+    """
+    
+    if not database.has_contract(contract_id):
         return jsonify({'error': 'Contract niet gevonden'}), 404
     
-    if 'file' not in request.files:
-        return jsonify({'error': 'Geen file gevonden'}), 400
+    pending = None
+    started = time.perf_counter()
     
-    file = request.files['file']
-    doc_type = request.form.get('doc_type')
+    def store_file(filename, form, chunks):
+        nonlocal pending
+        # doc_type vóór het bestand: meteen controleren, nog voor de data gelezen wordt
+        doc_type = form.get('doc_type') or request.args.get('doc_type')
+        if doc_type:
+            check_doc_type(doc_type)
+        check_filename(filename)
+        
+        extension, chunks = sniff_chunks(chunks)
+        pending = blob_store.write_chunks(chunks)
+        return filename, extension
     
-    if not doc_type:
-        return jsonify({'error': 'doc_type is verplicht'}), 400
+    try:
+        if request.mimetype == 'multipart/form-data':
+            boundary = request.mimetype_params.get('boundary')
+            if not boundary:
+                raise UploadError('Ongeldige multipart body')
+            form, stored = stream_multipart_upload(request.stream, boundary, store_file)
+            if stored is None:
+                raise UploadError('Geen file gevonden')
+            doc_type = form.get('doc_type') or request.args.get('doc_type')
+        else:
+            doc_type = request.args.get('doc_type')
+            check_doc_type(doc_type)
+            stored = store_file(
+                request.args.get('filename', f'{doc_type}.pdf'), {},
+                iter_raw_chunks(request.stream)
+            )
+        
+        filename, extension = stored
+        check_doc_type(doc_type)
+        
+        # Definitief bewaren (content-addressed) en aan het contract koppelen
+        blob = blob_store.commit(pending, extension, contract_id=contract_id, doc_type=doc_type)
+        pending = None
+        metrics.observe(STAGE_METRIC, time.perf_counter() - started, stage='upload_save', doc_type=doc_type)
+        
+        # Process document op de achtergrond (of meteen uit de cache)
+        job = jobs.submit_document(
+            contract_id, doc_type, secure_filename(filename),
+            blob['path'], blob['size'], blob['sha256']
+        )
+        
+        return jsonify({
+            'success': True,
+            'job_id': job['id'],
+            'status': job['status'],
+            'cached': job['cached'],
+            'sha256': blob['sha256'],
+            'deduplicated': blob['deduplicated'],
+            'status_url': f"/api/jobs/{job['id']}",
+            'message': f'Document {doc_type} wordt verwerkt'
+        }), 202
     
-    if file.filename == '':
-        return jsonify({'error': 'Geen file geselecteerd'}), 400
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
     
-    if file and allowed_file(file.filename):
-        try:
-            # Save file
-            filename = secure_filename(f"{contract_id}_{doc_type}_{file.filename}")
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            
-            # Process document
-            from backend.document_processor import DocumentProcessor
-            processor = DocumentProcessor()
-            extracted_data = processor.process_document(filepath, doc_type)
-            validation = processor.validate_extracted_data(extracted_data, doc_type)
-            
-            # Store in database
-            database['contracts'][contract_id]['documents'][doc_type] = {
-                'filename': filename,
-                'filepath': filepath,
-                'uploaded_at': datetime.now().isoformat(),
-                'extracted_data': extracted_data,
-                'validation': validation
-            }
-            
-            # Merge extracted data into form_data
-            database['contracts'][contract_id]['form_data'].update(extracted_data)
-            
-            return jsonify({
-                'success': True,
-                'extracted_data': extracted_data,
-                'validation': validation,
-                'message': f'Document {doc_type} verwerkt'
+    except HTTPException:
+        raise
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    finally:
+        if pending is not None:
+            blob_store.discard(pending)
+
+
+@app.route('/api/contract/<contract_id>/upload/batch', methods=['POST'])
+def upload_batch(contract_id):
+    """
+    Upload alle documenten van een dossier in één request
+    Ondersteund:
+      - multipart/form-data met meerdere bestanden: het veldnaam is het doc_type
+        (name="epc"), of 'file' voorafgegaan door een 'doc_type' veld
+      - een ZIP (als multipart deel of als raw body); het doc_type volgt uit de
+        bestandsnaam, bv. epc.pdf of kadaster_perceel12.pdf
+    De documenten worden parallel verwerkt in één batch job; de resultaten
+    worden in een vaste volgorde (DocumentProcessor.PARSERS) in form_data gemerged.
+    """
+    
+    if not database.has_contract(contract_id):
+        return jsonify({'error': 'Contract niet gevonden'}), 404
+    
+    from backend.document_processor import DocumentProcessor
+    
+    doc_types = list(DocumentProcessor.PARSERS)
+    pending = {}
+    skipped = []
+    
+    def store_document(doc_type, filename, extension, chunks):
+        if doc_type in pending:
+            raise UploadError(f'Document {doc_type} komt meer dan eens voor')
+        pending[doc_type] = (filename, extension, blob_store.write_chunks(chunks))
+    
+    def store_zip(chunks):
+        for filename, member_chunks in iter_zip_documents(chunks):
+            doc_type = doc_type_from_filename(filename, doc_types)
+            if doc_type is None or not allowed_file(filename):
+                skipped.append(filename)
+                continue
+            extension, member_chunks = sniff_chunks(member_chunks)
+            store_document(doc_type, os.path.basename(filename), extension, member_chunks)
+    
+    def store_part(name, filename, form, chunks):
+        if not filename:
+            return None
+        extension, chunks = sniff_chunks(chunks, ZIP_SIGNATURES)
+        if extension == 'zip':
+            store_zip(chunks)
+            return filename
+        
+        doc_type = form.get('doc_type') if name == 'file' else name
+        check_doc_type(doc_type)
+        check_filename(filename)
+        store_document(doc_type, filename, extension, chunks)
+        return filename
+    
+    try:
+        if request.mimetype == 'multipart/form-data':
+            boundary = request.mimetype_params.get('boundary')
+            if not boundary:
+                raise UploadError('Ongeldige multipart body')
+            stream_multipart_files(request.stream, boundary, store_part)
+        else:
+            extension, chunks = sniff_chunks(iter_raw_chunks(request.stream), ZIP_SIGNATURES)
+            if extension != 'zip':
+                raise UploadError('Een batch upload als raw body moet een ZIP zijn', 415)
+            store_zip(chunks)
+        
+        if not pending:
+            raise UploadError('Geen documenten gevonden')
+        
+        # Definitief bewaren in een vaste volgorde, onafhankelijk van de volgorde in de upload
+        documents = []
+        for doc_type in [d for d in doc_types if d in pending]:
+            filename, extension, blob_pending = pending.pop(doc_type)
+            blob = blob_store.commit(
+                blob_pending, extension, contract_id=contract_id, doc_type=doc_type
+            )
+            documents.append({
+                'doc_type': doc_type,
+                'filename': secure_filename(filename),
+                'filepath': blob['path'],
+                'size': blob['size'],
+                'sha256': blob['sha256'],
+                'deduplicated': blob['deduplicated']
             })
-            
-        except Exception as e:
-            return jsonify({
-                'success': False,
-                'error': str(e)
-            }), 500
+        
+        job = jobs.submit_batch(contract_id, documents)
+        
+        return jsonify({
+            'success': True,
+            'job_id': job['id'],
+            'status': job['status'],
+            'documents': [
+                {
+                    'doc_type': item['doc_type'],
+                    'filename': item['filename'],
+                    'sha256': item['sha256'],
+                    'deduplicated': item['deduplicated'],
+                    'cached': item['cached']
+                }
+                for item in job['items']
+            ],
+            'skipped': skipped,
+            'status_url': f"/api/jobs/{job['id']}",
+            'message': f'{len(documents)} documenten worden verwerkt'
+        }), 202
+    
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    except HTTPException:
+        raise
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
     
-    return jsonify({'error': 'Invalid file type'}), 400
+    finally:
+        for _, _, blob_pending in pending.values():
+            blob_store.discard(blob_pending)
 
 
-@app.route('/api/contract/<contract_id>/data', methods=['GET', 'POST'])
-def contract_data(contract_id):
-    """Get of update contract data"""
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status van een achtergrond job"""
+    
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job niet gevonden'}), 404
     
-    if contract_id not in database['contracts']:
+    return jsonify({
+        'success': True,
+        'job': job
+    })
+
+
+def event_stream(contract_id=None):
+    """SSE response; hervat na Last-Event-ID (header, of ?last_event_id= bij een eerste verbinding)"""
+    try:
+        last_event_id = parse_last_event_id(
+            request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    
+    # ASGI: de event loop streamt de events, de view bezet geen thread
+    handoff = sse_handoff(request.environ)
+    if handoff is not None:
+        handoff['subscription'] = event_bus.subscribe(contract_id, last_event_id, handoff['notify'])
+        return Response(iter(()), mimetype='text/event-stream', headers=headers)
+    
+    # Onder gunicorn gthread houdt elke stream een thread bezet: niet alle threads aan SSE geven
+    if not event_bus.acquire_stream():
+        return jsonify({'error': 'Te veel open event streams, probeer later opnieuw'}), 503, {'Retry-After': '30'}
+    
+    try:
+        subscription = event_bus.subscribe(contract_id, last_event_id)
+        response = Response(
+            stream_with_context(event_bus.stream(subscription)),
+            mimetype='text/event-stream',
+            headers=headers
+        )
+    except BaseException:
+        # Zonder response wordt call_on_close nooit aangeroepen
+        event_bus.release_stream()
+        raise
+    response.call_on_close(event_bus.release_stream)
+    return response
+
+
+@app.route('/api/events', methods=['GET'])
+def all_events():
+    """Server-sent events van alle contracten en jobs (overzicht, status badge)"""
+    return event_stream()
+
+
+@app.route('/api/contract/<contract_id>/events', methods=['GET'])
+def contract_events(contract_id):
+    """
+    Server-sent events van één contract
+    document.processed, validation.changed, contract.generated, contract.updated,
+    job.updated en contract.deleted, zodra ze in eender welke worker gebeuren.
+    """
+    if not database.has_contract(contract_id):
         return jsonify({'error': 'Contract niet gevonden'}), 404
+    return event_stream(contract_id)
+
+
+def parse_fields(value):
+    """?fields=form_data.koper_naam,validation -> [('form_data', 'koper_naam'), ('validation',)]"""
+    paths = []
+    for field in value.split(','):
+        field = field.strip()
+        if not field:
+            continue
+        path = tuple(field.split('.'))
+        if not all(FIELD_SEGMENT.fullmatch(segment) for segment in path):
+            raise ValueError(f'Ongeldig veld: {field}')
+        paths.append(path)
+    return paths
+
+
+def project(values):
+    """{('form_data', 'koper_naam'): 'X'} -> {'form_data': {'koper_naam': 'X'}}"""
+    result = {}
+    for path, value in values.items():
+        target = result
+        for segment in path[:-1]:
+            target = target.setdefault(segment, {})
+        target[path[-1]] = value
+    return result
+
+
+def merge_patch(target, patch):
+    """JSON merge-patch (RFC 7396): null verwijdert een veld, objecten worden recursief gemerged"""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def patched_fields(form_data, patch):
+    """Velden die de patch effectief wijzigt, en form_data na de patch"""
+    missing = object()
+    patched = merge_patch(form_data, patch)
+    changed = [
+        key for key in patch
+        if form_data.get(key, missing) != patched.get(key, missing)
+    ]
+    return changed, patched
+
+
+def version_etag(version):
+    return f'v{version}'
+
+
+@app.route('/api/contract/<contract_id>/data', methods=['GET', 'POST', 'PATCH'])
+def contract_data(contract_id):
+    """
+    Get of update contract data
+    GET ?fields=form_data.koper_naam,validation geeft enkel die delen terug.
+    POST/PATCH is een JSON merge-patch op form_data (null verwijdert een veld).
+    Met If-Match: "v<version>" wordt enkel geschreven als niemand het contract
+    intussen wijzigde (anders 412). Een patch die niets wijzigt schrijft niets.
+    """
     
     if request.method == 'GET':
-        return jsonify({
+        fields = request.args.get('fields')
+        if fields:
+            try:
+                paths = parse_fields(fields)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            values = database.get_contract_fields(contract_id, [('id',), ('version',)] + paths)
+            if values is None:
+                return jsonify({'error': 'Contract niet gevonden'}), 404
+            contract = project(values)
+        else:
+            contract = database.get_contract(contract_id)
+            if contract is None:
+                return jsonify({'error': 'Contract niet gevonden'}), 404
+        
+        response = jsonify({
             'success': True,
-            'data': database['contracts'][contract_id]
+            'data': contract
         })
+        response.set_etag(version_etag(contract.get('version', 0)))
+        return response
     
-    if request.method == 'POST':
-        new_data = request.json
-        database['contracts'][contract_id]['form_data'].update(new_data)
-        database['contracts'][contract_id]['updated_at'] = datetime.now().isoformat()
-        
-        return jsonify({
+    patch = request.get_json(silent=True)
+    if not isinstance(patch, dict):
+        return jsonify({'error': 'Verwacht een JSON object met velden'}), 400
+    
+    # Getypeerde waarden: bedragen worden hier één keer naar getallen omgezet
+    patch = coerce(patch)
+    
+    def conflict(version):
+        response = jsonify({
+            'error': 'Contract werd intussen gewijzigd, laad het opnieuw',
+            'version': version
+        })
+        response.set_etag(version_etag(version))
+        return response, 412
+    
+    # Snel pad zonder write lock: enkel form_data en versie, geen documenten
+    values = database.get_contract_fields(contract_id, [('form_data',), ('version',)])
+    if values is None:
+        return jsonify({'error': 'Contract niet gevonden'}), 404
+    version = values.get(('version',), 0)
+    if request.if_match and not request.if_match.contains(version_etag(version)):
+        return conflict(version)
+    
+    changed, _ = patched_fields(values.get(('form_data',), {}), patch)
+    if not changed:
+        response = jsonify({
             'success': True,
-            'message': 'Data bijgewerkt'
+            'message': 'Geen wijzigingen',
+            'changed': [],
+            'version': version
         })
+        response.set_etag(version_etag(version))
+        return response
+    
+    outcome = {}
+    
+    def apply_update(contract):
+        # Opnieuw binnen de transactie: een andere worker kan intussen geschreven hebben
+        current = contract.get('version', 0)
+        if request.if_match and not request.if_match.contains(version_etag(current)):
+            outcome['conflict'] = current
+            return False
+        
+        fields, contract['form_data'] = patched_fields(contract['form_data'], patch)
+        outcome['changed'] = fields
+        if not fields:
+            return False
+        contract['updated_at'] = datetime.now().isoformat()
+        # Enkel de regels die van de gewijzigde velden afhangen
+        revalidate(contract, fields=fields)
+    
+    contract = database.update_contract(contract_id, apply_update)
+    if contract is None:
+        return jsonify({'error': 'Contract niet gevonden'}), 404
+    if 'conflict' in outcome:
+        return conflict(outcome['conflict'])
+    
+    response = jsonify({
+        'success': True,
+        'message': 'Data bijgewerkt' if outcome['changed'] else 'Geen wijzigingen',
+        'changed': outcome['changed'],
+        'version': contract.get('version', 0)
+    })
+    response.set_etag(version_etag(contract.get('version', 0)))
+    return response
 
 
-@app.route('/api/contract/<contract_id>/validate', methods=['POST'])
-def validate_contract(contract_id):
-    """Valideer alle contract data"""
+@app.route('/api/contract/<contract_id>', methods=['DELETE'])
+def delete_contract(contract_id):
+    """Verwijder een contract samen met zijn uploads en gegenereerd document"""
     
-    if contract_id not in database['contracts']:
+    contract = database.delete_contract(contract_id)
+    if contract is None:
         return jsonify({'error': 'Contract niet gevonden'}), 404
     
-    contract = database['contracts'][contract_id]
-    form_data = contract['form_data']
-    
-    errors = []
-    warnings = []
-    
-    # Verplichte documenten
-    required_docs = ['epc', 'bodemattest', 'vip', 'kadaster', 'eigendomstitel', 'elektrisch']
-    for doc in required_docs:
-        if doc not in contract['documents']:
-            errors.append(f'Document {doc} is verplicht')
-    
-    # Verplichte velden
-    required_fields = {
-        'verkoper_naam': 'Naam verkoper',
-        'verkoper_voornaam': 'Voornaam verkoper',
-        'verkoper_adres': 'Adres verkoper',
-        'koper_naam': 'Naam koper',
-        'koper_voornaam': 'Voornaam koper',
-        'koper_adres': 'Adres koper',
-        'goed_straat': 'Straat van het goed',
-        'goed_nummer': 'Huisnummer',
-        'goed_postcode': 'Postcode',
-        'goed_gemeente': 'Gemeente',
-        'prijs_totaal': 'Totale koopprijs',
-        'voorschot_bedrag': 'Voorschot/Waarborg bedrag'
-    }
+    # Uploads worden vrijgegeven; de blob verdwijnt als geen ander contract ernaar verwijst
+    blob_store.release_contract(contract_id)
     
-    for field, label in required_fields.items():
-        if not form_data.get(field):
-            errors.append(f'{label} is verplicht')
+    paths = [
+        doc.get('filepath') for doc in contract.get('documents', {}).values()
+        if not doc.get('sha256')
+    ]
+    for path in paths:
+        if path and os.path.isfile(path):
+            os.remove(path)
     
-    # Business logic validaties
-    if form_data.get('prijs_totaal') and form_data.get('voorschot_bedrag'):
-        try:
-            prijs = float(form_data['prijs_totaal'])
-            voorschot = float(form_data['voorschot_bedrag'])
-            
-            if voorschot > prijs:
-                errors.append('Voorschot kan niet hoger zijn dan de koopprijs')
-            
-            if voorschot < 2500:
-                warnings.append('Voorschot is lager dan gebruikelijk minimum (€2.500)')
-            
-            if voorschot > prijs * 0.3:
-                warnings.append('Voorschot is hoger dan 30% van de koopprijs')
-                
-        except ValueError:
-            errors.append('Prijs en voorschot moeten numerieke waarden zijn')
-    
-    # Email validatie
-    for field in ['verkoper_email', 'koper_email']:
-        if form_data.get(field):
-            if '@' not in form_data[field]:
-                errors.append(f'{field} is geen geldig email adres')
-    
-    validation_result = {
-        'is_valid': len(errors) == 0,
-        'errors': errors,
-        'warnings': warnings,
-        'validated_at': datetime.now().isoformat()
-    }
+    documents.delete(contract)
+    summary_cache.discard(contract_id)
     
-    database['contracts'][contract_id]['validation'] = validation_result
+    return jsonify({
+        'success': True,
+        'message': 'Contract verwijderd'
+    })
+
+
+@app.route('/api/contract/<contract_id>/validate', methods=['POST'])
+def validate_contract(contract_id):
+    """Valideer alle contract data"""
+    
+    # Volledige herberekening; na elke write is de validatie al incrementeel bijgewerkt
+    def store_validation(contract):
+        contract['validation'] = validate(contract)
+    
+    contract = database.update_contract(contract_id, store_validation)
+    if contract is None:
+        return jsonify({'error': 'Contract niet gevonden'}), 404
+    validation_result = public_validation(contract['validation'])
     
     return jsonify({
         'success': True,
@@ -228,39 +684,79 @@ def validate_contract(contract_id):
 
 @app.route('/api/contract/<contract_id>/generate', methods=['POST'])
 def generate_contract(contract_id):
-    """Genereer het Word contract"""
-    
-    if contract_id not in database['contracts']:
+    """
+    Genereer het Word contract
+    Met ?format=pdf wordt het document daarna op de achtergrond naar PDF
+    geconverteerd: 202 met een job id, of meteen klaar als de PDF voor deze
+    versie van het document al bestaat.
+    """
+    
+    contract = database.get_contract(contract_id)
+    if contract is None:
         return jsonify({'error': 'Contract niet gevonden'}), 404
     
-    contract = database['contracts'][contract_id]
+    output_format = request.args.get('format', 'docx')
+    if output_format not in ('docx', 'pdf'):
+        return jsonify({'error': f'Onbekend formaat: {output_format}'}), 400
     
-    # Valideer eerst
-    validation = contract.get('validation', {})
-    if not validation.get('is_valid'):
+    # De validatie wordt bij elke write bijgehouden, een aparte /validate is niet nodig
+    error = generation_error(contract)
+    if error is not None:
         return jsonify({
             'success': False,
-            'error': 'Contract is niet valide. Valideer eerst.',
-            'errors': validation.get('errors', [])
+            'error': error,
+            'errors': current_validation(contract)['errors']
         }), 400
     
     try:
         from backend.word_generator import ContractGenerator
         generator = ContractGenerator()
         
-        output_filename = f"contract_{contract_id}.docx"
-        output_path = os.path.join(CONTRACTS_FOLDER, output_filename)
+        # Ongewijzigde data en template: het bestaande document is nog correct
+        fingerprint = generator.fingerprint(contract['form_data'])
+        unchanged = documents.is_current(contract, fingerprint)
+        data = None
         
-        # Genereer contract
-        generator.generate_simple_contract(contract['form_data'], output_path)
+        if not unchanged:
+            # Genereer contract in geheugen; op schijf enkel met CONTRACT_STORAGE=disk
+            data = generator.generate_bytes(contract['form_data'])
+            filename = documents.save(contract_id, fingerprint, data)
+            
+            record_generation(database, contract_id, filename, len(data), fingerprint)
         
-        database['contracts'][contract_id]['status'] = 'generated'
-        database['contracts'][contract_id]['generated_at'] = datetime.now().isoformat()
-        database['contracts'][contract_id]['output_file'] = output_filename
+        if output_format == 'pdf':
+            download_url = f'/api/contract/{contract_id}/download?format=pdf'
+            if pdf_exporter.cache.get(fingerprint):
+                return jsonify({
+                    'success': True,
+                    'format': 'pdf',
+                    'status': 'done',
+                    'unchanged': unchanged,
+                    'download_url': download_url
+                })
+            
+            if data is None:
+                data = documents.load(contract) or generator.generate_bytes(contract['form_data'])
+            try:
+                job = pdf_exporter.submit(contract_id, fingerprint, data)
+            except ConversionError as e:
+                return jsonify({'success': False, 'error': str(e)}), 503
+            
+            return jsonify({
+                'success': True,
+                'format': 'pdf',
+                'job_id': job['id'],
+                'status': job['status'],
+                'unchanged': unchanged,
+                'status_url': f"/api/jobs/{job['id']}",
+                'download_url': download_url,
+                'message': 'PDF wordt aangemaakt'
+            }), 202
         
         return jsonify({
             'success': True,
-            'message': 'Contract gegenereerd',
+            'message': 'Contract ongewijzigd' if unchanged else 'Contract gegenereerd',
+            'unchanged': unchanged,
             'download_url': f'/api/contract/{contract_id}/download'
         })
         
@@ -271,25 +767,133 @@ def generate_contract(contract_id):
         }), 500
 
 
+@app.route('/api/contracts/generate', methods=['POST'])
+def generate_contracts():
+    """
+    Genereer veel contracten in één call
+    Body: {"contract_ids": [...]} of {"status": "generated"}. Het renderen
+    wordt verdeeld over een process pool; een mislukt contract stopt de batch
+    niet. Antwoordt met een job id (202), de voortgang per contract is op te
+    volgen via /api/jobs/<job_id>. Met ?stream=1 volgt de response zelf de
+    voortgang als NDJSON (één regel per afgewerkt contract).
+    """
+    
+    payload = request.get_json(silent=True) or {}
+    
+    if 'contract_ids' in payload:
+        contract_ids = payload['contract_ids']
+        if not isinstance(contract_ids, list) or not all(isinstance(c, str) for c in contract_ids):
+            return jsonify({'error': 'contract_ids moet een lijst van ids zijn'}), 400
+    elif 'status' in payload:
+        contract_ids = contract_ids_with_status(database, payload['status'])
+    else:
+        return jsonify({'error': 'contract_ids of status is verplicht'}), 400
+    
+    contract_ids = list(dict.fromkeys(contract_ids))
+    if not contract_ids:
+        return jsonify({'error': 'Geen contracten om te genereren'}), 400
+    
+    job = bulk_generator.submit(contract_ids)
+    
+    if request.args.get('stream') in ('1', 'true'):
+        def follow_progress():
+            reported = set()
+            while True:
+                current = jobs.get_job(job['id'])
+                for index, item in enumerate(current['items']):
+                    if item['status'] != 'queued' and index not in reported:
+                        reported.add(index)
+                        yield json.dumps(dict(
+                            item, done=len(reported), total=current['total']
+                        )) + '\n'
+                
+                if current['status'] != 'queued':
+                    yield json.dumps({
+                        'job_id': current['id'],
+                        'status': current['status'],
+                        'total': current['total'],
+                        'generated': current['generated'],
+                        'failed': current['failed'],
+                        'error': current['error']
+                    }) + '\n'
+                    return
+                time.sleep(0.2)
+        
+        return Response(
+            stream_with_context(follow_progress()),
+            mimetype='application/x-ndjson',
+            headers={'X-Job-Id': job['id']}
+        )
+    
+    return jsonify({
+        'success': True,
+        'job_id': job['id'],
+        'status': job['status'],
+        'total': job['total'],
+        'status_url': f"/api/jobs/{job['id']}",
+        'message': f"{job['total']} contracten worden gegenereerd"
+    }), 202
+
+
 @app.route('/api/contract/<contract_id>/download', methods=['GET'])
 def download_contract(contract_id):
-    """Download het gegenereerde contract"""
-    
-    if contract_id not in database['contracts']:
+    """
+    Download het gegenereerde contract
+    De ETag is de fingerprint van het document: een herhaalde download met
+    If-None-Match krijgt een 304 zolang het contract niet opnieuw gegenereerd werd.
+    Het document komt uit de LRU of van schijf; ontbreekt het (CONTRACT_STORAGE=memory,
+    ander proces, of een vluchtige schijf na een redeploy) dan wordt het opnieuw gerenderd.
+    Met ?format=pdf: de PDF van de huidige versie (zie generate?format=pdf).
+    """
+    
+    contract = database.get_contract(contract_id)
+    if contract is None:
         return jsonify({'error': 'Contract niet gevonden'}), 404
     
-    contract = database['contracts'][contract_id]
     
     if 'output_file' not in contract:
         return jsonify({'error': 'Contract nog niet gegenereerd'}), 400
     
-    output_path = os.path.join(CONTRACTS_FOLDER, contract['output_file'])
+    fingerprint = contract.get('output_fingerprint')
     
-    if not os.path.exists(output_path):
-        return jsonify({'error': 'Bestand niet gevonden'}), 404
+    if request.args.get('format') == 'pdf':
+        pdf_path = fingerprint and pdf_exporter.cache.get(fingerprint)
+        if not pdf_path:
+            return jsonify({
+                'error': 'PDF nog niet aangemaakt',
+                'generate_url': f'/api/contract/{contract_id}/generate?format=pdf'
+            }), 404
+        return send_file(
+            pdf_path,
+            etag=f'{fingerprint}.pdf',
+            as_attachment=True,
+            download_name=f"verkoopovereenkomst_{datetime.now().strftime('%Y%m%d')}.pdf",
+            mimetype='application/pdf'
+        )
+    
+    # Revalidatie zonder het document te laden
+    if fingerprint and request.if_none_match.contains(fingerprint):
+        response = app.response_class(status=304)
+        response.set_etag(fingerprint)
+        return response
+    
+    data = documents.load(contract)
+    if data is None:
+        if generation_error(contract) is not None:
+            return jsonify({'error': 'Bestand niet gevonden'}), 404
+        
+        from backend.word_generator import ContractGenerator
+        generator = ContractGenerator()
+        
+        fingerprint = generator.fingerprint(contract['form_data'])
+        data = generator.generate_bytes(contract['form_data'])
+        filename = documents.save(contract_id, fingerprint, data)
+        if fingerprint != contract.get('output_fingerprint'):
+            record_generation(database, contract_id, filename, len(data), fingerprint)
     
     return send_file(
-        output_path,
+        io.BytesIO(data),
+        etag=fingerprint or False,
         as_attachment=True,
         download_name=f"verkoopovereenkomst_{datetime.now().strftime('%Y%m%d')}.docx",
         mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
@@ -298,25 +902,52 @@ def download_contract(contract_id):
 
 @app.route('/api/contracts', methods=['GET'])
 def list_contracts():
-    """List alle contracts"""
-    contracts = []
-    for contract_id, contract in database['contracts'].items():
-        contracts.append({
-            'id': contract_id,
-            'created_at': contract.get('created_at'),
-            'status': contract.get('status'),
-            'has_validation': 'validation' in contract,
-            'document_count': len(contract.get('documents', {}))
-        })
+    """
+    List contracts, nieuwste eerst
+    Query parameters: limit (max 500), after (cursor van vorige pagina), status
+    """
+    status = request.args.get('status') or None
+    after = request.args.get('after') or None
     
-    contracts.sort(key=lambda x: x['created_at'], reverse=True)
+    try:
+        limit = int(request.args.get('limit', 50))
+        contracts, next_cursor = database.page_contracts(limit=limit, after=after, status=status)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
         'success': True,
-        'contracts': contracts
+        'contracts': contracts,
+        'total': database.count_contracts(status),
+        'next_cursor': next_cursor
     })
 
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Latency histogrammen per endpoint en per stap, in Prometheus text format"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """Bewaarde request profielen (X-Profile header vereist)"""
+    if not profiler.authorized(request.headers.get('X-Profile') or request.args.get('profile')):
+        return jsonify({'error': 'Niet gevonden'}), 404
+    return jsonify({'profiles': profiler.list()})
+
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Eén profiel in folded stacks formaat (flamegraph.pl, speedscope)"""
+    if not profiler.authorized(request.headers.get('X-Profile') or request.args.get('profile')):
+        return jsonify({'error': 'Niet gevonden'}), 404
+    folded = profiler.load(profile_id)
+    if folded is None:
+        return jsonify({'error': 'Profiel niet gevonden'}), 404
+    return Response(folded, content_type='text/plain; charset=utf-8')
+
+
 @app.route('/api/documents/types', methods=['GET'])
 def get_document_types():
     """Geef lijst van ondersteunde document types"""
@@ -324,53 +955,12 @@ def get_document_types():
         'success': True,
         'document_types': [
             {
-                'id': 'epc',
-                'name': 'EPC (Energieprestatiecertificaat)',
-                'required': True,
-                'description': 'Energieprestatiecertificaat met label en score'
-            },
-            {
-                'id': 'bodemattest',
-                'name': 'Bodemattest',
-                'required': True,
-                'description': 'OVAM bodemattest voor bodemverontreiniging'
-            },
-            {
-                'id': 'vip',
-                'name': 'VIP-dossier (Stedenbouw)',
-                'required': True,
-                'description': 'Stedenbouwkundige informatie en vergunningen'
-            },
-            {
-                'id': 'kadaster',
-                'name': 'Kadastrale legger en plan',
-                'required': True,
-                'description': 'Kadastrale gegevens, sectie, nummer, oppervlakte'
-            },
-            {
-                'id': 'eigendomstitel',
-                'name': 'Eigendomstitel',
-                'required': True,
-                'description': 'Notariële akte met eigendomsgegevens'
-            },
-            {
-                'id': 'elektrisch',
-                'name': 'Elektrische keuring',
-                'required': True,
-                'description': 'Keuringsattest elektrische installatie'
-            },
-            {
-                'id': 'stookolie',
-                'name': 'Keuringattest stookolietank',
-                'required': False,
-                'description': 'Attest voor stookolietank indien aanwezig'
-            },
-            {
-                'id': 'asbestattest',
-                'name': 'Asbestattest',
-                'required': False,
-                'description': 'Asbestattest voor gebouwen van voor 2001'
+                'id': doc.id,
+                'name': doc.name,
+                'required': doc.required,
+                'description': doc.description
             }
+            for doc in DOCUMENT_TYPES
         ]
     })
 
@@ -379,97 +969,31 @@ def get_document_types():
 def get_contract_summary(contract_id):
     """Geef een samenvatting van het contract voor preview"""
     
-    if contract_id not in database['contracts']:
+    # Revisie uit een aparte kolom: geen JSON decode zolang de samenvatting gecached is
+    revision = database.get_summary_revision(contract_id)
+    if revision is None:
         return jsonify({'error': 'Contract niet gevonden'}), 404
     
-    contract = database['contracts'][contract_id]
-    form_data = contract['form_data']
-    
-    def calculate_completion():
-        total_items = 18
-        completed_items = 0
-        
-        required_docs = ['epc', 'bodemattest', 'vip', 'kadaster', 'eigendomstitel', 'elektrisch']
-        completed_items += len([d for d in required_docs if d in contract['documents']])
-        
-        required_fields = [
-            'verkoper_naam', 'verkoper_voornaam', 'verkoper_adres',
-            'koper_naam', 'koper_voornaam', 'koper_adres',
-            'goed_straat', 'goed_nummer', 'goed_postcode', 'goed_gemeente',
-            'prijs_totaal', 'voorschot_bedrag'
-        ]
-        completed_items += len([f for f in required_fields if form_data.get(f)])
-        
-        return round((completed_items / total_items) * 100) if total_items > 0 else 0
-    
-    summary = {
-        'contract_id': contract_id,
-        'status': contract['status'],
-        'created_at': contract['created_at'],
-        
-        'parties': {
-            'verkoper': {
-                'naam': form_data.get('verkoper_naam', ''),
-                'voornaam': form_data.get('verkoper_voornaam', ''),
-                'adres': form_data.get('verkoper_adres', ''),
-                'email': form_data.get('verkoper_email', ''),
-                'telefoon': form_data.get('verkoper_telefoonnummer', '')
-            },
-            'koper': {
-                'naam': form_data.get('koper_naam', ''),
-                'voornaam': form_data.get('koper_voornaam', ''),
-                'adres': form_data.get('koper_adres', ''),
-                'email': form_data.get('koper_email', ''),
-                'telefoon': form_data.get('koper_telefoonnummer', '')
-            }
-        },
-        
-        'property': {
-            'adres': f"{form_data.get('goed_straat', '')} {form_data.get('goed_nummer', '')}",
-            'postcode': form_data.get('goed_postcode', ''),
-            'gemeente': form_data.get('goed_gemeente', ''),
-            'kadaster': {
-                'afdeling': form_data.get('goed_kadastrale_afdeling', ''),
-                'sectie': form_data.get('goed_kadastrale_sectie', ''),
-                'nummer': form_data.get('goed_kadastrale_nummer', ''),
-                'oppervlakte': form_data.get('goed_kadastrale_oppervlakte', '')
-            }
-        },
-        
-        'financieel': {
-            'prijs_totaal': form_data.get('prijs_totaal', 0),
-            'voorschot': form_data.get('voorschot_bedrag', 0),
-            'saldo': float(form_data.get('prijs_totaal', 0) or 0) - float(form_data.get('voorschot_bedrag', 0) or 0)
-        },
-        
-        'documents': {
-            doc_type: {
-                'uploaded': True,
-                'filename': doc_data['filename'],
-                'validation': doc_data['validation']
-            }
-            for doc_type, doc_data in contract['documents'].items()
-        },
-        
-        'certificates': {
-            'epc': {
-                'code': form_data.get('epc_code', ''),
-                'label': form_data.get('epc_label', ''),
-                'datum': form_data.get('epc_datum', '')
-            },
-            'bodemattest': {
-                'referentie': form_data.get('bodem_attest_referentie', ''),
-                'datum': form_data.get('bodem_attest_datum', '')
-            }
-        },
-        
-        'completion_percentage': calculate_completion()
-    }
-    
-    return jsonify({
+    etag = summary_etag(contract_id, revision)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
+    summary = summary_cache.get(contract_id, revision)
+    if summary is None:
+        contract = database.get_contract(contract_id)
+        if contract is None:
+            return jsonify({'error': 'Contract niet gevonden'}), 404
+        summary = build_summary(contract)
+        summary_cache.put(contract_id, revision, summary)
+    
+    response = jsonify({
         'success': True,
         'summary': summary
     })
+    response.set_etag(etag)
+    return response
 
 
 # Error handlers
@@ -0,0 +1,218 @@
+# backend/asgi.py
+"""
+ASGI adapter voor de Flask app
+De vertaling WSGI -> ASGI gebeurt door a2wsgi (WSGIMiddleware, met een eigen
+thread pool voor de Flask views). Deze module voegt er drie dingen aan toe:
+
+  - de request body wordt asynchroon ingelezen (gespoold naar een tijdelijk
+    bestand) voor de view start: een trage upload bezet geen thread
+  - lifespan: synchroon opwarmen voor de worker requests aanneemt
+  - SSE: de view (met alle Flask hooks: CORS, metrics, profiling) valideert
+    en abonneert; de events zelf worden vanaf de event loop gestreamd, zie
+    backend.events.sse_handoff
+
+Downloads (send_file) lopen wel via een thread van de pool; de documenten
+zijn klein en a2wsgi begrenst wat er klaarstaat (backpressure).
+
+De Flask views zelf blijven synchroon (SQLite, python-docx en de process
+pools zijn dat ook); zie asgi.py in de root voor de deployment commando's.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from a2wsgi import WSGIMiddleware
+
+from backend.events import SSE_HANDOFF, format_event
+
+
+# Request bodies tot deze grootte blijven in geheugen, grotere gaan naar schijf
+SPOOL_MAX_SIZE = 1024 * 1024
+SPOOL_CHUNK_SIZE = 64 * 1024
+
+
+class AsgiApp:
+    """
+    Flask (WSGI) als ASGI applicatie, met async request bodies en SSE
+    Configuratie via environment:
+        ASGI_THREADS   threads per worker voor Flask views (default 32)
+    """
+
+    def __init__(self, wsgi_app, event_bus, threads: int = None, startup=None):
+        self.wsgi_app = wsgi_app
+        self.event_bus = event_bus
+        # Optioneel: synchroon opwarmen voor de worker requests aanneemt (lifespan startup)
+        self.startup = startup
+        self.threads = threads or int(os.getenv('ASGI_THREADS', 32))
+        self.max_body = wsgi_app.config.get('MAX_CONTENT_LENGTH')
+        self._lock = threading.Lock()
+        self._pid = None
+        self._middleware = None
+
+    def _get_middleware(self) -> WSGIMiddleware:
+        """Middleware (en zijn thread pool) per proces: na een fork (gunicorn + UvicornWorker) een nieuwe"""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._middleware = WSGIMiddleware(self.wsgi_app, workers=self.threads)
+                    self._pid = pid
+        return self._middleware
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        return self._get_middleware().executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        with SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as body:
+            replay = await self._spool_body(scope, receive, body)
+            if replay is None:
+                return
+
+            if scope['method'] == 'GET':
+                await self._get(scope, replay, send)
+            else:
+                await self._get_middleware()(scope, replay, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.startup is not None:
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(self.executor, self.startup)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._middleware is not None and self._pid == os.getpid():
+                    self._middleware.executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # ------------------------------------------------------------------
+    # Request body
+    # ------------------------------------------------------------------
+
+    async def _spool_body(self, scope, receive, body):
+        """
+        Lees de body asynchroon in `body`; geeft een receive terug die hem opnieuw afspeelt
+        Een te grote body (volgens Content-Length of na MAX_CONTENT_LENGTH bytes) wordt
+        niet verder gespoold: de rest gaat rechtstreeks naar Flask, dat met 413 antwoordt.
+        None als de client verdween.
+        """
+        declared = dict(scope.get('headers', [])).get(b'content-length')
+        too_large = (
+            self.max_body is not None and declared is not None
+            and declared.isdigit() and int(declared) > self.max_body
+        )
+
+        received = 0
+        more_body = not too_large
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            body.write(chunk)
+            received += len(chunk)
+            more_body = message.get('more_body', False)
+            if more_body and self.max_body is not None and received > self.max_body:
+                break
+        body.seek(0)
+
+        # Niet volledig gespoold: na de gespoolde data volgt de rest van de client
+        state = {'replayed': False, 'passthrough': too_large or more_body}
+
+        async def replay():
+            if not state['replayed']:
+                chunk = body.read(SPOOL_CHUNK_SIZE)
+                state['replayed'] = body.tell() >= received
+                return {
+                    'type': 'http.request', 'body': chunk,
+                    'more_body': not state['replayed'] or state['passthrough']
+                }
+            message = await receive()
+            if state['passthrough']:
+                state['passthrough'] = message.get('more_body', False)
+            return message
+
+        return replay
+
+    # ------------------------------------------------------------------
+    # Server-sent events
+    # ------------------------------------------------------------------
+
+    async def _get(self, scope, receive, send):
+        """GET via Flask; neemt een SSE response over als de view een stream opende"""
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        handoff = {'notify': lambda: loop.call_soon_threadsafe(wake.set)}
+        scope = dict(scope, **{SSE_HANDOFF: handoff})
+        status = {}
+
+        async def send_response(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            elif 'subscription' in handoff and status.get('code') == 200:
+                # De (lege) body van de view; de stream volgt hieronder
+                if message.get('body'):
+                    await send(dict(message, more_body=True))
+                return
+            await send(message)
+
+        try:
+            await self._get_middleware()(scope, receive, send_response)
+            if 'subscription' in handoff and status.get('code') == 200:
+                await self._stream(handoff['subscription'], wake, receive, send)
+        finally:
+            if 'subscription' in handoff:
+                self.event_bus.unsubscribe(handoff['subscription'])
+
+    async def _stream(self, subscription, wake: asyncio.Event, receive, send):
+        disconnect = asyncio.ensure_future(_wait_disconnect(receive))
+        try:
+            await _send_text(send, 'retry: 3000\n\n')
+
+            deadline = time.monotonic() + self.event_bus.max_stream_seconds
+            while not subscription.closed and not disconnect.done():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                wake.clear()
+                event = subscription.get()
+                while event is not None:
+                    await _send_text(send, format_event(event))
+                    event = subscription.get()
+
+                waiter = asyncio.ensure_future(wake.wait())
+                done, _ = await asyncio.wait(
+                    {waiter, disconnect}, timeout=min(self.event_bus.heartbeat, remaining),
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                waiter.cancel()
+                if not done:
+                    await _send_text(send, ': ping\n\n')
+
+            if not disconnect.done():
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            disconnect.cancel()
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _send_text(send, text: str):
+    await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
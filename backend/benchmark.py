@@ -0,0 +1,446 @@
+# backend/benchmark.py
+"""
+Benchmark van de pijplijn upload → validatie → generatie
+Draait de volledige API in-process (Flask test client) in een tijdelijke
+werkdirectory met een eigen database: per contract aanmaken, de gegevens van
+het demo dossier (/api/demo/populate) invullen, een synthetische PDF per
+verplicht document uploaden en wachten op de extractie, valideren, genereren
+en downloaden. Dat gebeurt voor elk concurrency niveau; daarnaast worden
+DocumentProcessor, ContractGenerator en de validatie rechtstreeks gemeten.
+
+Resultaat: contracten per seconde, p50/p95/p99 per stap en piek RSS (inclusief
+de process pools), als JSON om tussen commits te vergelijken. De stappen
+'upload' en 'extraction' zijn het totaal over alle documenten van een contract.
+
+CLI:
+    python -m backend.benchmark --contracts 40 --concurrency 1,4,8
+    python -m backend.benchmark --output after.json --compare before.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Tekst per document type, zodat de parsers hun velden in de tekstlaag vinden
+SYNTHETIC_TEXT = {
+    'epc': [
+        'ENERGIEPRESTATIECERTIFICAAT',
+        'Certificaatnummer: EPC-2024-{ref}',
+        'Datum: 15/03/2024',
+        'Label: C',
+        'Primair energieverbruik: 250 kWh/m2',
+    ],
+    'bodemattest': [
+        'BODEMATTEST OVAM',
+        'Referentie: OVAM-2024-{ref}',
+        'Datum: 10/02/2024',
+        'Geen bodemverontreiniging vastgesteld',
+    ],
+    'vip': [
+        'VASTGOEDINFORMATIEPLATFORM',
+        'Dossier {ref}',
+        'Bestemming: Woongebied',
+    ],
+    'kadaster': [
+        'KADASTRALE LEGGER',
+        'Afdeling: 1',
+        'Sectie: A',
+        'Perceel: 123/02A',
+        'Oppervlakte: 450 m2',
+    ],
+    'eigendomstitel': [
+        'EIGENDOMSTITEL',
+        'Akte {ref}',
+    ],
+    'elektrisch': [
+        'KEURINGSVERSLAG ELEKTRISCHE INSTALLATIE',
+        'Verslag {ref}',
+        'Datum keuring: 20/11/2023',
+    ],
+}
+
+FILLER = 'Dit document is synthetisch gegenereerd voor de benchmark. ' * 3
+
+
+def synthetic_pdf(lines: List[str], pages: int = 1) -> bytes:
+    """Minimale PDF met een tekstlaag; de velden staan op de laatste pagina"""
+    def escape(line):
+        return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)').encode('latin-1')
+
+    page_lines = [[FILLER] * 20 for _ in range(pages - 1)] + [lines]
+    objects = [b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>', None]
+    kids = []
+    for content in page_lines:
+        ops = b'BT /F1 10 Tf 50 750 Td 14 TL ' + b' '.join(b'(' + escape(l) + b") '" for l in content) + b' ET'
+        objects.append(b'<< /Length %d >>\nstream\n' % len(ops) + ops + b'\nendstream')
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R '
+            b'/Resources << /Font << /F1 1 0 R >> >> >>' % len(objects)
+        )
+        kids.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % kid for kid in kids), len(kids)
+    )
+    objects.append(b'<< /Type /Catalog /Pages 2 0 R >>')
+
+    out = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+        len(objects) + 1, len(objects), xref
+    )
+    return out
+
+
+def percentiles(samples: List[float]) -> Dict:
+    """p50/p95/p99 (nearest rank), gemiddelde en max in milliseconden"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+    return {
+        'count': len(ordered),
+        'p50_ms': round(rank(50) * 1000, 2),
+        'p95_ms': round(rank(95) * 1000, 2),
+        'p99_ms': round(rank(99) * 1000, 2),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2),
+    }
+
+
+def _rss_tree(pid: int = None) -> Optional[int]:
+    """RSS in bytes van een proces en al zijn kinderen (Linux /proc), None elders"""
+    pid = pid or os.getpid()
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            total = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        for task in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{task}/children') as f:
+                for child in f.read().split():
+                    total += _rss_tree(int(child)) or 0
+    except (OSError, ValueError):
+        return None
+    return total
+
+
+class RssSampler:
+    """Piek RSS van dit proces en zijn process pools tijdens een meting"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = _rss_tree()
+            if rss is None:
+                # Geen /proc: levenslange piek van dit proces (ru_maxrss in KB op Linux)
+                rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            self.peak = max(self.peak, rss)
+            self._stop.wait(self.interval)
+
+
+class Benchmark:
+    """Pijplijn benchmark over de Flask app; maak aan na het zetten van de environment"""
+
+    def __init__(self, pages: int = 2, unique_documents: bool = True, job_timeout: float = 120):
+        import main  # noqa: F401 - registreert /api/demo/populate
+        from backend.api import app, jobs, warmup
+
+        self.app = app
+        self.jobs = jobs
+        self.warmup = warmup
+        self.pages = pages
+        self.unique_documents = unique_documents
+        self.job_timeout = job_timeout
+        self._documents = {}
+
+        # Het demo dossier: alle velden die niet uit documenten komen
+        client = app.test_client()
+        contract_id = client.post('/api/demo/populate').get_json()['contract_id']
+        contract = client.get(f'/api/contract/{contract_id}/data').get_json()['data']
+        self.form_data = contract['form_data']
+        self.doc_types = list(contract['documents'])
+        client.delete(f'/api/contract/{contract_id}')
+
+    def document(self, doc_type: str) -> bytes:
+        """Synthetische PDF; standaard uniek per upload (geen hits in de extractie cache)"""
+        if not self.unique_documents and doc_type in self._documents:
+            return self._documents[doc_type]
+        ref = uuid.uuid4().hex[:8].upper()
+        lines = [line.format(ref=ref) for line in SYNTHETIC_TEXT.get(doc_type, [doc_type.upper(), ref])]
+        pdf = synthetic_pdf(lines, self.pages)
+        self._documents[doc_type] = pdf
+        return pdf
+
+    def run_pipeline(self, client) -> Dict[str, float]:
+        """Eén contract van aanmaak tot download; duur per stap in seconden"""
+        timings = {}
+        started = time.perf_counter()
+
+        def step(name, call, expected=(200,)):
+            step_started = time.perf_counter()
+            response = call()
+            timings[name] = timings.get(name, 0) + time.perf_counter() - step_started
+            if response.status_code not in expected:
+                raise RuntimeError(f'{name}: HTTP {response.status_code} {response.get_data(as_text=True)[:200]}')
+            return response
+
+        contract_id = step('create', lambda: client.post('/api/contract/create')).get_json()['contract_id']
+        step('data', lambda: client.post(f'/api/contract/{contract_id}/data', json=self.form_data))
+
+        for doc_type in self.doc_types:
+            pdf = self.document(doc_type)
+            response = step('upload', lambda: client.post(
+                f'/api/contract/{contract_id}/upload',
+                data={'doc_type': doc_type, 'file': (io.BytesIO(pdf), f'{doc_type}.pdf')},
+                content_type='multipart/form-data'
+            ), expected=(202,))
+
+            extraction_started = time.perf_counter()
+            job = self.jobs.wait(response.get_json()['job_id'], self.job_timeout)
+            timings['extraction'] = timings.get('extraction', 0) + time.perf_counter() - extraction_started
+            if job is None or job['status'] != 'done':
+                raise RuntimeError(f"extractie {doc_type}: {job and job.get('error')}")
+
+        step('validate', lambda: client.post(f'/api/contract/{contract_id}/validate'))
+        step('generate', lambda: client.post(f'/api/contract/{contract_id}/generate'))
+        step('download', lambda: client.get(f'/api/contract/{contract_id}/download'))
+
+        timings['pipeline'] = time.perf_counter() - started
+        return timings
+
+    def run_level(self, concurrency: int, contracts: int) -> Dict:
+        """`contracts` pijplijnen met `concurrency` gelijktijdige clients"""
+        samples: Dict[str, List[float]] = {}
+        errors = []
+        lock = threading.Lock()
+        local = threading.local()
+
+        def one(_):
+            if not hasattr(local, 'client'):
+                local.client = self.app.test_client()
+            try:
+                timings = self.run_pipeline(local.client)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                return
+            with lock:
+                for name, seconds in timings.items():
+                    samples.setdefault(name, []).append(seconds)
+
+        with RssSampler() as rss:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(one, range(contracts)))
+            duration = time.perf_counter() - started
+
+        completed = len(samples.get('pipeline', []))
+        return {
+            'concurrency': concurrency,
+            'contracts': contracts,
+            'completed': completed,
+            'errors': len(errors),
+            'error_samples': errors[:5],
+            'duration_s': round(duration, 3),
+            'contracts_per_second': round(completed / duration, 3) if duration else 0,
+            'peak_rss_bytes': rss.peak,
+            'stages': {name: percentiles(values) for name, values in samples.items()},
+        }
+
+    def run_direct(self, iterations: int) -> Dict:
+        """De onderliggende klassen zonder HTTP, jobs of database"""
+        from backend.document_processor import DocumentProcessor
+        from backend.validation import validate
+        from backend.word_generator import ContractGenerator
+
+        samples: Dict[str, List[float]] = {}
+
+        def measure(name, call):
+            started = time.perf_counter()
+            call()
+            samples.setdefault(name, []).append(time.perf_counter() - started)
+
+        processor = DocumentProcessor()
+        generator = ContractGenerator()
+        contract = {'form_data': self.form_data, 'documents': {d: {} for d in self.doc_types}}
+
+        with tempfile.TemporaryDirectory() as folder:
+            paths = {}
+            for doc_type in self.doc_types:
+                paths[doc_type] = os.path.join(folder, f'{doc_type}.pdf')
+                with open(paths[doc_type], 'wb') as f:
+                    f.write(self.document(doc_type))
+
+            for _ in range(iterations):
+                for doc_type, path in paths.items():
+                    measure(f'process_document.{doc_type}', lambda: processor.process_document(path, doc_type))
+                measure('validate', lambda: validate(contract))
+                measure('fingerprint', lambda: generator.fingerprint(self.form_data))
+                measure('generate_bytes', lambda: generator.generate_bytes(self.form_data))
+
+        return {name: percentiles(values) for name, values in sorted(samples.items())}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, timeout=10, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(old: Dict, new: Dict) -> List[str]:
+    """Verschil in doorvoer en p95 van de volledige pijplijn per concurrency niveau"""
+    def change(before, after):
+        if not before:
+            return 'n.v.t.'
+        return f'{(after - before) / before * 100:+.1f}%'
+
+    previous = {level['concurrency']: level for level in old.get('levels', [])}
+    lines = [f"Vergelijking met {old.get('commit') or '?'} ({old.get('started_at', '?')})"]
+    for level in new['levels']:
+        before = previous.get(level['concurrency'])
+        if before is None:
+            continue
+        p95_before = before['stages'].get('pipeline', {}).get('p95_ms', 0)
+        p95_after = level['stages'].get('pipeline', {}).get('p95_ms', 0)
+        lines.append(
+            f"  concurrency {level['concurrency']:>3}: "
+            f"{before['contracts_per_second']} -> {level['contracts_per_second']} contracten/s "
+            f"({change(before['contracts_per_second'], level['contracts_per_second'])}), "
+            f"p95 {p95_before} -> {p95_after} ms ({change(p95_before, p95_after)})"
+        )
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark upload → validatie → generatie')
+    parser.add_argument('--contracts', type=int, default=20, help='contracten per concurrency niveau')
+    parser.add_argument('--concurrency', default='1,4,8', help='komma-gescheiden niveaus')
+    parser.add_argument('--pages', type=int, default=2, help="pagina's per synthetische PDF")
+    parser.add_argument('--direct-iterations', type=int, default=20,
+                        help='iteraties voor de rechtstreekse metingen (0 = overslaan)')
+    parser.add_argument('--reuse-documents', action='store_true',
+                        help='dezelfde PDF per doc_type (meet de extractie cache in plaats van de parsers)')
+    parser.add_argument('--executor', choices=('process', 'thread'), help='JOB_EXECUTOR voor de extractie')
+    parser.add_argument('--template', help='Word template (standaard: het eenvoudige contract)')
+    parser.add_argument('--no-warmup', action='store_true', help='koude start meten')
+    parser.add_argument('--output', help='JSON resultaat (default benchmark-<commit>-<tijd>.json)')
+    parser.add_argument('--compare', help='eerder JSON resultaat om mee te vergelijken')
+    parser.add_argument('--keep', action='store_true', help='werkdirectory niet opruimen')
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+    output = os.path.abspath(args.output or f"benchmark-{_git_commit() or 'local'}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    # Eigen database, uploads en gegenereerde contracten; voor de import van backend.api
+    workdir = tempfile.mkdtemp(prefix='makelaar-benchmark-')
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, 'benchmark.db')
+    os.environ['TEMPLATE_PATH'] = os.path.abspath(args.template) if args.template else os.path.join(workdir, 'geen-template.docx')
+    if args.executor:
+        os.environ['JOB_EXECUTOR'] = args.executor
+    if args.no_warmup:
+        os.environ['WARMUP'] = 'none'
+    sys.path.insert(0, str(ROOT))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+
+    try:
+        benchmark = Benchmark(pages=args.pages, unique_documents=not args.reuse_documents)
+        warmup = benchmark.warmup.run()
+
+        result = {
+            'commit': _git_commit(),
+            'started_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'config': {
+                'contracts': args.contracts,
+                'concurrency': levels,
+                'pages': args.pages,
+                'unique_documents': not args.reuse_documents,
+                'job_executor': os.getenv('JOB_EXECUTOR', 'process'),
+                'job_workers': benchmark.jobs.max_workers,
+                'template': args.template,
+                'doc_types': benchmark.doc_types,
+            },
+            'warmup': warmup,
+            'levels': [],
+        }
+
+        for concurrency in levels:
+            level = benchmark.run_level(concurrency, args.contracts)
+            result['levels'].append(level)
+            pipeline = level['stages'].get('pipeline', {})
+            print(
+                f"concurrency {concurrency:>3}: {level['contracts_per_second']:>7} contracten/s, "
+                f"p50 {pipeline.get('p50_ms')} ms, p95 {pipeline.get('p95_ms')} ms, "
+                f"p99 {pipeline.get('p99_ms')} ms, piek RSS {level['peak_rss_bytes'] / 2**20:.0f} MB, "
+                f"{level['errors']} fouten", flush=True
+            )
+
+        if args.direct_iterations:
+            result['direct'] = benchmark.run_direct(args.direct_iterations)
+
+        benchmark.jobs.shutdown()
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f'Resultaat: {output}')
+
+    if baseline is not None:
+        print('\n'.join(compare(baseline, result)))
+    return result
+
+
+if __name__ == '__main__':
+    main()
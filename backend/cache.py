@@ -0,0 +1,111 @@
+# backend/cache.py
+"""
+Extractie cache voor documentverwerking
+Content-addressed: de sleutel is de SHA-256 van het bestand + doc_type + parser versie.
+Hetzelfde EPC of kadaster uittreksel in meerdere dossiers wordt maar één keer verwerkt.
+"""
+
+import json
+import os
+import time
+from typing import Dict, Optional
+
+from backend.document_processor import MOCK_EXTRACTION, PARSER_VERSION
+
+
+CACHE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS extraction_cache (
+        key TEXT PRIMARY KEY,
+        sha256 TEXT NOT NULL,
+        doc_type TEXT NOT NULL,
+        parser_version INTEGER NOT NULL,
+        value TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS idx_extraction_cache_lru ON extraction_cache(last_used)',
+]
+
+
+class ExtractionCache:
+    """
+    Persistente LRU cache van extractie resultaten in de SQLite database
+    Gedeeld tussen alle gunicorn workers; begrensd op EXTRACTION_CACHE_SIZE entries.
+    """
+
+    def __init__(self, database, max_entries: int = None):
+        self.database = database
+        self.max_entries = max_entries or int(os.getenv('EXTRACTION_CACHE_SIZE', 1000))
+        with database.pool.transaction() as conn:
+            for statement in CACHE_SCHEMA:
+                conn.execute(statement)
+
+    @staticmethod
+    def key(file_hash: str, doc_type: str) -> str:
+        # Resultaten met mock waarden niet delen met echte extracties
+        suffix = ':mock' if MOCK_EXTRACTION else ''
+        return f'{file_hash}:{doc_type}:v{PARSER_VERSION}{suffix}'
+
+    def get(self, file_hash: str, doc_type: str) -> Optional[Dict]:
+        """Cached {'extracted_data', 'validation'} of None"""
+        key = self.key(file_hash, doc_type)
+        with self.database.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT value FROM extraction_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    'UPDATE extraction_cache SET last_used = ? WHERE key = ?',
+                    (time.time(), key)
+                )
+
+        self.database.increment_counter(
+            'extraction_cache.hits' if row is not None else 'extraction_cache.misses'
+        )
+        return json.loads(row['value']) if row is not None else None
+
+    def put(self, file_hash: str, doc_type: str, result: Dict):
+        """Bewaar een resultaat en verwijder de minst recent gebruikte entries"""
+        now = time.time()
+        with self.database.pool.transaction() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO extraction_cache
+                    (key, sha256, doc_type, parser_version, value, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    self.key(file_hash, doc_type), file_hash, doc_type, PARSER_VERSION,
+                    json.dumps(result, ensure_ascii=False), now, now
+                )
+            )
+            count = conn.execute('SELECT COUNT(*) FROM extraction_cache').fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    """
+                    DELETE FROM extraction_cache WHERE key IN (
+                        SELECT key FROM extraction_cache ORDER BY last_used ASC LIMIT ?
+                    )
+                    """,
+                    (count - self.max_entries,)
+                )
+
+    def clear(self):
+        with self.database.pool.transaction() as conn:
+            conn.execute('DELETE FROM extraction_cache')
+
+    def stats(self) -> Dict:
+        with self.database.pool.connection() as conn:
+            entries = conn.execute('SELECT COUNT(*) FROM extraction_cache').fetchone()[0]
+        counters = self.database.get_counters('extraction_cache.')
+        hits = counters.get('extraction_cache.hits', 0)
+        misses = counters.get('extraction_cache.misses', 0)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            'entries': entries,
+            'max_entries': self.max_entries
+        }
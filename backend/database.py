@@ -1,9 +1,17 @@
 """
 Database utilities
-Handles file system setup and optional Replit DB integration
+Handles file system setup, SQLite contract storage and optional Replit DB integration
 """
 
 import os
+import json
+import base64
+import queue
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
 
 def ensure_directories():
@@ -11,12 +19,13 @@ def ensure_directories():
     directories = [
         'backend/uploads',
         'backend/generated_contracts',
-        'backend/templates'
+        'backend/templates',
+        'backend/data'
     ]
-    
+
     for directory in directories:
         Path(directory).mkdir(parents=True, exist_ok=True)
-        
+
         # Create .gitkeep if directory is empty
         gitkeep = Path(directory) / '.gitkeep'
         if not gitkeep.exists() and not any(Path(directory).iterdir()):
@@ -25,13 +34,13 @@ def ensure_directories():
 def get_template_path():
     """Get the path to the Word template"""
     template_path = os.getenv('TEMPLATE_PATH', 'backend/templates/template.docx')
-    
+
     if not os.path.exists(template_path):
         raise FileNotFoundError(
             f"Template not found at {template_path}. "
             "Please upload your template.docx to backend/templates/"
         )
-    
+
     return template_path
 
 # Optional: Replit DB integration
@@ -42,57 +51,749 @@ except ImportError:
     HAS_REPLIT_DB = False
     replit_db = None
 
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS contracts (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        updated_at TEXT,
+        data TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS kv (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        contract_id TEXT,
+        status TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        finished_at TEXT,
+        data TEXT NOT NULL
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS idx_jobs_contract ON jobs(contract_id, created_at)',
+    """
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        contract_id TEXT,
+        type TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        data TEXT NOT NULL
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS idx_events_contract ON events(contract_id, id)',
+]
+
+# Gedenormaliseerde kolommen voor de contractenlijst (geen JSON decode nodig)
+# naam -> (definitie, backfill expressie voor bestaande rijen)
+CONTRACT_COLUMNS = {
+    'document_count': (
+        'INTEGER NOT NULL DEFAULT 0',
+        "(SELECT COUNT(*) FROM json_each(data, '$.documents'))"
+    ),
+    'has_validation': (
+        'INTEGER NOT NULL DEFAULT 0',
+        "json_type(data, '$.validation') IS NOT NULL"
+    ),
+    # Verhoogd bij elke wijziging aan SUMMARY_KEYS: sleutel van de summary cache en ETag
+    'summary_revision': (
+        'INTEGER NOT NULL DEFAULT 0',
+        '0'
+    ),
+}
+
+# Delen van een contract waarop de samenvatting gebaseerd is
+SUMMARY_KEYS = ('status', 'form_data', 'documents')
+
+# Secundaire indexen: lijst op aanmaakdatum, eventueel gefilterd op status
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_contracts_created ON contracts(created_at, id)',
+    'CREATE INDEX IF NOT EXISTS idx_contracts_status_created ON contracts(status, created_at, id)',
+]
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(created_at: str, contract_id: str) -> str:
+    """Opaque paginatie cursor (positie in de created_at index)"""
+    raw = json.dumps([created_at, contract_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str):
+    """Decodeer een cursor, ValueError bij ongeldige input"""
+    try:
+        created_at, contract_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError(f'Ongeldige cursor: {cursor}')
+    return str(created_at), str(contract_id)
+
+
+# Verhoog bij elke wijziging aan contract_counters(): bestaande tellers worden dan herberekend
+# (3: herstelt de blobs.* tellers die de migratie naar 2 op 0 zette)
+COUNTERS_VERSION = 3
+
+# Tellers die contract_counters() oplevert; enkel deze worden bij een migratie herberekend
+CONTRACT_COUNTER_NAMES = ('contracts', 'documents', 'generated', 'bytes.uploads', 'bytes.generated')
+CONTRACT_COUNTER_PREFIXES = ('contracts.status.', 'documents.type.')
+
+
+def contract_counters(contract: dict) -> dict:
+    """Tellers waartoe een contract bijdraagt (naam -> waarde)"""
+    if contract is None:
+        return {}
+
+    documents = contract.get('documents', {})
+    counters = {
+        'contracts': 1,
+        f"contracts.status.{contract.get('status', 'draft')}": 1,
+        'documents': len(documents),
+        'generated': 1 if contract.get('output_file') else 0,
+        'bytes.uploads': sum(doc.get('size', 0) for doc in documents.values()),
+        'bytes.generated': contract.get('output_size', 0),
+    }
+    for doc_type in documents:
+        counters[f'documents.type.{doc_type}'] = 1
+
+    return counters
+
+
+def contract_events(previous: dict, contract: dict, summary_changed: bool = False) -> list:
+    """Events die een write van een contract oplevert: [(type, data), ...]"""
+    if contract is None:
+        return [('contract.deleted', {})]
+    if previous is None:
+        return [('contract.created', {'status': contract.get('status', 'draft')})]
+
+    events = []
+    old_documents = previous.get('documents', {})
+    for doc_type, document in contract.get('documents', {}).items():
+        if old_documents.get(doc_type) != document:
+            events.append(('document.processed', {
+                'doc_type': doc_type,
+                'filename': document.get('filename'),
+                'job_id': document.get('job_id'),
+                'validation': document.get('validation')
+            }))
+
+    old_validation = previous.get('validation') or {}
+    validation = contract.get('validation') or {}
+    if any(old_validation.get(key) != validation.get(key)
+           for key in ('is_valid', 'errors', 'warnings')):
+        events.append(('validation.changed', {
+            'is_valid': validation.get('is_valid'),
+            'errors': validation.get('errors', []),
+            'warnings': validation.get('warnings', [])
+        }))
+
+    if contract.get('output_fingerprint') and \
+            previous.get('output_fingerprint') != contract.get('output_fingerprint'):
+        events.append(('contract.generated', {
+            'output_file': contract.get('output_file'),
+            'output_size': contract.get('output_size'),
+            'fingerprint': contract.get('output_fingerprint')
+        }))
+
+    if summary_changed:
+        events.append(('contract.updated', {
+            'status': contract.get('status', 'draft'),
+            'version': contract.get('version'),
+            'document_count': len(contract.get('documents', {}))
+        }))
+    return events
+
+
+# Velden van een job die in zijn events meegaan (voortgang van bulk jobs)
+JOB_EVENT_FIELDS = ('type', 'status', 'error', 'doc_type', 'total', 'done', 'generated', 'failed')
+
+
+class SQLitePool:
+    """
+    Kleine connection pool voor SQLite
+    Eén pool per proces: na een fork (gunicorn workers) wordt automatisch
+    een nieuwe pool opgebouwd, connecties worden nooit tussen processen gedeeld.
+    """
+
+    def __init__(self, path: str, size: int = 5, timeout: float = 30.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.is_memory = path == ':memory:'
+        if self.is_memory:
+            # Gedeelde in-memory database voor alle connecties van dit proces
+            self.uri = f'file:makelaar-{uuid.uuid4().hex}?mode=memory&cache=shared'
+        else:
+            self.uri = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._idle = None
+
+    def _ensure_pool(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._idle = queue.LifoQueue(maxsize=self.size)
+                    self._pid = pid
+
+    def _connect(self):
+        if self.is_memory:
+            conn = sqlite3.connect(self.uri, uri=True, timeout=self.timeout,
+                                   check_same_thread=False, isolation_level=None)
+        else:
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout={int(self.timeout * 1000)}')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Leen een connectie uit de pool (autocommit mode)"""
+        self._ensure_pool()
+        idle = self._idle
+        try:
+            conn = idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            try:
+                idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Schrijftransactie met BEGIN IMMEDIATE
+        Neemt meteen de write lock zodat read-modify-write tussen workers atomair is.
+        """
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            else:
+                conn.execute('COMMIT')
+
+
 class Database:
-    """Simple database abstraction that works with both memory and Replit DB"""
-    
-    def __init__(self):
+    """
+    Database abstraction
+    Contracten worden altijd in SQLite bewaard (WAL mode, gedeeld tussen workers).
+    Generieke key/value opslag gebruikt Replit DB indien geactiveerd, anders SQLite.
+    """
+
+    def __init__(self, path: str = None):
         self.use_replit = HAS_REPLIT_DB and os.getenv('USE_REPLIT_DB', 'false').lower() == 'true'
-        
-        if not self.use_replit:
-            # In-memory storage
-            self.storage = {
-                'contracts': {},
-                'documents': {}
+
+        self.path = path or os.getenv('DATABASE_PATH', 'backend/data/makelaar.db')
+        if self.path != ':memory:':
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.pool = SQLitePool(self.path, size=int(os.getenv('DATABASE_POOL_SIZE', 5)))
+        self.events_retention = int(os.getenv('EVENTS_RETENTION', 10000))
+        self._init_schema()
+
+    def _init_schema(self):
+        """Maak tabellen aan en migreer bestaande databases (idempotent)"""
+        with self.pool.transaction() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+            existing = {row['name'] for row in conn.execute('PRAGMA table_info(contracts)')}
+            for column, (definition, backfill) in CONTRACT_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE contracts ADD COLUMN {column} {definition}')
+                    conn.execute(f'UPDATE contracts SET {column} = {backfill}')
+
+            # Jobs over meerdere contracten (bulk generatie) hebben geen contract_id
+            job_columns = {row['name']: row for row in conn.execute('PRAGMA table_info(jobs)')}
+            if job_columns['contract_id']['notnull']:
+                conn.execute('ALTER TABLE jobs RENAME TO jobs_old')
+                conn.execute(SCHEMA[3])
+                conn.execute('INSERT INTO jobs SELECT * FROM jobs_old')
+                conn.execute('DROP TABLE jobs_old')
+                conn.execute(SCHEMA[4])
+
+            for statement in INDEXES:
+                conn.execute(statement)
+
+            row = conn.execute(
+                "SELECT value FROM kv WHERE key = 'schema.counters_version'"
+            ).fetchone()
+            if row is None or json.loads(row['value']) != COUNTERS_VERSION:
+                self._rebuild_counters(conn)
+                conn.execute(
+                    "INSERT OR REPLACE INTO kv (key, value) VALUES ('schema.counters_version', ?)",
+                    (json.dumps(COUNTERS_VERSION),)
+                )
+
+    def _rebuild_counters(self, conn):
+        """
+        Herbereken de contract tellers vanaf de contracten (enkel bij migratie)
+        Andere tellers (extraction_cache.*) blijven staan; blobs.* wordt herteld
+        uit de blobs tabel van de BlobStore als die al bestaat.
+        """
+        conn.execute(
+            f"DELETE FROM counters WHERE name IN ({', '.join('?' * len(CONTRACT_COUNTER_NAMES))})",
+            CONTRACT_COUNTER_NAMES
+        )
+        for prefix in CONTRACT_COUNTER_PREFIXES:
+            conn.execute(
+                'DELETE FROM counters WHERE name >= ? AND name < ?', (prefix, prefix + '\uffff')
+            )
+
+        totals = {}
+        for row in conn.execute('SELECT data FROM contracts'):
+            for name, value in contract_counters(json.loads(row['data'])).items():
+                totals[name] = totals.get(name, 0) + value
+
+        has_blobs = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'blobs'"
+        ).fetchone()
+        if has_blobs is not None:
+            row = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs').fetchone()
+            conn.execute("DELETE FROM counters WHERE name IN ('blobs.count', 'blobs.bytes')")
+            totals['blobs.count'], totals['blobs.bytes'] = row[0], row[1]
+        conn.executemany(
+            'INSERT INTO counters (name, value) VALUES (?, ?)',
+            [(name, value) for name, value in totals.items() if value]
+        )
+
+    def _apply_counters(self, conn, previous: dict, current: dict):
+        """Werk tellers incrementeel bij in dezelfde transactie als de write"""
+        old = contract_counters(previous)
+        new = contract_counters(current)
+        for name in old.keys() | new.keys():
+            delta = new.get(name, 0) - old.get(name, 0)
+            if delta:
+                self.bump_counter(conn, name, delta)
+
+    def bump_counter(self, conn, name: str, delta: int):
+        conn.execute(
+            """
+            INSERT INTO counters (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+            """,
+            (name, delta)
+        )
+
+    # ------------------------------------------------------------------
+    # Contracten
+    # ------------------------------------------------------------------
+
+    def _write_contract(self, conn, contract: dict, previous: dict = None):
+        summary_changed = previous is not None and any(
+            previous.get(key) != contract.get(key) for key in SUMMARY_KEYS
+        )
+        conn.execute(
+            """
+            INSERT INTO contracts
+                (id, status, created_at, updated_at, document_count, has_validation, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                status = excluded.status,
+                updated_at = excluded.updated_at,
+                document_count = excluded.document_count,
+                has_validation = excluded.has_validation,
+                summary_revision = summary_revision + ?,
+                data = excluded.data
+            """,
+            (
+                contract['id'],
+                contract.get('status', 'draft'),
+                contract['created_at'],
+                contract.get('updated_at'),
+                len(contract.get('documents', {})),
+                'validation' in contract,
+                json.dumps(contract, ensure_ascii=False),
+                int(summary_changed)
+            )
+        )
+        self._apply_counters(conn, previous, contract)
+        for event_type, data in contract_events(previous, contract, summary_changed):
+            self._emit(conn, event_type, contract['id'], data)
+
+    def create_contract(self, contract: dict) -> dict:
+        """Bewaar een nieuw contract"""
+        contract.setdefault('version', 1)
+        with self.pool.transaction() as conn:
+            self._write_contract(conn, contract)
+        return contract
+
+    def get_contract(self, contract_id: str):
+        """Haal een contract op, None als het niet bestaat"""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT data FROM contracts WHERE id = ?', (contract_id,)
+            ).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def has_contract(self, contract_id: str) -> bool:
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT 1 FROM contracts WHERE id = ?', (contract_id,)
+            ).fetchone()
+        return row is not None
+
+    def get_contract_fields(self, contract_id: str, paths):
+        """
+        Enkel de gevraagde delen van een contract, bv. [('form_data', 'koper_naam')]
+        De projectie gebeurt in SQLite: documenten en andere grote delen worden niet
+        gedecodeerd. Geeft {pad: waarde} voor de paden die bestaan, of None als het
+        contract niet bestaat. Padsegmenten moeten door de caller gevalideerd zijn.
+        """
+        paths = [tuple(path) for path in paths]
+        columns = ['1']
+        params = []
+        for path in paths:
+            json_path = '$' + ''.join(f'."{segment}"' for segment in path)
+            columns.append('json_type(data, ?), json_extract(data, ?)')
+            params.extend([json_path, json_path])
+        params.append(contract_id)
+
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                f'SELECT {", ".join(columns)} FROM contracts WHERE id = ?', params
+            ).fetchone()
+        if row is None:
+            return None
+
+        values = {}
+        for index, path in enumerate(paths):
+            value_type, value = row[1 + 2 * index], row[2 + 2 * index]
+            if value_type is None:
+                continue
+            if value_type in ('object', 'array'):
+                value = json.loads(value)
+            elif value_type in ('true', 'false'):
+                value = value_type == 'true'
+            values[path] = value
+        return values
+
+    def get_summary_revision(self, contract_id: str):
+        """Revisie van de samenvatting (zonder JSON decode), None als het contract niet bestaat"""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT summary_revision FROM contracts WHERE id = ?', (contract_id,)
+            ).fetchone()
+        return row['summary_revision'] if row else None
+
+    def update_contract(self, contract_id: str, mutate):
+        """
+        Atomaire read-modify-write van een contract
+        `mutate` krijgt het contract als dict en past het in place aan; geeft het
+        False terug, dan wordt er niets geschreven (geen wijziging of conflict).
+        Elke write verhoogt contract['version'] (optimistic concurrency).
+        Geeft het bijgewerkte contract terug, of None als het niet bestaat.
+        """
+        with self.pool.transaction() as conn:
+            row = conn.execute(
+                'SELECT data FROM contracts WHERE id = ?', (contract_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            previous = json.loads(row['data'])
+            contract = json.loads(row['data'])
+            if mutate(contract) is False:
+                return previous
+            contract['version'] = previous.get('version', 0) + 1
+            self._write_contract(conn, contract, previous)
+        return contract
+
+    def delete_contract(self, contract_id: str):
+        """Verwijder een contract, geeft het verwijderde contract terug (of None)"""
+        with self.pool.transaction() as conn:
+            row = conn.execute(
+                'SELECT data FROM contracts WHERE id = ?', (contract_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            contract = json.loads(row['data'])
+            conn.execute('DELETE FROM contracts WHERE id = ?', (contract_id,))
+            self._apply_counters(conn, contract, None)
+            for event_type, data in contract_events(contract, None):
+                self._emit(conn, event_type, contract_id, data)
+        return contract
+
+    def list_contracts(self, status: str = None):
+        """Alle contracten (volledige data), nieuwste eerst"""
+        query = 'SELECT data FROM contracts'
+        params = ()
+        if status:
+            query += ' WHERE status = ?'
+            params = (status,)
+        query += ' ORDER BY created_at DESC, id DESC'
+        with self.pool.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [json.loads(row['data']) for row in rows]
+
+    def page_contracts(self, limit: int = 50, after: str = None, status: str = None):
+        """
+        Eén pagina van de contractenlijst, nieuwste eerst
+        Loopt enkel over de (status, created_at, id) index: kost O(limit),
+        onafhankelijk van het totaal aantal contracten.
+        Geeft (items, next_cursor) terug; next_cursor is None op de laatste pagina.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        conditions = []
+        params = []
+        if status:
+            conditions.append('status = ?')
+            params.append(status)
+        if after:
+            conditions.append('(created_at, id) < (?, ?)')
+            params.extend(decode_cursor(after))
+
+        query = 'SELECT id, status, created_at, has_validation, document_count FROM contracts'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+        params.append(limit + 1)
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        items = [
+            {
+                'id': row['id'],
+                'created_at': row['created_at'],
+                'status': row['status'],
+                'has_validation': bool(row['has_validation']),
+                'document_count': row['document_count']
             }
-    
+            for row in rows[:limit]
+        ]
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor(last['created_at'], last['id'])
+
+        return items, next_cursor
+
+    def increment_counter(self, name: str, delta: int = 1):
+        """Losse teller (bv. cache hits), los van de contract tellers"""
+        with self.pool.connection() as conn:
+            self.bump_counter(conn, name, delta)
+
+    def get_counter(self, name: str) -> int:
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT value FROM counters WHERE name = ?', (name,)).fetchone()
+        return row['value'] if row else 0
+
+    def get_counters(self, prefix: str = '') -> dict:
+        """Alle tellers, optioneel beperkt tot een prefix"""
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                'SELECT name, value FROM counters WHERE name >= ? AND name < ?',
+                (prefix, prefix + '\uffff')
+            ).fetchall()
+        return {row['name']: row['value'] for row in rows}
+
+    def get_statistics(self) -> dict:
+        """Geaggregeerde statistieken uit de tellers, O(aantal tellers)"""
+        counters = self.get_counters()
+
+        def group(prefix):
+            return {
+                name[len(prefix):]: value
+                for name, value in counters.items()
+                if name.startswith(prefix) and value
+            }
+
+        # Uploads zijn gededupliceerd: fysieke grootte komt van de blob store
+        uploads = counters.get('blobs.bytes', 0)
+        generated = counters.get('bytes.generated', 0)
+        return {
+            'contracts_count': counters.get('contracts', 0),
+            'contracts_by_status': group('contracts.status.'),
+            'documents_count': counters.get('documents', 0),
+            'documents_by_type': group('documents.type.'),
+            'generated_count': counters.get('generated', 0),
+            'bytes_on_disk': {
+                'uploads': uploads,
+                'generated': generated,
+                'total': uploads + generated
+            },
+            'uploads_referenced_bytes': counters.get('bytes.uploads', 0),
+            'unique_uploads': counters.get('blobs.count', 0)
+        }
+
+    def count_contracts(self, status: str = None) -> int:
+        """Aantal contracten uit de tellers (geen table scan)"""
+        if status:
+            return self.get_counter(f'contracts.status.{status}')
+        return self.get_counter('contracts')
+
+    # ------------------------------------------------------------------
+    # Jobs (achtergrondverwerking)
+    # ------------------------------------------------------------------
+
+    def _write_job(self, conn, job: dict):
+        conn.execute(
+            """
+            INSERT INTO jobs (id, contract_id, status, created_at, finished_at, data)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                status = excluded.status,
+                finished_at = excluded.finished_at,
+                data = excluded.data
+            """,
+            (
+                job['id'],
+                job.get('contract_id'),
+                job['status'],
+                job['created_at'],
+                job.get('finished_at'),
+                json.dumps(job, ensure_ascii=False)
+            )
+        )
+        data = {'job_id': job['id']}
+        data.update({key: job[key] for key in JOB_EVENT_FIELDS if key in job})
+        self._emit(conn, 'job.updated', job.get('contract_id'), data)
+
+    def create_job(self, job: dict) -> dict:
+        with self.pool.transaction() as conn:
+            self._write_job(conn, job)
+        return job
+
+    def get_job(self, job_id: str):
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def update_job(self, job_id: str, **fields):
+        """Werk velden van een job bij, geeft de job terug (of None)"""
+        with self.pool.transaction() as conn:
+            row = conn.execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = json.loads(row['data'])
+            job.update(fields)
+            self._write_job(conn, job)
+        return job
+
+    # ------------------------------------------------------------------
+    # Events (server-sent events, zie backend/events.py)
+    # ------------------------------------------------------------------
+
+    def _emit(self, conn, event_type: str, contract_id: str, data: dict):
+        """Event in dezelfde transactie als de write die het veroorzaakt"""
+        cursor = conn.execute(
+            'INSERT INTO events (contract_id, type, created_at, data) VALUES (?, ?, ?, ?)',
+            (contract_id, event_type, datetime.now().isoformat(), json.dumps(data, ensure_ascii=False))
+        )
+        # Af en toe oude events opruimen; enkel nodig voor het herstarten van een stream
+        if cursor.lastrowid % 500 == 0:
+            conn.execute(
+                'DELETE FROM events WHERE id <= ?',
+                (cursor.lastrowid - self.events_retention,)
+            )
+
+    def last_event_id(self) -> int:
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT MAX(id) AS id FROM events').fetchone()
+        return row['id'] or 0
+
+    def events_since(self, after_id: int, contract_id: str = None, until_id: int = None,
+                     limit: int = 1000) -> list:
+        """Events na `after_id` (optioneel t.e.m. `until_id`), oudste eerst"""
+        query = 'SELECT id, contract_id, type, created_at, data FROM events WHERE id > ?'
+        params = [after_id]
+        if contract_id is not None:
+            query += ' AND contract_id = ?'
+            params.append(contract_id)
+        if until_id is not None:
+            query += ' AND id <= ?'
+            params.append(until_id)
+        query += ' ORDER BY id LIMIT ?'
+        params.append(limit)
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [
+            {
+                'id': row['id'],
+                'contract_id': row['contract_id'],
+                'type': row['type'],
+                'created_at': row['created_at'],
+                'data': json.loads(row['data'])
+            }
+            for row in rows
+        ]
+
+    # ------------------------------------------------------------------
+    # Generieke key/value opslag
+    # ------------------------------------------------------------------
+
     def get(self, key, default=None):
         """Get value from database"""
         if self.use_replit:
             return replit_db.get(key, default)
-        return self.storage.get(key, default)
-    
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT value FROM kv WHERE key = ?', (key,)).fetchone()
+        return json.loads(row['value']) if row else default
+
     def set(self, key, value):
         """Set value in database"""
         if self.use_replit:
             replit_db[key] = value
         else:
-            self.storage[key] = value
-    
+            with self.pool.transaction() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)',
+                    (key, json.dumps(value, ensure_ascii=False))
+                )
+
     def delete(self, key):
         """Delete value from database"""
         if self.use_replit:
             if key in replit_db:
                 del replit_db[key]
         else:
-            if key in self.storage:
-                del self.storage[key]
-    
+            with self.pool.transaction() as conn:
+                conn.execute('DELETE FROM kv WHERE key = ?', (key,))
+
     def keys(self):
         """Get all keys"""
         if self.use_replit:
             return replit_db.keys()
-        return self.storage.keys()
-    
+        with self.pool.connection() as conn:
+            return [row['key'] for row in conn.execute('SELECT key FROM kv')]
+
     def __getitem__(self, key):
         return self.get(key)
-    
+
     def __setitem__(self, key, value):
         self.set(key, value)
-    
+
     def __delitem__(self, key):
         self.delete(key)
-    
+
     def __contains__(self, key):
         if self.use_replit:
             return key in replit_db
-        return key in self.storage
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT 1 FROM kv WHERE key = ?', (key,)).fetchone() is not None
@@ -1,38 +1,93 @@
 # backend/document_processor.py
 """
 Document Processing Engine voor Makelaar Contract Generator
-Mock versie voor Replit (zonder zware OCR libraries)
+Leest de tekstlaag van PDF's pagina per pagina (PyPDF2), OCR enkel als fallback.
+Enkel velden die in de tekst gevonden worden komen in het resultaat; mock
+waarden voor ontbrekende velden alleen met MOCK_EXTRACTION=true (demo).
 """
 
+import os
 import re
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 import json
 import uuid
 
+from PyPDF2 import PdfReader
+from PyPDF2.errors import PdfReadError
+
+from backend.fields import EXTRACTED_REQUIRED
+from backend.metrics import metrics
+
+
+DATE_PATTERN = r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}'
+
+# Verhoog bij elke wijziging aan parsers of validatie: maakt de extractie cache ongeldig
+PARSER_VERSION = 4
+
+# Ontbrekende velden aanvullen met mock waarden (demo zonder echte documenten/OCR)
+MOCK_EXTRACTION = os.getenv('MOCK_EXTRACTION', 'false').lower() == 'true'
+
+
+def normalize_date(date_str: str) -> str:
+    """Zet dd/mm/yyyy (en varianten) om naar ISO formaat"""
+    for fmt in ['%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%d-%m-%y']:
+        try:
+            return datetime.strptime(date_str, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return date_str
+
 
 class DocumentParser:
     """Base class voor document parsing"""
     
+    # Veld -> regex; de eerste capture group (of de volledige match) is de waarde.
+    # Extractie stopt met pagina's lezen zodra al deze velden gevonden zijn.
+    FIELD_PATTERNS: Dict[str, str] = {}
+    DATE_FIELDS: List[str] = []
+    
     def __init__(self, text: str):
         self.text = text
         self.lines = [line.strip() for line in text.split('\n') if line.strip()]
     
-    def extract_date(self, pattern: str = r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}') -> Optional[str]:
-        """Extract datum in verschillende formaten"""
-        match = re.search(pattern, self.text)
-        if match:
-            date_str = match.group()
-            try:
-                for fmt in ['%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%d-%m-%y']:
-                    try:
-                        dt = datetime.strptime(date_str, fmt)
-                        return dt.strftime('%Y-%m-%d')
-                    except:
-                        continue
-            except:
-                return date_str
-        return None
+    @classmethod
+    def compiled_patterns(cls) -> Dict[str, re.Pattern]:
+        """Regexen worden één keer per parser klasse gecompileerd"""
+        if '_compiled' not in cls.__dict__:
+            cls._compiled = {
+                field: re.compile(pattern, re.IGNORECASE)
+                for field, pattern in cls.FIELD_PATTERNS.items()
+            }
+        return cls._compiled
+    
+    @classmethod
+    def find_fields_in(cls, text: str, fields) -> List[str]:
+        """Welke van `fields` komen voor in deze tekst"""
+        patterns = cls.compiled_patterns()
+        return [field for field in fields if patterns[field].search(text)]
+    
+    def extract_fields(self) -> Dict:
+        """Extract alle velden uit FIELD_PATTERNS die in de tekst voorkomen"""
+        data = {}
+        for field, pattern in self.compiled_patterns().items():
+            match = pattern.search(self.text)
+            if not match:
+                continue
+            value = next((group for group in match.groups() if group), match.group())
+            value = value.strip()
+            if field in self.DATE_FIELDS:
+                value = normalize_date(value)
+            data[field] = value
+        return data
+    
+    def parse(self) -> Dict:
+        """Enkel de velden die in de tekst gevonden werden"""
+        return self.extract_fields()
+    
+    def mock_data(self) -> Dict:
+        """Voorbeeldwaarden voor ontbrekende velden (MOCK_EXTRACTION)"""
+        return {}
     
     def find_field(self, keywords: List[str], after_keyword: bool = True) -> Optional[str]:
         """Zoek waarde na keyword"""
@@ -51,118 +106,138 @@ class DocumentParser:
 class EPCParser(DocumentParser):
     """Parser voor Energieprestatiecertificaat"""
     
-    def parse(self) -> Dict:
+    FIELD_PATTERNS = {
+        'epc_code': r'\b(EPC-\d{4}-[0-9A-Z]{4,8}(?:-[0-9A-Z]{4})?)\b|certificaatnummer\s*:?\s*([0-9A-Z][0-9A-Z-]{5,})',
+        'epc_datum': rf'datum[^\n\d]*({DATE_PATTERN})',
+        'epc_label': r'label\s*:?\s*([A-F]\+?)(?![\w])',
+        'epc_score': r'(\d+(?:[.,]\d+)?\s*kWh/m[²2])',
+    }
+    DATE_FIELDS = ['epc_datum']
+    
+    def mock_data(self) -> Dict:
         data = {}
-        
-        # Mock data voor demo
         data['epc_code'] = f'EPC-2024-{uuid.uuid4().hex[:8].upper()}'
         data['epc_datum'] = datetime.now().strftime('%Y-%m-%d')
         data['epc_label'] = 'C'
         data['epc_score'] = '250 kWh/m²'
-        
         return data
 
 
 class BodemattestParser(DocumentParser):
     """Parser voor Bodemattest van OVAM"""
     
-    def parse(self) -> Dict:
+    FIELD_PATTERNS = {
+        'bodem_attest_referentie': r'\b(OVAM-\d{4}-[0-9A-Z]+)\b|referentie\s*:?\s*([0-9A-Z][0-9A-Z/-]{3,})',
+        'bodem_attest_datum': rf'datum[^\n\d]*({DATE_PATTERN})',
+    }
+    DATE_FIELDS = ['bodem_attest_datum']
+    
+    def mock_data(self) -> Dict:
         data = {}
-        
-        # Mock data
         data['bodem_attest_referentie'] = f'OVAM-2024-{uuid.uuid4().hex[:6].upper()}'
         data['bodem_attest_datum'] = datetime.now().strftime('%Y-%m-%d')
         data['bodem_attest_inhoud'] = 'Geen bodemverontreiniging vastgesteld'
         data['bodem_activiteiten_geen'] = True
-        
         return data
 
 
 class KadasterParser(DocumentParser):
     """Parser voor Kadastrale documenten"""
     
-    def parse(self) -> Dict:
+    FIELD_PATTERNS = {
+        'goed_kadastrale_afdeling': r'afdeling\s*:?\s*(\w+)',
+        'goed_kadastrale_sectie': r'sectie\s*:?\s*([A-Z])\b',
+        'goed_kadastrale_nummer': r'(?:perceel|nummer)\s*:?\s*(\d+/\d{2}[A-Z]\d*)',
+        'goed_kadastrale_oppervlakte': r'oppervlakte\s*:?\s*(\d[\d.,]*\s*m[²2])',
+    }
+    
+    def mock_data(self) -> Dict:
         data = {}
-        
-        # Mock data
         data['goed_kadastrale_afdeling'] = '1'
         data['goed_kadastrale_sectie'] = 'A'
         data['goed_kadastrale_nummer'] = f'{uuid.uuid4().int % 1000}/02A'
         data['goed_kadastrale_oppervlakte'] = '450 m²'
         data['goed_kadastraal_inkomen_bedrag'] = '1250'
         data['goed_kadastraal_inkomen_bedraagt'] = True
-        
         return data
 
 
 class VIPParser(DocumentParser):
     """Parser voor VIP-dossier (Stedenbouw)"""
     
-    def parse(self) -> Dict:
+    FIELD_PATTERNS = {
+        'stedenbouw_meest_recente_bestemming': r'bestemming\s*:?[ \t]*([^\n]+)',
+    }
+    
+    def mock_data(self) -> Dict:
         data = {}
-        
-        # Mock data
         data['stedenbouw_meest_recente_bestemming'] = 'Woongebied'
         data['stedenbouw_vergunning_afgeleverd'] = True
         data['stedenbouw_plannenregister_goedgekeurd'] = True
         data['stedenbouw_uittreksel_datum'] = datetime.now().strftime('%Y-%m-%d')
         data['stedenbouw_in_verkaveling'] = False
         data['stedenbouw_inbreuken_geen'] = True
-        
         return data
 
 
 class ElektrischeKeuringParser(DocumentParser):
     """Parser voor Elektrische keuring"""
     
-    def parse(self) -> Dict:
+    FIELD_PATTERNS = {
+        'elektrische_keuring_datum': rf'(?:datum|keuring)[^\n\d]*({DATE_PATTERN})',
+    }
+    DATE_FIELDS = ['elektrische_keuring_datum']
+    
+    def mock_data(self) -> Dict:
         data = {}
-        
-        # Mock data
         data['elektrische_keuring_datum'] = datetime.now().strftime('%Y-%m-%d')
         data['elektrische_keuring_a1'] = True
         data['elektrisch_conform'] = True
-        
         return data
 
 
 class StookolietankParser(DocumentParser):
-    """Parser voor Stookolietank attest"""
+    """
+    Parser voor Stookolietank attest
+    Geen FIELD_PATTERNS: stookolietank_geen is een vaststelling van de makelaar,
+    geen waarde uit het attest. Zonder MOCK_EXTRACTION blijft het resultaat leeg.
+    """
     
-    def parse(self) -> Dict:
+    def mock_data(self) -> Dict:
         data = {}
-        
-        # Mock data
         data['stookolietank_geen'] = True
-        
         return data
 
 
 class EigendomstitelParser(DocumentParser):
     """Parser voor Eigendomstitel"""
     
-    def parse(self) -> Dict:
+    FIELD_PATTERNS = {
+        'erfdienstbaarheden_vermeld': r'erfdienstbaarhe(?:den|id)\s*:[ \t]*([^\n]+)',
+    }
+    
+    def mock_data(self) -> Dict:
         data = {}
-        
-        # Mock data
         data['erfdienstbaarheden_vermeld'] = 'Geen bijzondere erfdienstbaarheden'
-        
         return data
 
 
 class AsbestattestParser(DocumentParser):
     """Parser voor Asbestattest"""
     
-    def parse(self) -> Dict:
+    FIELD_PATTERNS = {
+        'asbestattest_code': r'\b(ASB-[0-9A-Z]{6,})\b|(?:attestcode|attestnummer)\s*:?\s*([0-9A-Z][0-9A-Z-]{5,})',
+        'asbestattest_datum': rf'datum[^\n\d]*({DATE_PATTERN})',
+    }
+    DATE_FIELDS = ['asbestattest_datum']
+    
+    def mock_data(self) -> Dict:
         data = {}
-        
-        # Mock data
         data['asbestattest_aanwezig'] = True
         data['asbestattest_code'] = f'ASB-{uuid.uuid4().hex[:10].upper()}'
         data['asbestattest_datum'] = datetime.now().strftime('%Y-%m-%d')
         data['asbestattest_veilig'] = True
         data['asbestattest_identificatie'] = 'Geen asbest geïdentificeerd'
-        
         return data
 
 
@@ -180,24 +255,96 @@ class DocumentProcessor:
         'asbestattest': AsbestattestParser,
     }
     
-    def __init__(self):
-        # Mock mode - geen echte OCR voor Replit
-        self.ocr_mode = 'mock'
+    def __init__(self, mock_extraction: bool = None):
+        self.mock_extraction = MOCK_EXTRACTION if mock_extraction is None else mock_extraction
+        # OCR enkel voor pagina's zonder tekstlaag: mock, easyocr of tesseract
+        self.ocr_mode = os.getenv('OCR_ENGINE', 'mock')
+        self.ocr_languages = os.getenv('OCR_LANGUAGES', 'nl,fr').split(',')
+        self._ocr_reader = None
     
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """
-        Mock text extraction
-        In productie met EasyOCR:
+    def ocr_image(self, image) -> str:
+        """OCR op één PIL image"""
+        if self.ocr_mode == 'easyocr':
+            import numpy
+            import easyocr
+            if self._ocr_reader is None:
+                self._ocr_reader = easyocr.Reader(self.ocr_languages, gpu=False)
+            return " ".join(self._ocr_reader.readtext(numpy.array(image), detail=0))
+        
+        if self.ocr_mode == 'tesseract':
+            import pytesseract
+            languages = {'nl': 'nld', 'fr': 'fra', 'en': 'eng'}
+            lang = '+'.join(languages.get(code, code) for code in self.ocr_languages)
+            return pytesseract.image_to_string(image, lang=lang)
+        
+        # Mock mode - geen OCR
+        return ""
+    
+    def ocr_pdf_page(self, pdf_path: str, page_number: int) -> str:
+        """Render één PDF pagina (1-based) en OCR ze"""
+        if self.ocr_mode == 'mock':
+            return ""
         
         from pdf2image import convert_from_path
-        images = convert_from_path(pdf_path)
-        text = ""
-        for image in images:
-            result = self.reader.readtext(image, detail=0)
-            text += " ".join(result) + "\n"
-        return text
+        images = convert_from_path(pdf_path, first_page=page_number, last_page=page_number)
+        return self.ocr_image(images[0]) if images else ""
+    
+    def iter_pdf_pages(self, pdf_path: str) -> Iterator[str]:
+        """
+        Stream de tekst van een PDF pagina per pagina
+        Born-digital PDF's gebruiken de tekstlaag; OCR enkel voor pagina's zonder tekst.
+        """
+        try:
+            reader = PdfReader(pdf_path, strict=False)
+            page_count = len(reader.pages)
+        except (PdfReadError, OSError, ValueError):
+            return
+        
+        for index in range(page_count):
+            try:
+                text = reader.pages[index].extract_text() or ""
+            except Exception:
+                text = ""
+            
+            if not text.strip():
+                text = self.ocr_pdf_page(pdf_path, index + 1)
+            
+            yield text
+    
+    def iter_document_pages(self, file_path: str) -> Iterator[str]:
+        """Stream pagina teksten van een PDF of afbeelding (jpg/png)"""
+        if file_path.lower().endswith('.pdf'):
+            yield from self.iter_pdf_pages(file_path)
+            return
+        
+        if self.ocr_mode == 'mock':
+            return
+        
+        from PIL import Image
+        with Image.open(file_path) as image:
+            yield self.ocr_image(image)
+    
+    def extract_text_from_pdf(self, pdf_path: str) -> str:
+        """Volledige tekst van een PDF"""
+        return "\n".join(self.iter_pdf_pages(pdf_path))
+    
+    def extract_text(self, file_path: str, parser_class=None) -> str:
         """
-        return f"Mock text extraction for {pdf_path}"
+        Lees pagina's tot de parser al zijn velden gevonden heeft
+        Zonder FIELD_PATTERNS (of zonder parser) wordt het hele document gelezen.
+        """
+        remaining = list(parser_class.FIELD_PATTERNS) if parser_class else []
+        pages = []
+        
+        for text in self.iter_document_pages(file_path):
+            pages.append(text)
+            if remaining:
+                found = parser_class.find_fields_in(text, remaining)
+                remaining = [field for field in remaining if field not in found]
+                if not remaining:
+                    break
+        
+        return "\n".join(pages)
     
     def process_document(self, file_path: str, doc_type: str) -> Dict:
         """Process een document en extract structured data"""
@@ -205,13 +352,18 @@ class DocumentProcessor:
         if doc_type not in self.PARSERS:
             return {'error': f'Onbekend document type: {doc_type}'}
         
-        # Mock text (in productie: echte OCR)
-        text = self.extract_text_from_pdf(file_path)
+        parser_class = self.PARSERS[doc_type]
+        
+        # Tekstlaag (of OCR) tot alle velden van deze parser gevonden zijn
+        with metrics.stage('extract_text', doc_type=doc_type):
+            text = self.extract_text(file_path, parser_class)
         
         # Parse met juiste parser
-        parser_class = self.PARSERS[doc_type]
-        parser = parser_class(text)
-        data = parser.parse()
+        with metrics.stage('parse', doc_type=doc_type):
+            parser = parser_class(text)
+            data = parser.parse()
+            if self.mock_extraction:
+                data = dict(parser.mock_data(), **data)
         
         # Add metadata
         data['_document_type'] = doc_type
@@ -223,19 +375,13 @@ class DocumentProcessor:
         """Valideer geëxtraheerde data en geef confidence score"""
         validation = {
             'is_valid': True,
-            'confidence': 0.95,  # Mock confidence
+            'confidence': 0.0,
             'missing_fields': [],
             'warnings': []
         }
         
-        # Document-specifieke validatie
-        required_fields = {
-            'epc': ['epc_code', 'epc_datum'],
-            'bodemattest': ['bodem_attest_referentie', 'bodem_attest_datum'],
-            'kadaster': ['goed_kadastrale_afdeling', 'goed_kadastrale_sectie'],
-            'vip': ['stedenbouw_meest_recente_bestemming'],
-            'elektrisch': ['elektrische_keuring_datum'],
-        }
+        # Document-specifieke validatie (verplichte velden per document in backend.fields)
+        required_fields = EXTRACTED_REQUIRED
         
         if doc_type in required_fields:
             for field in required_fields[doc_type]:
@@ -248,6 +394,8 @@ class DocumentProcessor:
             found = len([f for f in required_fields[doc_type] if f in data and data[f]])
             total = len(required_fields[doc_type])
             validation['confidence'] = found / total if total > 0 else 0
+        elif any(value for key, value in data.items() if not key.startswith('_')):
+            validation['confidence'] = 1.0
         
         return validation
 
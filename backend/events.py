@@ -0,0 +1,204 @@
+# backend/events.py
+"""
+Server-sent events voor de voortgang van contracten
+Events worden door de database geschreven in dezelfde transactie als de
+wijziging zelf (tabel `events`, zie Database._emit): contract aangemaakt,
+document verwerkt, validatie gewijzigd, contract gegenereerd, job status.
+De tabel is de broker tussen gunicorn workers: elke worker heeft één poller
+thread die nieuwe events ophaalt en verdeelt over zijn open streams, dus
+één query per interval ongeacht het aantal verbonden browsers. Zonder
+streams slaapt de poller.
+
+Een client die opnieuw verbindt met Last-Event-ID krijgt de gemiste events
+alsnog (zolang ze niet opgeruimd zijn, zie EVENTS_RETENTION).
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+
+class Subscription:
+    """Eén open stream: events van één contract, of alle events (contract_id None)"""
+
+    def __init__(self, contract_id: Optional[str], cursor: int, max_queue: int,
+                 notify: Callable = None):
+        self.contract_id = contract_id
+        self.cursor = cursor
+        self.closed = False
+        self.queue = queue.Queue(maxsize=max_queue)
+        # Optioneel: wordt opgeroepen (vanuit de poller thread) na elk nieuw event
+        self.notify = notify
+
+    def matches(self, event: Dict) -> bool:
+        return self.contract_id is None or event['contract_id'] == self.contract_id
+
+    def deliver(self, event: Dict):
+        if self.closed or event['id'] <= self.cursor:
+            return
+        try:
+            self.queue.put_nowait(event)
+            self.cursor = event['id']
+        except queue.Full:
+            # Te trage client: stream sluiten, de browser herstart met Last-Event-ID
+            self.closed = True
+        if self.notify is not None:
+            self.notify()
+
+    def get(self, timeout: float = None) -> Optional[Dict]:
+        """Volgend event; zonder timeout niet blokkerend"""
+        try:
+            if timeout is None:
+                return self.queue.get_nowait()
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """
+    Pub/sub over de events tabel, met één poller thread per proces
+    Configuratie via environment:
+        EVENTS_POLL_INTERVAL   seconden tussen twee queries naar de events tabel (default 0.25)
+        SSE_HEARTBEAT          seconden tussen keep-alive comments (default 15)
+        SSE_MAX_SECONDS        max duur van één stream; de browser verbindt opnieuw (default 300)
+        SSE_MAX_STREAMS        gelijktijdige streams per worker onder WSGI, elk houdt een thread
+                               bezet (default 4); daarboven 503 en de frontend pollt
+        EVENTS_RETENTION       aantal events dat bewaard blijft voor herstarts (default 10000)
+    """
+
+    def __init__(self, database, poll_interval: float = None):
+        self.database = database
+        self.poll_interval = poll_interval or float(os.getenv('EVENTS_POLL_INTERVAL', 0.25))
+        self.heartbeat = float(os.getenv('SSE_HEARTBEAT', 15))
+        self.max_stream_seconds = float(os.getenv('SSE_MAX_SECONDS', 300))
+        self.max_queue = 1000
+        self.max_streams = int(os.getenv('SSE_MAX_STREAMS', 4))
+        self._stream_slots = threading.BoundedSemaphore(self.max_streams)
+        self._lock = threading.Condition()
+        self._pid = None
+        self._subscriptions = set()
+        self._last_id = 0
+
+    def _ensure_poller(self):
+        """Poller thread per proces: threads overleven een fork niet"""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._subscriptions = set()
+                    thread = threading.Thread(target=self._poll, name='event-poller', daemon=True)
+                    thread.start()
+                    self._pid = pid
+
+    def subscribe(self, contract_id: str = None, last_event_id: int = None,
+                  notify: Callable = None) -> Subscription:
+        self._ensure_poller()
+        with self._lock:
+            if not self._subscriptions:
+                # De poller sliep: enkel events vanaf nu
+                self._last_id = self.database.last_event_id()
+
+            cursor = self._last_id if last_event_id is None else min(last_event_id, self._last_id)
+            subscription = Subscription(contract_id, cursor, self.max_queue, notify)
+
+            # Gemiste events (Last-Event-ID) tot waar de poller al is; daarna levert de poller
+            if last_event_id is not None:
+                for event in self.database.events_since(
+                        last_event_id, contract_id, until_id=self._last_id, limit=self.max_queue):
+                    subscription.deliver(event)
+                subscription.cursor = max(subscription.cursor, self._last_id)
+
+            self._subscriptions.add(subscription)
+            self._lock.notify_all()
+        return subscription
+
+    def acquire_stream(self) -> bool:
+        """Plaats voor een stream die een WSGI thread bezet houdt; False als alles bezet is"""
+        return self._stream_slots.acquire(blocking=False)
+
+    def release_stream(self):
+        self._stream_slots.release()
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            subscription.closed = True
+
+    def _poll(self):
+        while True:
+            with self._lock:
+                while not self._subscriptions:
+                    self._lock.wait()
+                after = self._last_id
+
+            try:
+                events = self.database.events_since(after, limit=self.max_queue)
+            except Exception:
+                events = []
+
+            with self._lock:
+                for event in events:
+                    for subscription in list(self._subscriptions):
+                        if subscription.matches(event):
+                            subscription.deliver(event)
+                    self._last_id = event['id']
+                # Volle batch: meteen verder, anders wachten tot het volgende interval
+                if len(events) < self.max_queue:
+                    self._lock.wait(self.poll_interval)
+
+    def stream(self, subscription: Subscription) -> Iterator[str]:
+        """SSE tekst voor een subscription; stopt na SSE_MAX_SECONDS of bij een trage client"""
+        deadline = time.monotonic() + self.max_stream_seconds
+        try:
+            yield 'retry: 3000\n\n'
+            while not subscription.closed and time.monotonic() < deadline:
+                event = subscription.get(min(self.heartbeat, max(deadline - time.monotonic(), 0.1)))
+                if event is None:
+                    yield ': ping\n\n'
+                    continue
+                yield format_event(event)
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'open_streams': len(self._subscriptions) if self._pid == os.getpid() else 0,
+                'last_event_id': self._last_id
+            }
+
+
+# Sleutel in de ASGI scope waarmee backend.asgi een SSE stream overneemt
+SSE_HANDOFF = 'makelaar.sse'
+
+
+def sse_handoff(environ: Dict) -> Optional[Dict]:
+    """
+    Overname van een SSE stream door de event loop (backend.asgi), None onder WSGI
+    De view valideert en abonneert zoals altijd (met alle Flask hooks) en zet de
+    subscription in het dict; de body wordt daarna async gestreamd.
+    """
+    return (environ.get('asgi.scope') or {}).get(SSE_HANDOFF)
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    """Last-Event-ID header of query parameter; ValueError als het geen getal is"""
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'Ongeldige Last-Event-ID: {value}')
+
+
+def format_event(event: Dict) -> str:
+    data = dict(event['data'], contract_id=event['contract_id'], created_at=event['created_at'])
+    return (
+        f"id: {event['id']}\n"
+        f"event: {event['type']}\n"
+        f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    )
@@ -0,0 +1,266 @@
+# backend/fields.py
+"""
+Veldschema van een contract
+Eén lijst van alle gekende velden (type, label, verplicht, uit welk document,
+groep) en documenttypes. Bij het importeren worden er opzoektabellen van
+gemaakt die validatie, samenvatting, generatie en documentverwerking delen.
+
+form_data wordt bij elke write omgezet naar getypeerde waarden (coerce):
+bedragen worden getallen, booleans echte booleans, tekst zonder witruimte
+rond. Wat niet omgezet kan worden blijft ongewijzigd staan, zodat de
+validatie er een melding voor kan geven.
+"""
+
+import re
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+class Field(NamedTuple):
+    name: str
+    label: str
+    type: str = 'text'              # text, money, number, bool, date, email
+    group: str = 'algemeen'
+    required: bool = False          # verplicht voor een geldig contract
+    source: Optional[str] = None    # document type waaruit het veld geëxtraheerd wordt
+    extracted: bool = False         # verplicht in de extractie van `source`
+    template: bool = False          # altijd aanwezig in de template context (leeg indien onbekend)
+
+
+class DocumentType(NamedTuple):
+    id: str
+    name: str
+    required: bool
+    description: str
+
+
+DOCUMENT_TYPES = [
+    DocumentType('epc', 'EPC (Energieprestatiecertificaat)', True,
+                 'Energieprestatiecertificaat met label en score'),
+    DocumentType('bodemattest', 'Bodemattest', True,
+                 'OVAM bodemattest voor bodemverontreiniging'),
+    DocumentType('vip', 'VIP-dossier (Stedenbouw)', True,
+                 'Stedenbouwkundige informatie en vergunningen'),
+    DocumentType('kadaster', 'Kadastrale legger en plan', True,
+                 'Kadastrale gegevens, sectie, nummer, oppervlakte'),
+    DocumentType('eigendomstitel', 'Eigendomstitel', True,
+                 'Notariële akte met eigendomsgegevens'),
+    DocumentType('elektrisch', 'Elektrische keuring', True,
+                 'Keuringsattest elektrische installatie'),
+    DocumentType('stookolie', 'Keuringattest stookolietank', False,
+                 'Attest voor stookolietank indien aanwezig'),
+    DocumentType('asbestattest', 'Asbestattest', False,
+                 'Asbestattest voor gebouwen van voor 2001'),
+]
+
+
+FIELDS = [
+    # Verkoper
+    Field('verkoper_naam', 'Naam verkoper', group='verkoper', required=True, template=True),
+    Field('verkoper_voornaam', 'Voornaam verkoper', group='verkoper', required=True, template=True),
+    Field('verkoper_adres', 'Adres verkoper', group='verkoper', required=True, template=True),
+    Field('verkoper_email', 'Email verkoper', 'email', group='verkoper'),
+    Field('verkoper_telefoonnummer', 'Telefoon verkoper', group='verkoper'),
+    Field('verkoper_natuurlijk_persoon', 'Verkoper is natuurlijk persoon', 'bool', group='verkoper'),
+
+    # Koper
+    Field('koper_naam', 'Naam koper', group='koper', required=True, template=True),
+    Field('koper_voornaam', 'Voornaam koper', group='koper', required=True, template=True),
+    Field('koper_adres', 'Adres koper', group='koper', required=True, template=True),
+    Field('koper_email', 'Email koper', 'email', group='koper'),
+    Field('koper_telefoonnummer', 'Telefoon koper', group='koper'),
+    Field('koper_natuurlijk_persoon', 'Koper is natuurlijk persoon', 'bool', group='koper'),
+    Field('koper_voor_zichzelf', 'Koper koopt voor zichzelf', 'bool', group='koper'),
+
+    # Het goed
+    Field('goed_straat', 'Straat van het goed', group='goed', required=True, template=True),
+    Field('goed_nummer', 'Huisnummer', group='goed', required=True, template=True),
+    Field('goed_postcode', 'Postcode', group='goed', required=True, template=True),
+    Field('goed_gemeente', 'Gemeente', group='goed', required=True, template=True),
+    Field('goed_land', 'Land', group='goed'),
+    Field('goed_aard', 'Aard van het goed', group='goed'),
+
+    # Kadaster
+    Field('goed_kadastrale_afdeling', 'Kadastrale afdeling', group='kadaster',
+          source='kadaster', extracted=True),
+    Field('goed_kadastrale_sectie', 'Kadastrale sectie', group='kadaster',
+          source='kadaster', extracted=True),
+    Field('goed_kadastrale_nummer', 'Kadastraal nummer', group='kadaster', source='kadaster'),
+    Field('goed_kadastrale_oppervlakte', 'Kadastrale oppervlakte', group='kadaster', source='kadaster'),
+    Field('goed_kadastraal_inkomen_bedrag', 'Kadastraal inkomen', 'money', group='kadaster',
+          source='kadaster'),
+    Field('goed_kadastraal_inkomen_bedraagt', 'Kadastraal inkomen gekend', 'bool', group='kadaster',
+          source='kadaster'),
+
+    # Financieel
+    Field('prijs_totaal', 'Totale koopprijs', 'money', group='financieel', required=True, template=True),
+    Field('voorschot_bedrag', 'Voorschot/Waarborg bedrag', 'money', group='financieel',
+          required=True, template=True),
+    Field('saldo_koopsom', 'Saldo koopsom', group='financieel', template=True),
+    Field('btw_geen', 'Geen BTW', 'bool', group='financieel'),
+
+    # EPC
+    Field('epc_code', 'EPC code', group='epc', source='epc', extracted=True, template=True),
+    Field('epc_label', 'EPC label', group='epc', source='epc', template=True),
+    Field('epc_score', 'EPC score', group='epc', source='epc', template=True),
+    Field('epc_datum', 'EPC datum', 'date', group='epc', source='epc', extracted=True, template=True),
+
+    # Bodemattest
+    Field('bodem_attest_referentie', 'Referentie bodemattest', group='bodemattest',
+          source='bodemattest', extracted=True, template=True),
+    Field('bodem_attest_datum', 'Datum bodemattest', 'date', group='bodemattest',
+          source='bodemattest', extracted=True, template=True),
+    Field('bodem_attest_inhoud', 'Inhoud bodemattest', group='bodemattest', source='bodemattest'),
+    Field('bodem_activiteiten_geen', 'Geen risico-activiteiten', 'bool', group='bodemattest',
+          source='bodemattest'),
+
+    # Stedenbouw
+    Field('stedenbouw_meest_recente_bestemming', 'Meest recente bestemming', group='stedenbouw',
+          source='vip', extracted=True),
+    Field('stedenbouw_vergunning_afgeleverd', 'Vergunning afgeleverd', 'bool', group='stedenbouw',
+          source='vip'),
+    Field('stedenbouw_plannenregister_goedgekeurd', 'Plannenregister goedgekeurd', 'bool',
+          group='stedenbouw', source='vip'),
+    Field('stedenbouw_uittreksel_datum', 'Datum uittreksel', 'date', group='stedenbouw', source='vip'),
+    Field('stedenbouw_in_verkaveling', 'In verkaveling', 'bool', group='stedenbouw', source='vip'),
+    Field('stedenbouw_inbreuken_geen', 'Geen stedenbouwkundige inbreuken', 'bool', group='stedenbouw',
+          source='vip'),
+
+    # Elektrische keuring
+    Field('elektrische_keuring_datum', 'Datum elektrische keuring', 'date', group='elektrisch',
+          source='elektrisch', extracted=True),
+    Field('elektrische_keuring_a1', 'Keuring A1', 'bool', group='elektrisch', source='elektrisch'),
+    Field('elektrisch_conform', 'Installatie conform', 'bool', group='elektrisch', source='elektrisch'),
+
+    # Andere attesten
+    Field('stookolietank_geen', 'Geen stookolietank', 'bool', group='stookolie', source='stookolie'),
+    Field('erfdienstbaarheden_vermeld', 'Erfdienstbaarheden', group='eigendomstitel',
+          source='eigendomstitel'),
+    Field('asbestattest_aanwezig', 'Asbestattest aanwezig', 'bool', group='asbestattest',
+          source='asbestattest'),
+    Field('asbestattest_code', 'Asbestattest code', group='asbestattest', source='asbestattest'),
+    Field('asbestattest_datum', 'Datum asbestattest', 'date', group='asbestattest',
+          source='asbestattest'),
+    Field('asbestattest_veilig', 'Asbest veilig', 'bool', group='asbestattest', source='asbestattest'),
+    Field('asbestattest_identificatie', 'Asbest identificatie', group='asbestattest',
+          source='asbestattest'),
+
+    # Water en varia
+    Field('water_p_score', 'P-score', group='water'),
+    Field('water_g_score', 'G-score', group='water'),
+    Field('water_overstromingsgebied', 'In overstromingsgebied', 'bool', group='water'),
+    Field('water_risicozone', 'In risicozone', 'bool', group='water'),
+    Field('rookmelders_aanwezig', 'Rookmelders aanwezig', 'bool', group='varia'),
+    Field('goed_verhuurd', 'Goed verhuurd', 'bool', group='varia'),
+    Field('goed_niet_verhuurd', 'Goed niet verhuurd', 'bool', group='varia'),
+    Field('roerende_goederen_geen', 'Geen roerende goederen', 'bool', group='varia'),
+
+    # Notaris en makelaar
+    Field('notaris_verkoper', 'Notaris verkoper', group='notaris', template=True),
+    Field('notaris_koper', 'Notaris koper', group='notaris', template=True),
+    Field('akte_uiterste_datum', 'Uiterste datum akte', 'date', group='notaris'),
+    Field('makelaar_naam', 'Naam makelaar', group='makelaar', template=True),
+    Field('makelaar_biv_nummer', 'BIV nummer', group='makelaar'),
+    Field('makelaar_kantoor', 'Kantoor', group='makelaar'),
+    Field('aantal_exemplaren', 'Aantal exemplaren', 'number', group='makelaar', template=True),
+]
+
+
+# Omzetting per type
+_THOUSANDS = re.compile(r'^-?\d{1,3}(\.\d{3})+$')
+_TRUE = {'true', '1', 'ja', 'yes', 'on'}
+_FALSE = {'false', '0', 'nee', 'no', 'off'}
+
+
+def _number(value: str):
+    """'350000', '350.000', '350.000,50', '€ 1 250,00' -> int of float, None als het niet kan"""
+    text = value.replace('€', '').replace('\u00a0', '').replace(' ', '')
+    if ',' in text and '.' in text:
+        # Het laatste scheidingsteken is het decimaalteken
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        text = text.replace(',', '.')
+    elif _THOUSANDS.match(text):
+        text = text.replace('.', '')
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return int(number) if number.is_integer() else number
+
+
+def _coerce_money(value):
+    if isinstance(value, bool) or not isinstance(value, str):
+        return value
+    if not value.strip():
+        return ''
+    number = _number(value.strip())
+    return value if number is None else number
+
+
+def _coerce_bool(value):
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in _TRUE:
+            return True
+        if lowered in _FALSE:
+            return False
+    return value
+
+
+def _coerce_text(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+COERCERS = {
+    'text': _coerce_text,
+    'email': _coerce_text,
+    'date': _coerce_text,
+    'money': _coerce_money,
+    'number': _coerce_money,
+    'bool': _coerce_bool,
+}
+
+
+# Opzoektabellen
+FIELDS_BY_NAME: Dict[str, Field] = {field.name: field for field in FIELDS}
+FIELDS_BY_GROUP: Dict[str, List[Field]] = {}
+for _field in FIELDS:
+    FIELDS_BY_GROUP.setdefault(_field.group, []).append(_field)
+
+REQUIRED_FIELDS: Dict[str, str] = {field.name: field.label for field in FIELDS if field.required}
+TEMPLATE_FIELDS: List[str] = [field.name for field in FIELDS if field.template]
+EMAIL_FIELDS: List[str] = [field.name for field in FIELDS if field.type == 'email']
+EXTRACTED_REQUIRED: Dict[str, List[str]] = {}
+for _field in FIELDS:
+    if _field.extracted:
+        EXTRACTED_REQUIRED.setdefault(_field.source, []).append(_field.name)
+
+DOCUMENT_TYPES_BY_ID: Dict[str, DocumentType] = {doc.id: doc for doc in DOCUMENT_TYPES}
+REQUIRED_DOCUMENTS: List[str] = [doc.id for doc in DOCUMENT_TYPES if doc.required]
+
+# Velden die bij het schrijven omgezet worden (tekst zonder type valt hier ook onder)
+_FIELD_COERCERS = {field.name: COERCERS[field.type] for field in FIELDS}
+
+
+def coerce_value(name: str, value: Any) -> Any:
+    coercer = _FIELD_COERCERS.get(name)
+    return value if coercer is None else coercer(value)
+
+
+def coerce(data: Dict) -> Dict:
+    """Kopie van `data` met getypeerde waarden; onbekende velden blijven ongewijzigd"""
+    return {name: coerce_value(name, value) for name, value in data.items()}
+
+
+def as_number(value: Any, default: Optional[float] = 0) -> Optional[float]:
+    """Getal uit een (bij voorkeur al omgezette) waarde, `default` als het niet kan"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip():
+        number = _number(value.strip())
+        if number is not None:
+            return number
+    return default
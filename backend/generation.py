@@ -0,0 +1,410 @@
+# backend/generation.py
+"""
+Contract generatie, enkelvoudig en in bulk
+Contracten worden in geheugen gerenderd; DocumentStore bepaalt of ze ook op
+schijf bewaard worden (CONTRACT_STORAGE=disk) of enkel in een begrensde LRU
+per proces zitten (CONTRACT_STORAGE=memory, opnieuw gerenderd bij een miss).
+Bulk generatie verdeelt het renderen over een process pool: elk proces houdt
+zijn eigen gecompileerde template bij, de resultaten worden in het hoofdproces
+bewaard en geregistreerd. Een mislukt contract stopt de batch niet.
+
+CLI:
+    python -m backend.generation --status generated
+    python -m backend.generation <contract_id> <contract_id> ... --workers 8
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from backend.metrics import metrics
+from backend.validation import current_validation
+
+
+CONTRACTS_FOLDER = 'backend/generated_contracts'
+
+
+def output_filename(contract_id: str) -> str:
+    return f"contract_{contract_id}.docx"
+
+
+def generation_error(contract: Optional[Dict]) -> Optional[str]:
+    """Reden waarom een contract (nog) niet gegenereerd kan worden, None als het kan"""
+    if contract is None:
+        return 'Contract niet gevonden'
+    if not current_validation(contract)['is_valid']:
+        return 'Contract is niet valide. Vul de ontbrekende gegevens aan.'
+    return None
+
+
+def render_contract(form_data: Dict, template_path: str = None):
+    """
+    Render één contract in geheugen
+    Draait in een worker proces, moet dus op module niveau staan (picklable).
+    Geeft de bytes en de metingen van dit proces (zie backend.metrics) terug.
+    """
+    from backend.word_generator import ContractGenerator
+
+    data = ContractGenerator(template_path).generate_bytes(form_data)
+    return data, metrics.drain()
+
+
+class DocumentStore:
+    """
+    Opslag van gegenereerde contracten
+    Configuratie via environment:
+        CONTRACT_STORAGE        'disk' (default): ook bewaren in CONTRACTS_FOLDER
+                                'memory': enkel in de LRU, geen bestanden
+        GENERATED_CACHE_BYTES   grootte van de LRU per proces (default 64MB, 0 = uit)
+    De LRU is per proces; een ander gunicorn proces rendert bij een miss opnieuw.
+    """
+
+    def __init__(self, folder: str = CONTRACTS_FOLDER, policy: str = None,
+                 max_bytes: int = None):
+        self.folder = folder
+        self.policy = policy or os.getenv('CONTRACT_STORAGE', 'disk')
+        if self.policy not in ('disk', 'memory'):
+            raise ValueError(f'Onbekende CONTRACT_STORAGE: {self.policy}')
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv('GENERATED_CACHE_BYTES', 64 * 1024 * 1024)
+        )
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+
+    @property
+    def persistent(self) -> bool:
+        return self.policy == 'disk'
+
+    def path(self, contract: Dict) -> str:
+        return os.path.abspath(os.path.join(self.folder, contract['output_file']))
+
+    def is_current(self, contract: Dict, fingerprint: str) -> bool:
+        """True als het bestaande document al met deze fingerprint gegenereerd werd"""
+        if contract.get('output_fingerprint') != fingerprint:
+            return False
+        if self.persistent:
+            return os.path.exists(self.path(contract))
+        return True
+
+    def save(self, contract_id: str, fingerprint: str, data: bytes) -> str:
+        """Bewaar een gerenderd contract, geeft de bestandsnaam terug"""
+        filename = output_filename(contract_id)
+        if self.persistent:
+            os.makedirs(self.folder, exist_ok=True)
+            path = os.path.join(self.folder, filename)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+        self._remember(contract_id, fingerprint, data)
+        return filename
+
+    def load(self, contract: Dict) -> Optional[bytes]:
+        """Het document met de huidige fingerprint uit de LRU of van schijf, None bij een miss"""
+        fingerprint = contract.get('output_fingerprint')
+        with self._lock:
+            entry = self._cache.get(contract['id'])
+            if entry is not None and entry[0] == fingerprint:
+                self._cache.move_to_end(contract['id'])
+                return entry[1]
+
+        if contract.get('output_file') and os.path.exists(self.path(contract)):
+            with open(self.path(contract), 'rb') as f:
+                data = f.read()
+            self._remember(contract['id'], fingerprint, data)
+            return data
+        return None
+
+    def _remember(self, contract_id: str, fingerprint: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._cache.pop(contract_id, None)
+            if previous is not None:
+                self._cache_bytes -= len(previous[1])
+            self._cache[contract_id] = (fingerprint, data)
+            self._cache_bytes += len(data)
+            while self._cache_bytes > self.max_bytes:
+                _, (_, evicted) = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+    def delete(self, contract: Dict):
+        with self._lock:
+            entry = self._cache.pop(contract['id'], None)
+            if entry is not None:
+                self._cache_bytes -= len(entry[1])
+        if contract.get('output_file') and os.path.exists(self.path(contract)):
+            os.remove(self.path(contract))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'policy': self.policy,
+                'cached_documents': len(self._cache),
+                'cached_bytes': self._cache_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+def record_generation(database, contract_id: str, filename: str, size: int,
+                      fingerprint: str = None) -> bool:
+    """Registreer het gegenereerde document bij het contract"""
+    def mark_generated(contract):
+        contract['status'] = 'generated'
+        contract['generated_at'] = datetime.now().isoformat()
+        contract['output_file'] = filename
+        contract['output_size'] = size
+        contract['output_fingerprint'] = fingerprint
+
+    return database.update_contract(contract_id, mark_generated) is not None
+
+
+def contract_ids_with_status(database, status: str = None) -> List[str]:
+    """Alle contract ids (optioneel met een bepaalde status), via keyset paginering"""
+    contract_ids = []
+    after = None
+    while True:
+        contracts, after = database.page_contracts(limit=500, after=after, status=status)
+        contract_ids.extend(contract['id'] for contract in contracts)
+        if after is None:
+            return contract_ids
+
+
+class BulkGenerator:
+    """
+    Genereer veel contracten parallel
+    Configuratie via environment:
+        GENERATION_WORKERS   aantal render processen (default: aantal cores)
+        JOB_EXECUTOR         'process' (default) of 'thread'
+        JOB_START_METHOD     multiprocessing start methode (default 'spawn')
+    """
+
+    def __init__(self, database, documents: DocumentStore = None,
+                 max_workers: int = None, executor: str = None, template_path: str = None):
+        self.database = database
+        self.documents = documents or DocumentStore()
+        self.template_path = template_path
+        self.max_workers = max_workers or int(
+            os.getenv('GENERATION_WORKERS', os.cpu_count() or 1)
+        )
+        self.executor_type = executor or os.getenv('JOB_EXECUTOR', 'process')
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._pending = {}
+
+    def _get_executor(self):
+        """Executor per proces: na een fork wordt een nieuwe pool gestart"""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    if self.executor_type == 'thread':
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.max_workers,
+                            thread_name_prefix='generation'
+                        )
+                    else:
+                        context = multiprocessing.get_context(
+                            os.getenv('JOB_START_METHOD', 'spawn')
+                        )
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.max_workers,
+                            mp_context=context
+                        )
+                    self._pending = {}
+                    self._pid = pid
+        return self._executor
+
+    def iter_generate(self, contract_ids: Iterable[str]) -> Iterator[Dict]:
+        """
+        Genereer de contracten en geef per contract een resultaat, in volgorde van afwerking
+        Er staan hoogstens 2x max_workers renders tegelijk uit, zodat ook
+        duizenden contracten niet tegelijk in geheugen geladen worden.
+        Contracten waarvan het document al up-to-date is worden niet opnieuw gerenderd.
+        """
+        from backend.word_generator import ContractGenerator
+
+        generator = ContractGenerator(self.template_path)
+        executor = self._get_executor()
+        queue = deque(contract_ids)
+        in_flight = {}
+
+        while queue or in_flight:
+            while queue and len(in_flight) < self.max_workers * 2:
+                contract_id = queue.popleft()
+                contract = self.database.get_contract(contract_id)
+                error = generation_error(contract)
+                if error is not None:
+                    yield {'contract_id': contract_id, 'status': 'failed', 'error': error}
+                    continue
+
+                fingerprint = generator.fingerprint(contract['form_data'])
+                if self.documents.is_current(contract, fingerprint):
+                    yield {
+                        'contract_id': contract_id,
+                        'status': 'generated',
+                        'unchanged': True,
+                        'output_file': contract['output_file'],
+                        'output_size': contract.get('output_size')
+                    }
+                    continue
+
+                try:
+                    future = executor.submit(
+                        render_contract, contract['form_data'], self.template_path
+                    )
+                except Exception as e:
+                    yield {'contract_id': contract_id, 'status': 'failed', 'error': str(e)}
+                    continue
+                in_flight[future] = (contract_id, fingerprint, time.perf_counter())
+
+            if not in_flight:
+                continue
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                contract_id, fingerprint, started = in_flight.pop(future)
+                try:
+                    data, timings = future.result()
+                    metrics.merge(timings)
+                    filename = self.documents.save(contract_id, fingerprint, data)
+                except Exception as e:
+                    yield {'contract_id': contract_id, 'status': 'failed', 'error': str(e)}
+                    continue
+
+                size = len(data)
+                if not record_generation(self.database, contract_id, filename, size, fingerprint):
+                    yield {
+                        'contract_id': contract_id, 'status': 'failed',
+                        'error': 'Contract niet gevonden'
+                    }
+                    continue
+
+                yield {
+                    'contract_id': contract_id,
+                    'status': 'generated',
+                    'unchanged': False,
+                    'output_file': filename,
+                    'output_size': size,
+                    'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+                }
+
+    def submit(self, contract_ids: List[str]) -> Dict:
+        """
+        Start een bulk generatie op de achtergrond
+        De voortgang per contract staat in de job (zie /api/jobs/<job_id>).
+        """
+        job = {
+            'id': str(uuid.uuid4()),
+            'type': 'generation',
+            'status': 'queued',
+            'worker_pid': os.getpid(),
+            'created_at': datetime.now().isoformat(),
+            'finished_at': None,
+            'total': len(contract_ids),
+            'done': 0,
+            'generated': 0,
+            'failed': 0,
+            'items': [
+                {'contract_id': contract_id, 'status': 'queued', 'error': None}
+                for contract_id in contract_ids
+            ],
+            'error': None
+        }
+        self.database.create_job(job)
+
+        self._get_executor()
+        self._pending[job['id']] = threading.Event()
+        thread = threading.Thread(
+            target=self._run, args=(job,), name=f"generation-{job['id'][:8]}", daemon=True
+        )
+        thread.start()
+        return job
+
+    def _run(self, job: Dict):
+        positions = {item['contract_id']: index for index, item in enumerate(job['items'])}
+        try:
+            for result in self.iter_generate([item['contract_id'] for item in job['items']]):
+                job['items'][positions[result['contract_id']]].update(result)
+                job['done'] += 1
+                job[result['status']] += 1
+                self.database.update_job(
+                    job['id'], items=job['items'], done=job['done'],
+                    generated=job['generated'], failed=job['failed']
+                )
+
+            self.database.update_job(
+                job['id'], status='done', finished_at=datetime.now().isoformat()
+            )
+        except Exception as e:
+            self.database.update_job(
+                job['id'], status='failed', error=str(e),
+                finished_at=datetime.now().isoformat()
+            )
+        finally:
+            done = self._pending.pop(job['id'], None)
+            if done is not None:
+                done.set()
+
+    def wait(self, job_id: str, timeout: float = None) -> Optional[Dict]:
+        """Wacht op een bulk generatie die in dit proces gestart werd"""
+        done = self._pending.get(job_id)
+        if done is not None:
+            done.wait(timeout)
+        return self.database.get_job(job_id)
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+            self._pid = None
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    from backend.database import Database
+
+    parser = argparse.ArgumentParser(description='Genereer contracten in bulk')
+    parser.add_argument('contract_ids', nargs='*', help='contract ids (default: alle)')
+    parser.add_argument('--status', help='enkel contracten met deze status')
+    parser.add_argument('--workers', type=int, help='aantal render processen')
+    parser.add_argument('--output', default=CONTRACTS_FOLDER, help='map voor de documenten')
+    args = parser.parse_args(argv)
+
+    database = Database()
+    contract_ids = args.contract_ids or contract_ids_with_status(database, args.status)
+    # Een CLI run bewaart altijd op schijf: een LRU in geheugen verdwijnt met het proces
+    documents = DocumentStore(args.output, policy='disk', max_bytes=0)
+    generator = BulkGenerator(database, documents, max_workers=args.workers)
+
+    started = time.perf_counter()
+    counts = {'generated': 0, 'failed': 0}
+    try:
+        # Eén JSON regel per contract, zodat de output te volgen en te filteren is
+        for done, result in enumerate(generator.iter_generate(contract_ids), start=1):
+            counts[result['status']] += 1
+            print(json.dumps(dict(result, done=done, total=len(contract_ids))), flush=True)
+    finally:
+        generator.shutdown()
+
+    duration = time.perf_counter() - started
+    print(json.dumps({
+        'total': len(contract_ids),
+        **counts,
+        'duration_s': round(duration, 2),
+        'contracts_per_s': round(len(contract_ids) / duration, 1) if duration else None
+    }), flush=True)
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,322 @@
+# backend/jobs.py
+"""
+Achtergrond jobs voor documentverwerking
+Uploads worden meteen bevestigd; extractie en validatie draaien in een
+lokale process pool zodat gunicorn workers niet blokkeren tijdens OCR.
+"""
+
+import os
+import threading
+import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+
+from backend.fields import coerce
+from backend.metrics import metrics
+from backend.validation import changed_fields, revalidate
+
+
+def run_extraction(filepath: str, doc_type: str) -> Dict:
+    """
+    Extractie + validatie van één document
+    Draait in een worker proces, moet dus op module niveau staan (picklable).
+    """
+    from backend.document_processor import DocumentProcessor
+
+    processor = DocumentProcessor()
+    extracted_data = processor.process_document(filepath, doc_type)
+    with metrics.stage('validate_extracted', doc_type=doc_type):
+        validation = processor.validate_extracted_data(extracted_data, doc_type)
+
+    return {
+        'extracted_data': extracted_data,
+        'validation': validation,
+        # Metingen van dit (pool) proces, opgeteld in het hoofdproces
+        'metrics': metrics.drain()
+    }
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    Job queue voor document extractie
+    Job status staat in de database (zichtbaar voor alle gunicorn workers),
+    het eigenlijke werk gebeurt in een process pool per worker proces.
+
+    Configuratie via environment:
+        JOB_WORKERS       aantal parallelle extracties per worker (default 2)
+        JOB_EXECUTOR      'process' (default) of 'thread'
+        JOB_START_METHOD  multiprocessing start methode (default 'spawn')
+    """
+
+    def __init__(self, database, max_workers: int = None, executor: str = None, cache=None):
+        self.database = database
+        self.cache = cache
+        self.max_workers = max_workers or int(os.getenv('JOB_WORKERS', 2))
+        self.executor_type = executor or os.getenv('JOB_EXECUTOR', 'process')
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._pending = {}
+
+    def _get_executor(self):
+        """Executor per proces: na een fork wordt een nieuwe pool gestart"""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    if self.executor_type == 'thread':
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.max_workers,
+                            thread_name_prefix='document-job'
+                        )
+                    else:
+                        context = multiprocessing.get_context(
+                            os.getenv('JOB_START_METHOD', 'spawn')
+                        )
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.max_workers,
+                            mp_context=context
+                        )
+                    self._pending = {}
+                    self._pid = pid
+        return self._executor
+
+    def submit_document(self, contract_id: str, doc_type: str, filename: str,
+                        filepath: str, size: int, file_hash: str = None) -> Dict:
+        """
+        Registreer een extractie job en start ze op de achtergrond
+        Bij een cache hit (zelfde bestand + doc_type) is de job meteen klaar.
+        """
+        job = {
+            'id': str(uuid.uuid4()),
+            'type': 'document',
+            'contract_id': contract_id,
+            'doc_type': doc_type,
+            'filename': filename,
+            'filepath': filepath,
+            'size': size,
+            'sha256': file_hash,
+            'cached': False,
+            'status': 'queued',
+            'worker_pid': os.getpid(),
+            'created_at': datetime.now().isoformat(),
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
+        self.database.create_job(job)
+
+        if self.cache is not None and file_hash:
+            cached = self.cache.get(file_hash, doc_type)
+            if cached is not None:
+                job['cached'] = True
+                return self._finish(job, result=cached)
+
+        executor = self._get_executor()
+        self._pending[job['id']] = threading.Event()
+        future = executor.submit(run_extraction, filepath, doc_type)
+        future.add_done_callback(lambda f, job=job: self._complete(job, f))
+
+        return job
+
+    def _complete(self, job: Dict, future):
+        try:
+            try:
+                result = future.result()
+                metrics.merge(result.pop('metrics', None))
+            except Exception as e:
+                self._finish(job, error=str(e))
+            else:
+                if self.cache is not None and job['sha256']:
+                    self.cache.put(job['sha256'], job['doc_type'], result)
+                self._finish(job, result=result)
+        finally:
+            done = self._pending.pop(job['id'], None)
+            if done is not None:
+                done.set()
+
+    def _finish(self, job: Dict, result: Dict = None, error: str = None) -> Dict:
+        """Sla het resultaat op en merge de geëxtraheerde data in het contract"""
+        finished_at = datetime.now().isoformat()
+
+        if error is not None:
+            return self.database.update_job(
+                job['id'], status='failed', error=error, finished_at=finished_at
+            )
+
+        if not self._store_documents(job, [(job, result)], finished_at):
+            return self.database.update_job(
+                job['id'], status='failed', error='Contract niet gevonden',
+                finished_at=finished_at
+            )
+
+        return self.database.update_job(
+            job['id'], status='done', cached=job['cached'], result=result,
+            finished_at=finished_at
+        )
+
+    def _store_documents(self, job: Dict, results, finished_at: str) -> bool:
+        """
+        Bewaar documenten en merge hun extracted_data in form_data, in de gegeven volgorde
+        `results` is een lijst van (document, resultaat); één contract update voor allemaal.
+        """
+        def store_documents(contract):
+            old_form_data = dict(contract['form_data'])
+            for document, result in results:
+                extracted_data = result['extracted_data']
+                contract['documents'][document['doc_type']] = {
+                    'filename': document['filename'],
+                    'filepath': document['filepath'],
+                    'size': document['size'],
+                    'sha256': document['sha256'],
+                    'uploaded_at': job['created_at'],
+                    'processed_at': finished_at,
+                    'job_id': job['id'],
+                    'extracted_data': extracted_data,
+                    'validation': result['validation']
+                }
+
+                # Merge extracted data into form_data
+                contract['form_data'].update(coerce(extracted_data))
+
+            revalidate(
+                contract,
+                fields=changed_fields(old_form_data, contract['form_data']),
+                documents=[document['doc_type'] for document, _ in results]
+            )
+
+        return self.database.update_contract(job['contract_id'], store_documents) is not None
+
+    def submit_batch(self, contract_id: str, documents) -> Dict:
+        """
+        Verwerk alle documenten van een dossier parallel
+        `documents` is een lijst van dicts met doc_type, filename, filepath, size en sha256.
+        De extracties lopen gelijktijdig in de pool; pas als alles klaar is worden de
+        resultaten in de volgorde van `documents` in het contract gemerged.
+        """
+        job = {
+            'id': str(uuid.uuid4()),
+            'type': 'batch',
+            'contract_id': contract_id,
+            'items': [
+                dict(document, status='queued', cached=False, error=None)
+                for document in documents
+            ],
+            'status': 'queued',
+            'worker_pid': os.getpid(),
+            'created_at': datetime.now().isoformat(),
+            'finished_at': None,
+            'error': None
+        }
+        self.database.create_job(job)
+
+        results = [None] * len(documents)
+        remaining = [len(documents)]
+        lock = threading.Lock()
+
+        def item_done(index, result=None, error=None):
+            results[index] = (result, error)
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._finish_batch(job, results)
+
+        executor = self._get_executor()
+        self._pending[job['id']] = threading.Event()
+        if not documents:
+            self._finish_batch(job, results)
+
+        for index, item in enumerate(job['items']):
+            if self.cache is not None and item['sha256']:
+                cached = self.cache.get(item['sha256'], item['doc_type'])
+                if cached is not None:
+                    item['cached'] = True
+                    item_done(index, result=cached)
+                    continue
+
+            future = executor.submit(run_extraction, item['filepath'], item['doc_type'])
+            future.add_done_callback(
+                lambda f, index=index, item=item: self._complete_item(item, f, index, item_done)
+            )
+
+        return job
+
+    def _complete_item(self, item: Dict, future, index: int, item_done):
+        try:
+            result = future.result()
+            metrics.merge(result.pop('metrics', None))
+        except Exception as e:
+            item_done(index, error=str(e))
+            return
+
+        if self.cache is not None and item['sha256']:
+            self.cache.put(item['sha256'], item['doc_type'], result)
+        item_done(index, result=result)
+
+    def _finish_batch(self, job: Dict, results):
+        try:
+            finished_at = datetime.now().isoformat()
+            succeeded = []
+            for item, (result, error) in zip(job['items'], results):
+                if error is not None:
+                    item.update(status='failed', error=error)
+                else:
+                    item.update(status='done', result=result)
+                    succeeded.append((item, result))
+
+            status = 'done' if succeeded or not job['items'] else 'failed'
+            error = None
+            if succeeded and not self._store_documents(job, succeeded, finished_at):
+                status, error = 'failed', 'Contract niet gevonden'
+
+            job.update(status=status, error=error, finished_at=finished_at)
+            self.database.update_job(
+                job['id'], status=status, error=error, items=job['items'],
+                failed_count=len(job['items']) - len(succeeded), finished_at=finished_at
+            )
+        finally:
+            done = self._pending.pop(job['id'], None)
+            if done is not None:
+                done.set()
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """
+        Haal de job status op
+        Jobs van een gestopte worker (herstart, crash) worden als mislukt gemarkeerd.
+        """
+        job = self.database.get_job(job_id)
+        if job is None or job['status'] != 'queued':
+            return job
+
+        if job['worker_pid'] != os.getpid() and not _pid_alive(job['worker_pid']):
+            job = self.database.update_job(
+                job_id, status='failed', error='Worker gestopt tijdens verwerking',
+                finished_at=datetime.now().isoformat()
+            )
+        return job
+
+    def wait(self, job_id: str, timeout: float = None) -> Optional[Dict]:
+        """Wacht op een job die in dit proces gestart werd (tests, benchmarks)"""
+        done = self._pending.get(job_id)
+        if done is not None:
+            done.wait(timeout)
+        return self.get_job(job_id)
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+            self._pid = None
@@ -0,0 +1,232 @@
+# backend/metrics.py
+"""
+Latency histogrammen (Prometheus)
+Elk proces telt observaties in geheugen (een bisect en een paar optellingen
+per meting) en telt ze periodiek op bij de gedeelde `metric_counters` tabel,
+één teller per bucket (apart van `counters`, zodat /api/status constant
+blijft). /api/metrics geeft zo het totaal over alle gunicorn workers, ook
+van workers die intussen herstart zijn.
+
+Metingen in een process pool (extractie, bulk generatie) worden met drain()
+meegegeven in het resultaat en in het hoofdproces met merge() opgeteld.
+
+    with metrics.stage('parse', doc_type='epc'):
+        ...
+"""
+
+import atexit
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+
+REQUEST_METRIC = 'makelaar_http_request_duration_seconds'
+STAGE_METRIC = 'makelaar_stage_duration_seconds'
+
+HELP = {
+    REQUEST_METRIC: 'Duur van HTTP requests per endpoint',
+    STAGE_METRIC: 'Duur van de stappen in upload, extractie en generatie',
+}
+
+# Bovengrenzen van de buckets in seconden (+Inf komt er automatisch bij)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRICS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS metric_counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    # Oudere versies bewaarden de histogrammen in de counters tabel
+    "DELETE FROM counters WHERE name >= 'metrics:' AND name < 'metrics:\uffff'",
+]
+
+
+def _bucket_label(index: int) -> str:
+    return f'{BUCKETS[index]:g}' if index < len(BUCKETS) else '+Inf'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple) -> str:
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+
+
+class Metrics:
+    """
+    Histogrammen per proces, periodiek opgeteld in de database
+    Configuratie via environment:
+        METRICS_FLUSH_INTERVAL   seconden tussen twee flushes per worker (default 10)
+    Een worker flusht bij een meting als het interval verstreken is, en bij /api/metrics.
+    """
+
+    def __init__(self, database=None, flush_interval: float = None):
+        self.database = database
+        self.flush_interval = (
+            flush_interval if flush_interval is not None
+            else float(os.getenv('METRICS_FLUSH_INTERVAL', 10))
+        )
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pending: Dict[Tuple, list] = {}
+        self._last_flush = 0.0
+        self._local = threading.local()
+
+    def bind(self, database):
+        """Database voor de flush; zonder database blijven de metingen in het proces"""
+        with database.pool.transaction() as conn:
+            for statement in METRICS_SCHEMA:
+                conn.execute(statement)
+        self.database = database
+        atexit.register(self.flush)
+
+    def _ensure_process(self):
+        """Na een fork: metingen van het master proces niet dubbel tellen"""
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pending = {}
+            self._last_flush = time.monotonic()
+            self._pid = pid
+
+    def observe(self, name: str, seconds: float, **labels):
+        if getattr(self._local, 'suppressed', False):
+            return
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        index = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self._ensure_process()
+            series = self._pending.get(key)
+            if series is None:
+                series = self._pending[key] = [[0] * (len(BUCKETS) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+            due = (
+                self.database is not None
+                and time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @contextmanager
+    def suppressed(self):
+        """Geen metingen in deze thread (warmup, dummy renders)"""
+        self._local.suppressed = True
+        try:
+            yield
+        finally:
+            self._local.suppressed = False
+
+    def stage(self, stage: str, **labels):
+        """Timer voor een stap (upload, extractie, generatie)"""
+        return self.timer(STAGE_METRIC, stage=stage, **labels)
+
+    def drain(self) -> Dict[Tuple, list]:
+        """Neem de openstaande metingen van dit proces (om door te geven aan een ander proces)"""
+        with self._lock:
+            self._ensure_process()
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def merge(self, pending: Dict[Tuple, list]):
+        """Tel metingen uit drain() op bij dit proces"""
+        if not pending:
+            return
+        with self._lock:
+            self._ensure_process()
+            for key, (counts, total) in pending.items():
+                series = self._pending.get(key)
+                if series is None:
+                    series = self._pending[key] = [[0] * (len(BUCKETS) + 1), 0.0]
+                for index, count in enumerate(counts):
+                    series[0][index] += count
+                series[1] += total
+
+    def flush(self):
+        """Tel de openstaande metingen op in de metric_counters tabel (één transactie)"""
+        if self.database is None:
+            return
+        with self._lock:
+            self._last_flush = time.monotonic()
+        pending = self.drain()
+        if not pending:
+            return
+
+        try:
+            with self.database.pool.transaction() as conn:
+                rows = []
+                for (name, labels), (counts, total) in pending.items():
+                    series = f'{name}{{{_format_labels(labels)}}}'
+                    rows.extend(
+                        (f'{series}:{_bucket_label(index)}', count)
+                        for index, count in enumerate(counts) if count
+                    )
+                    # Tellers zijn gehele getallen: som in microseconden
+                    rows.append((f'{series}:sum_us', round(total * 1e6)))
+                conn.executemany(
+                    """
+                    INSERT INTO metric_counters (name, value) VALUES (?, ?)
+                    ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+                    """,
+                    rows
+                )
+        except Exception:
+            # Database bezet of onbereikbaar: volgende keer opnieuw
+            self.merge(pending)
+
+    def render(self) -> str:
+        """Alle histogrammen in Prometheus text format, over alle workers"""
+        self.flush()
+        histograms: Dict[str, Dict[str, Dict]] = {}
+        with self.database.pool.connection() as conn:
+            rows = conn.execute('SELECT name, value FROM metric_counters').fetchall()
+        for key, value in rows:
+            series, suffix = key.rsplit(':', 1)
+            name, labels = series.split('{', 1)
+            entry = histograms.setdefault(name, {}).setdefault(
+                labels[:-1], {'buckets': {}, 'sum_us': 0}
+            )
+            if suffix == 'sum_us':
+                entry['sum_us'] = value
+            else:
+                entry['buckets'][suffix] = value
+
+        lines = []
+        for name in sorted(histograms):
+            if name in HELP:
+                lines.append(f'# HELP {name} {HELP[name]}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, entry in sorted(histograms[name].items()):
+                prefix = f'{labels},' if labels else ''
+                # Altijd alle buckets, ook lege: histogram_quantile verwacht dezelfde grenzen
+                bounds = sorted(
+                    {_bucket_label(index) for index in range(len(BUCKETS))}
+                    | {b for b in entry['buckets'] if b != '+Inf'},
+                    key=float
+                )
+                cumulative = 0
+                for bound in bounds:
+                    cumulative += entry['buckets'].get(bound, 0)
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                cumulative += entry['buckets'].get('+Inf', 0)
+                lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+                lines.append(f'{name}_sum{{{labels}}} {entry["sum_us"] / 1e6}')
+                lines.append(f'{name}_count{{{labels}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+# Eén registry per proces; backend.api koppelt de database
+metrics = Metrics()
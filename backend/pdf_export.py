@@ -0,0 +1,307 @@
+# backend/pdf_export.py
+"""
+PDF export van gegenereerde contracten
+De conversie gebeurt door een pool van langlevende LibreOffice processen
+(via unoserver), zodat de opstartkost van LibreOffice niet per document
+betaald wordt. Conversies lopen op de achtergrond met een begrensde wachtrij
+en een timeout per job; het resultaat wordt gecached op de fingerprint van
+het .docx document, gedeeld tussen alle gunicorn workers.
+
+Converters (PDF_CONVERTER):
+    unoserver  langlevende `unoserver` processen, conversie via `unoconvert`
+               (pip install unoserver; vereist LibreOffice)
+    soffice    `soffice --headless --convert-to pdf` per document, met een
+               vast profiel per slot (trager, geen extra dependency)
+"""
+
+import atexit
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from queue import Queue
+from typing import Dict, Optional
+
+
+class ConversionError(RuntimeError):
+    pass
+
+
+class PdfCache:
+    """PDF's op schijf per docx fingerprint, begrensd op aantal bestanden (oudste eerst weg)"""
+
+    def __init__(self, folder: str, max_entries: int):
+        self.folder = folder
+        self.max_entries = max_entries
+
+    def path(self, fingerprint: str) -> str:
+        return os.path.abspath(os.path.join(self.folder, f'{fingerprint}.pdf'))
+
+    def get(self, fingerprint: str) -> Optional[str]:
+        path = self.path(fingerprint)
+        return path if os.path.exists(path) else None
+
+    def put(self, fingerprint: str, data: bytes) -> str:
+        os.makedirs(self.folder, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.folder, prefix='.pdf-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, self.path(fingerprint))
+        self._evict()
+        return self.path(fingerprint)
+
+    def _evict(self):
+        entries = [
+            entry for entry in os.scandir(self.folder)
+            if entry.is_file() and entry.name.endswith('.pdf')
+        ]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class UnoserverConverter:
+    """Eén langlevend unoserver proces (met zijn eigen LibreOffice instantie)"""
+
+    def __init__(self, index: int, startup_timeout: float):
+        self.profile = os.path.join(tempfile.gettempdir(), f'makelaar-lo-{os.getpid()}-{index}')
+        self.startup_timeout = startup_timeout
+        self.port = None
+        self.process = None
+
+    def _ready(self) -> bool:
+        try:
+            with socket.create_connection(('127.0.0.1', self.port), timeout=0.5):
+                return True
+        except OSError:
+            return False
+
+    def start(self):
+        # Vrije poorten: meerdere gunicorn workers hebben elk hun eigen converters
+        self.port = _free_port()
+        self.uno_port = _free_port()
+        self.process = subprocess.Popen(
+            [
+                os.getenv('UNOSERVER_PATH', 'unoserver'),
+                '--interface', '127.0.0.1',
+                '--port', str(self.port),
+                '--uno-port', str(self.uno_port),
+                '--user-installation', f'file://{self.profile}',
+            ],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + self.startup_timeout
+        while not self._ready():
+            if self.process.poll() is not None:
+                raise ConversionError('Converter kon niet starten')
+            if time.monotonic() > deadline:
+                self.stop()
+                raise ConversionError('Converter start niet binnen de tijd')
+            time.sleep(0.2)
+
+    def convert(self, data: bytes, timeout: float) -> bytes:
+        if self.process is None or self.process.poll() is not None:
+            self.start()
+
+        result = subprocess.run(
+            [
+                os.getenv('UNOCONVERT_PATH', 'unoconvert'),
+                '--host', '127.0.0.1', '--port', str(self.port),
+                '--convert-to', 'pdf', '-', '-',
+            ],
+            input=data, capture_output=True, timeout=timeout
+        )
+        if result.returncode != 0 or not result.stdout.startswith(b'%PDF'):
+            raise ConversionError(
+                result.stderr.decode('utf-8', errors='replace').strip() or 'Conversie mislukt'
+            )
+        return result.stdout
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+
+class SofficeConverter:
+    """Conversie met soffice --convert-to; één LibreOffice profiel per slot"""
+
+    def __init__(self, index: int, startup_timeout: float = None):
+        self.profile = os.path.join(tempfile.gettempdir(), f'makelaar-lo-{os.getpid()}-{index}')
+
+    def convert(self, data: bytes, timeout: float) -> bytes:
+        with tempfile.TemporaryDirectory(prefix='makelaar-pdf-') as workdir:
+            source = os.path.join(workdir, 'contract.docx')
+            with open(source, 'wb') as f:
+                f.write(data)
+
+            result = subprocess.run(
+                [
+                    os.getenv('SOFFICE_PATH', 'soffice'),
+                    f'-env:UserInstallation=file://{self.profile}',
+                    '--headless', '--norestore', '--nologo',
+                    '--convert-to', 'pdf', '--outdir', workdir, source,
+                ],
+                capture_output=True, timeout=timeout
+            )
+            target = os.path.join(workdir, 'contract.pdf')
+            if result.returncode != 0 or not os.path.exists(target):
+                raise ConversionError(
+                    result.stderr.decode('utf-8', errors='replace').strip() or 'Conversie mislukt'
+                )
+            with open(target, 'rb') as f:
+                return f.read()
+
+    def stop(self):
+        pass
+
+
+CONVERTERS = {
+    'unoserver': UnoserverConverter,
+    'soffice': SofficeConverter,
+}
+
+
+class PdfExporter:
+    """
+    Achtergrond conversie naar PDF over een pool van converter processen
+    Configuratie via environment:
+        PDF_CONVERTER          'unoserver' of 'soffice' (default: unoserver indien geïnstalleerd)
+        PDF_CONVERTERS         aantal converter processen per worker (default 1)
+        PDF_TIMEOUT            max seconden per conversie (default 60)
+        PDF_QUEUE_SIZE         max wachtende conversies per worker (default 50)
+        PDF_STARTUP_TIMEOUT    max seconden om een converter te starten (default 30)
+        PDF_CACHE_DIR          map voor gecachte PDF's (default backend/data/pdf)
+        PDF_CACHE_SIZE         max aantal gecachte PDF's (default 500)
+    """
+
+    def __init__(self, database, converter: str = None, size: int = None,
+                 timeout: float = None, cache_dir: str = None):
+        self.database = database
+        self.converter = converter or os.getenv(
+            'PDF_CONVERTER', 'unoserver' if shutil.which('unoserver') else 'soffice'
+        )
+        if self.converter not in CONVERTERS:
+            raise ValueError(f'Onbekende PDF_CONVERTER: {self.converter}')
+        self.size = size or int(os.getenv('PDF_CONVERTERS', 1))
+        self.timeout = timeout or float(os.getenv('PDF_TIMEOUT', 60))
+        self.queue_size = int(os.getenv('PDF_QUEUE_SIZE', 50))
+        self.cache = PdfCache(
+            cache_dir or os.getenv('PDF_CACHE_DIR', 'backend/data/pdf'),
+            int(os.getenv('PDF_CACHE_SIZE', 500))
+        )
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._slots = None
+        self._converters = []
+        self._in_flight = {}
+
+    def _get_executor(self):
+        """Pool per proces: na een fork worden nieuwe converters gestart"""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    converter_class = CONVERTERS[self.converter]
+                    startup_timeout = float(os.getenv('PDF_STARTUP_TIMEOUT', 30))
+                    self._converters = [
+                        converter_class(index, startup_timeout) for index in range(self.size)
+                    ]
+                    self._slots = Queue()
+                    for converter in self._converters:
+                        self._slots.put(converter)
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.size, thread_name_prefix='pdf-export'
+                    )
+                    self._in_flight = {}
+                    self._pid = pid
+                    atexit.register(self.shutdown)
+        return self._executor
+
+    def submit(self, contract_id: str, fingerprint: str, data: bytes) -> Dict:
+        """
+        Zet een conversie in de wachtrij; geeft de job terug
+        Een conversie voor dezelfde fingerprint die al loopt wordt hergebruikt.
+        ConversionError als de wachtrij vol is.
+        """
+        executor = self._get_executor()
+        with self._lock:
+            job_id = self._in_flight.get(fingerprint)
+            if job_id is not None:
+                return self.database.get_job(job_id)
+            if len(self._in_flight) >= self.queue_size:
+                raise ConversionError('Te veel PDF conversies in de wachtrij, probeer later opnieuw')
+
+            job = {
+                'id': str(uuid.uuid4()),
+                'type': 'pdf',
+                'contract_id': contract_id,
+                'fingerprint': fingerprint,
+                'status': 'queued',
+                'worker_pid': os.getpid(),
+                'created_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'duration_ms': None,
+                'pdf_size': None,
+                'error': None
+            }
+            self.database.create_job(job)
+            self._in_flight[fingerprint] = job['id']
+
+        executor.submit(self._convert, job, data)
+        return job
+
+    def _convert(self, job: Dict, data: bytes):
+        converter = self._slots.get()
+        started = time.perf_counter()
+        try:
+            pdf = converter.convert(data, self.timeout)
+            self.cache.put(job['fingerprint'], pdf)
+            fields = {'status': 'done', 'pdf_size': len(pdf)}
+        except subprocess.TimeoutExpired:
+            # Vastgelopen converter: herstarten bij de volgende conversie
+            converter.stop()
+            fields = {'status': 'failed', 'error': f'Conversie duurde langer dan {self.timeout:g}s'}
+        except Exception as e:
+            fields = {'status': 'failed', 'error': str(e)}
+        finally:
+            self._slots.put(converter)
+            with self._lock:
+                self._in_flight.pop(job['fingerprint'], None)
+
+        self.database.update_job(
+            job['id'], finished_at=datetime.now().isoformat(),
+            duration_ms=round((time.perf_counter() - started) * 1000, 1), **fields
+        )
+
+    def shutdown(self):
+        if self._pid != os.getpid():
+            return
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        for converter in self._converters:
+            converter.stop()
+        self._executor = None
+        self._pid = None
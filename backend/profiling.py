@@ -0,0 +1,166 @@
+# backend/profiling.py
+"""
+Profiling van individuele requests (opt-in)
+Een request met de header X-Profile (of ?profile=) gelijk aan PROFILE_TOKEN
+wordt gesampled: een thread leest elke PROFILE_INTERVAL seconden de stack
+van de thread die het request afhandelt. Het resultaat is een profiel in
+het 'folded stacks' formaat (één regel per stack met het aantal samples),
+leesbaar door flamegraph.pl, speedscope en inferno:
+
+    curl -H "X-Profile: $PROFILE_TOKEN" -X POST .../api/contract/<id>/generate
+    curl -H "X-Profile: $PROFILE_TOKEN" .../api/profiles/<X-Profile-Id> > generate.folded
+
+Profielen staan op schijf (gedeeld tussen workers), één per request; enkel de
+laatste PROFILE_RETENTION blijven bewaard. Zonder PROFILE_TOKEN worden de
+request hooks niet geregistreerd: geen overhead.
+"""
+
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+# Request ids uit X-Request-ID worden (met een uniek achtervoegsel) bestandsnamen
+REQUEST_ID = re.compile(r'[A-Za-z0-9_-]{1,64}')
+PROFILE_ID = re.compile(r'[A-Za-z0-9_-]{1,73}')
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    for prefix in sys.path:
+        if prefix and filename.startswith(prefix + os.sep):
+            filename = filename[len(prefix) + 1:]
+            break
+    # ';' scheidt frames in het folded formaat
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ':')
+
+
+class StackSampler:
+    """Sample de stack van één thread tot stop()"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        """Stop het sampelen (idempotent)"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        labels = {}
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+
+class RequestProfiler:
+    """
+    Opslag en autorisatie van request profielen
+    Configuratie via environment:
+        PROFILE_TOKEN       geheim voor de X-Profile header; niet gezet = profiling uit
+        PROFILE_INTERVAL    seconden tussen twee samples (default 0.005)
+        PROFILE_DIR         map voor de profielen (default backend/data/profiles)
+        PROFILE_RETENTION   aantal bewaarde profielen (default 50)
+    """
+
+    def __init__(self, token: str = None, folder: str = None):
+        self.token = token if token is not None else os.getenv('PROFILE_TOKEN', '')
+        self.interval = float(os.getenv('PROFILE_INTERVAL', 0.005))
+        self.folder = Path(folder or os.getenv('PROFILE_DIR', 'backend/data/profiles'))
+        self.retention = int(os.getenv('PROFILE_RETENTION', 50))
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token)
+
+    def authorized(self, value: Optional[str]) -> bool:
+        # compare_digest weigert str met niet-ASCII tekens: vergelijk bytes
+        return (
+            self.enabled and value is not None
+            and hmac.compare_digest(value.encode('utf-8', 'surrogatepass'), self.token.encode('utf-8'))
+        )
+
+    def start(self) -> StackSampler:
+        return StackSampler(threading.get_ident(), self.interval).start()
+
+    @staticmethod
+    def profile_id(request_id: Optional[str]) -> str:
+        """
+        Uniek id voor een profiel; X-Request-ID (als bruikbaar als bestandsnaam) als prefix
+        Een herhaald of gekozen request id overschrijft zo nooit een ander profiel.
+        """
+        if request_id and REQUEST_ID.fullmatch(request_id):
+            return f'{request_id}-{uuid.uuid4().hex[:8]}'
+        return uuid.uuid4().hex
+
+    def save(self, profile_id: str, sampler: StackSampler, info: Dict) -> Dict:
+        """Bewaar het profiel (folded stacks) en de metadata; ruim oude profielen op"""
+        stacks = sampler.stop()
+        meta = dict(
+            info, id=profile_id, samples=sampler.samples,
+            interval_ms=round(sampler.interval * 1000, 3),
+            created_at=datetime.now().isoformat()
+        )
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+        folded = ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+        (self.folder / f'{profile_id}.folded').write_text(folded, encoding='utf-8')
+        (self.folder / f'{profile_id}.json').write_text(json.dumps(meta, ensure_ascii=False), encoding='utf-8')
+        self._prune()
+        return meta
+
+    def _prune(self):
+        with self._lock:
+            profiles = sorted(self.folder.glob('*.json'), key=lambda path: path.stat().st_mtime)
+            for path in profiles[:max(len(profiles) - self.retention, 0)]:
+                path.unlink(missing_ok=True)
+                path.with_suffix('.folded').unlink(missing_ok=True)
+
+    def list(self) -> List[Dict]:
+        """Metadata van de bewaarde profielen, nieuwste eerst"""
+        profiles = []
+        for path in self.folder.glob('*.json'):
+            try:
+                profiles.append(json.loads(path.read_text(encoding='utf-8')))
+            except (OSError, ValueError):
+                continue
+        return sorted(profiles, key=lambda meta: meta['created_at'], reverse=True)
+
+    def load(self, profile_id: str) -> Optional[str]:
+        """Folded stacks van een profiel, None als het niet (meer) bestaat"""
+        if not PROFILE_ID.fullmatch(profile_id):
+            return None
+        try:
+            return (self.folder / f'{profile_id}.folded').read_text(encoding='utf-8')
+        except FileNotFoundError:
+            return None
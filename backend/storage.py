@@ -0,0 +1,185 @@
+# backend/storage.py
+"""
+Content-addressed opslag voor geüploade documenten
+Bestanden worden bewaard onder hun SHA-256 in een gesharde mappenstructuur
+(uploads/ab/cd/abcd...pdf). Identieke documenten staan maar één keer op schijf;
+contracten verwijzen ernaar via referenties.
+"""
+
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterator, Optional
+
+
+CHUNK_SIZE = 64 * 1024
+
+BLOB_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS blobs (
+        sha256 TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS blob_refs (
+        contract_id TEXT NOT NULL,
+        doc_type TEXT NOT NULL,
+        sha256 TEXT NOT NULL,
+        PRIMARY KEY (contract_id, doc_type)
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS idx_blob_refs_sha256 ON blob_refs(sha256)',
+]
+
+
+class BlobStore:
+    """
+    Blob opslag met deduplicatie en reference counting
+    Metadata (blobs, referenties) staat in de gedeelde SQLite database.
+    """
+
+    def __init__(self, database, root: str):
+        self.database = database
+        self.root = root
+        with database.pool.transaction() as conn:
+            for statement in BLOB_SCHEMA:
+                conn.execute(statement)
+
+    def blob_path(self, sha256: str, extension: str = '') -> str:
+        """Gesharde locatie: twee niveaus van twee hex karakters"""
+        name = f'{sha256}.{extension}' if extension else sha256
+        return os.path.join(self.root, sha256[:2], sha256[2:4], name)
+
+    def save_stream(self, stream: BinaryIO, extension: str = '',
+                    contract_id: str = None, doc_type: str = None,
+                    chunk_size: int = CHUNK_SIZE) -> Dict:
+        """
+        Schrijf een stream naar de blob store en hash tijdens het schrijven
+        Met contract_id en doc_type wordt de referentie in dezelfde transactie gelegd.
+        Geeft {'sha256', 'path', 'size', 'deduplicated'} terug.
+        """
+        pending = self.write_chunks(iter(lambda: stream.read(chunk_size), b''))
+        return self.commit(pending, extension, contract_id, doc_type)
+
+    def write_chunks(self, chunks: Iterator[bytes]) -> Dict:
+        """
+        Schrijf chunks naar een tijdelijk bestand in de store en hash ze onderweg
+        Het resultaat moet nadien via commit() of discard() afgehandeld worden.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        return {'temp_path': temp_path, 'sha256': digest.hexdigest(), 'size': size}
+
+    def discard(self, pending: Dict):
+        if os.path.exists(pending['temp_path']):
+            os.remove(pending['temp_path'])
+
+    def commit(self, pending: Dict, extension: str = '',
+               contract_id: str = None, doc_type: str = None) -> Dict:
+        """Verplaats het tijdelijke bestand naar zijn definitieve plaats (of gooi het weg)"""
+        try:
+            return self._commit(pending, extension, contract_id, doc_type)
+        finally:
+            self.discard(pending)
+
+    def _commit(self, pending: Dict, extension: str,
+                contract_id: str = None, doc_type: str = None) -> Dict:
+        temp_path = pending['temp_path']
+        sha256 = pending['sha256']
+        size = pending['size']
+
+        with self.database.pool.transaction() as conn:
+            row = conn.execute(
+                'SELECT path FROM blobs WHERE sha256 = ?', (sha256,)
+            ).fetchone()
+
+            if row is not None and os.path.exists(row['path']):
+                path = row['path']
+                deduplicated = True
+            else:
+                path = self.blob_path(sha256, extension)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+                deduplicated = False
+
+                conn.execute(
+                    'INSERT OR REPLACE INTO blobs (sha256, path, size, created_at) VALUES (?, ?, ?, ?)',
+                    (sha256, path, size, datetime.now().isoformat())
+                )
+                if row is None:
+                    self.database.bump_counter(conn, 'blobs.count', 1)
+                    self.database.bump_counter(conn, 'blobs.bytes', size)
+
+            if contract_id and doc_type:
+                self._add_ref(conn, contract_id, doc_type, sha256)
+
+        return {'sha256': sha256, 'path': path, 'size': size, 'deduplicated': deduplicated}
+
+    def add_ref(self, contract_id: str, doc_type: str, sha256: str):
+        """Koppel een blob aan een contract document; een vorige versie wordt vrijgegeven"""
+        with self.database.pool.transaction() as conn:
+            self._add_ref(conn, contract_id, doc_type, sha256)
+
+    def _add_ref(self, conn, contract_id: str, doc_type: str, sha256: str):
+        row = conn.execute(
+            'SELECT sha256 FROM blob_refs WHERE contract_id = ? AND doc_type = ?',
+            (contract_id, doc_type)
+        ).fetchone()
+        conn.execute(
+            'INSERT OR REPLACE INTO blob_refs (contract_id, doc_type, sha256) VALUES (?, ?, ?)',
+            (contract_id, doc_type, sha256)
+        )
+        if row is not None and row['sha256'] != sha256:
+            self._collect(conn, row['sha256'])
+
+    def release_contract(self, contract_id: str):
+        """Geef alle blobs van een contract vrij (bij verwijderen)"""
+        with self.database.pool.transaction() as conn:
+            rows = conn.execute(
+                'SELECT sha256 FROM blob_refs WHERE contract_id = ?', (contract_id,)
+            ).fetchall()
+            conn.execute('DELETE FROM blob_refs WHERE contract_id = ?', (contract_id,))
+            for sha256 in {row['sha256'] for row in rows}:
+                self._collect(conn, sha256)
+
+    def _collect(self, conn, sha256: str):
+        """Verwijder een blob als er geen referenties meer naar zijn"""
+        in_use = conn.execute(
+            'SELECT 1 FROM blob_refs WHERE sha256 = ? LIMIT 1', (sha256,)
+        ).fetchone()
+        if in_use is not None:
+            return
+
+        row = conn.execute(
+            'SELECT path, size FROM blobs WHERE sha256 = ?', (sha256,)
+        ).fetchone()
+        if row is None:
+            return
+
+        conn.execute('DELETE FROM blobs WHERE sha256 = ?', (sha256,))
+        self.database.bump_counter(conn, 'blobs.count', -1)
+        self.database.bump_counter(conn, 'blobs.bytes', -row['size'])
+        if os.path.exists(row['path']):
+            os.remove(row['path'])
+
+    def get_path(self, sha256: str) -> Optional[str]:
+        with self.database.pool.connection() as conn:
+            row = conn.execute('SELECT path FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()
+        return row['path'] if row else None
@@ -0,0 +1,144 @@
+# backend/summary.py
+"""
+Samenvatting van een contract voor de preview
+De samenvatting wordt per proces gecached op de summary_revision van het
+contract. Die revisie wordt in de database verhoogd zodra status, form_data
+of documenten wijzigen (zie SUMMARY_KEYS); een GET kost dan één lookup van
+een integer kolom, zonder JSON decode of herberekening. De revisie is ook
+de ETag: een ongewijzigde samenvatting geeft 304.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from backend.fields import REQUIRED_DOCUMENTS, REQUIRED_FIELDS, as_number
+
+
+# Verhogen als de opbouw van de samenvatting wijzigt: oude ETags worden ongeldig
+SUMMARY_FORMAT = 1
+
+
+def summary_etag(contract_id: str, revision: int) -> str:
+    return f'{contract_id}.{SUMMARY_FORMAT}.{revision}'
+
+
+def build_summary(contract: Dict) -> Dict:
+    """Volledige samenvatting: partijen, goed, financieel, documenten, attesten"""
+    form_data = contract['form_data']
+
+    def calculate_completion():
+        total_items = len(REQUIRED_DOCUMENTS) + len(REQUIRED_FIELDS)
+        completed_items = 0
+
+        completed_items += len([d for d in REQUIRED_DOCUMENTS if d in contract['documents']])
+        completed_items += len([f for f in REQUIRED_FIELDS if form_data.get(f)])
+
+        return round((completed_items / total_items) * 100) if total_items > 0 else 0
+
+    summary = {
+        'contract_id': contract['id'],
+        'status': contract['status'],
+        'created_at': contract['created_at'],
+
+        'parties': {
+            'verkoper': {
+                'naam': form_data.get('verkoper_naam', ''),
+                'voornaam': form_data.get('verkoper_voornaam', ''),
+                'adres': form_data.get('verkoper_adres', ''),
+                'email': form_data.get('verkoper_email', ''),
+                'telefoon': form_data.get('verkoper_telefoonnummer', '')
+            },
+            'koper': {
+                'naam': form_data.get('koper_naam', ''),
+                'voornaam': form_data.get('koper_voornaam', ''),
+                'adres': form_data.get('koper_adres', ''),
+                'email': form_data.get('koper_email', ''),
+                'telefoon': form_data.get('koper_telefoonnummer', '')
+            }
+        },
+
+        'property': {
+            'adres': f"{form_data.get('goed_straat', '')} {form_data.get('goed_nummer', '')}",
+            'postcode': form_data.get('goed_postcode', ''),
+            'gemeente': form_data.get('goed_gemeente', ''),
+            'kadaster': {
+                'afdeling': form_data.get('goed_kadastrale_afdeling', ''),
+                'sectie': form_data.get('goed_kadastrale_sectie', ''),
+                'nummer': form_data.get('goed_kadastrale_nummer', ''),
+                'oppervlakte': form_data.get('goed_kadastrale_oppervlakte', '')
+            }
+        },
+
+        'financieel': {
+            'prijs_totaal': form_data.get('prijs_totaal', 0),
+            'voorschot': form_data.get('voorschot_bedrag', 0),
+            'saldo': as_number(form_data.get('prijs_totaal')) - as_number(form_data.get('voorschot_bedrag'))
+        },
+
+        'documents': {
+            doc_type: {
+                'uploaded': True,
+                'filename': doc_data['filename'],
+                'validation': doc_data['validation']
+            }
+            for doc_type, doc_data in contract['documents'].items()
+        },
+
+        'certificates': {
+            'epc': {
+                'code': form_data.get('epc_code', ''),
+                'label': form_data.get('epc_label', ''),
+                'datum': form_data.get('epc_datum', '')
+            },
+            'bodemattest': {
+                'referentie': form_data.get('bodem_attest_referentie', ''),
+                'datum': form_data.get('bodem_attest_datum', '')
+            }
+        },
+
+        'completion_percentage': calculate_completion()
+    }
+
+    return summary
+
+
+class SummaryCache:
+    """
+    LRU van samenvattingen per proces: contract_id -> (revisie, samenvatting)
+    Configuratie via environment:
+        SUMMARY_CACHE_SIZE   max aantal samenvattingen per worker (default 1000, 0 = uit)
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.getenv('SUMMARY_CACHE_SIZE', 1000)
+        )
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def get(self, contract_id: str, revision: int) -> Optional[Dict]:
+        with self._lock:
+            entry = self._cache.get(contract_id)
+            if entry is None or entry[0] != revision:
+                return None
+            self._cache.move_to_end(contract_id)
+            return entry[1]
+
+    def put(self, contract_id: str, revision: int, summary: Dict):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._cache[contract_id] = (revision, summary)
+            self._cache.move_to_end(contract_id)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def discard(self, contract_id: str):
+        with self._lock:
+            self._cache.pop(contract_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'cached_summaries': len(self._cache), 'max_entries': self.max_entries}
@@ -0,0 +1,238 @@
+# backend/template_engine.py
+"""
+Gecompileerde docxtpl templates
+De .docx template wordt één keer per proces ingelezen: de XML van body,
+headers en footers wordt door docxtpl voorbereid en als Jinja template
+gecompileerd, de overige onderdelen van het zip pakket blijven in geheugen.
+Een render vult enkel de velden in en schrijft een nieuw pakket; er wordt
+niets van schijf gelezen of opnieuw geparsed. Bij een gewijzigde mtime wordt
+de template opnieuw geladen.
+
+Ondersteund: velden, condities en loops ({{ }}, {% %}, {%p %}, {%tr %}, ...).
+InlineImage en Subdoc hebben het volledige docx object nodig en worden niet
+ondersteund.
+
+De voorbereiding gebruikt interne methodes van docxtpl (patch_xml,
+resolve_listing, fix_tables, get_headers_footers en de voorbewerking van
+render_xml_part). Die zijn enkel getest met DOCXTPL_VERSION (ook vastgezet in
+requirements.txt); met een andere versie rendert get_template via de gewone
+DocxTemplate API (DocxtplTemplate), trager maar zonder gekopieerde interne logica.
+"""
+
+import copy
+import hashlib
+import io
+import os
+import re
+import threading
+import warnings
+import zipfile
+from typing import BinaryIO, Dict, Set, Union
+
+import docx.oxml.ns
+import docxtpl
+from docxtpl import DocxTemplate
+from jinja2 import Environment, meta
+from lxml import etree
+
+
+# Versie van docxtpl waarvan de interne methodes hieronder nagevolgd en getest zijn
+DOCXTPL_VERSION = '0.16.7'
+
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# Waarden uit form_data worden ge-escaped: '&' of '<' in een naam breekt de XML niet
+jinja_env = Environment(autoescape=True)
+
+
+def _prepare_xml(xml: str) -> str:
+    # Zelfde voorbewerking als DocxTemplate.render_xml_part
+    return re.sub(r'<w:p([ >])', r'\n<w:p\1', xml)
+
+
+def _finish_xml(helper: DocxTemplate, xml: str) -> str:
+    xml = re.sub(r'\n<w:p([ >])', r'<w:p\1', xml)
+    xml = (xml
+           .replace('{_{', '{{')
+           .replace('}_}', '}}')
+           .replace('{_%', '{%')
+           .replace('%_}', '%}'))
+    return helper.resolve_listing(xml)
+
+
+class CompiledTemplate:
+    """Een geparste, voorbereide .docx template die herhaaldelijk gerenderd kan worden"""
+
+    def __init__(self, path: str):
+        self.path = path
+        stat = os.stat(path)
+        self.mtime = stat.st_mtime_ns
+        self.size = stat.st_size
+
+        with open(path, 'rb') as f:
+            source = f.read()
+
+        # Versie op basis van de inhoud: onderdeel van de fingerprint van gegenereerde contracten
+        self.version = hashlib.sha256(source).hexdigest()[:16]
+
+        # docxtpl enkel voor het voorbereiden; de helper houdt geen render state bij
+        self._helper = DocxTemplate(io.BytesIO(source))
+        self._helper.init_docx()
+        document = self._helper.docx
+
+        with zipfile.ZipFile(io.BytesIO(source)) as package:
+            self._entries = [(info, package.read(info)) for info in package.infolist()]
+
+        sources = {}
+
+        # Body: het document element zonder inhoud, de body als Jinja template
+        self._document_name = document.part.partname.lstrip('/')
+        self._document_shell = copy.deepcopy(document.element)
+        shell_body = self._document_shell.body
+        for child in list(shell_body):
+            shell_body.remove(child)
+        sources[self._document_name] = _prepare_xml(
+            self._helper.patch_xml(self._helper.get_xml())
+        )
+
+        # Headers en footers
+        for uri in (DocxTemplate.HEADER_URI, DocxTemplate.FOOTER_URI):
+            for _, part in self._helper.get_headers_footers(uri):
+                sources[part.partname.lstrip('/')] = _prepare_xml(
+                    self._helper.patch_xml(self._helper.get_part_xml(part))
+                )
+
+        # Document eigenschappen (titel, onderwerp, ...) enkel als ze velden bevatten
+        core_name = 'docProps/core.xml'
+        core_xml = {info.filename: data for info, data in self._entries}.get(core_name)
+        if core_xml is not None and b'{' in core_xml:
+            sources[core_name] = core_xml.decode('utf-8')
+
+        self._templates = {name: jinja_env.from_string(xml) for name, xml in sources.items()}
+
+        # De vaste onderdelen (styles, thema, media, ...) één keer comprimeren;
+        # een render kopieert dit pakket en voegt enkel de gerenderde delen toe
+        self._infos = {info.filename: info for info, _ in self._entries}
+        static = io.BytesIO()
+        with zipfile.ZipFile(static, 'w') as package:
+            for info, data in self._entries:
+                if info.filename not in self._templates:
+                    package.writestr(info, data)
+        self._static_package = static.getvalue()
+        self.variables: Set[str] = set()
+        for xml in sources.values():
+            self.variables |= meta.find_undeclared_variables(jinja_env.parse(xml))
+
+    def is_current(self) -> bool:
+        """False als het bestand op schijf gewijzigd werd sinds het laden"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return stat.st_mtime_ns == self.mtime and stat.st_size == self.size
+
+    def render_parts(self, context: Dict) -> Dict[str, bytes]:
+        """Gerenderde XML per onderdeel van het pakket"""
+        parts = {}
+        for name, template in self._templates.items():
+            xml = template.render(context)
+            if name == self._document_name:
+                parts[name] = self._render_document(xml)
+            elif name.startswith('word/'):
+                parts[name] = XML_DECLARATION + _finish_xml(self._helper, xml).encode('utf-8')
+            else:
+                parts[name] = xml.encode('utf-8')
+        return parts
+
+    def _render_document(self, body_xml: str) -> bytes:
+        body = self._helper.fix_tables(_finish_xml(self._helper, body_xml))
+
+        # docPr ids hernummeren (loops kunnen ids dupliceren)
+        for index, element in enumerate(
+                body.xpath('//wp:docPr', namespaces=docx.oxml.ns.nsmap), start=1001):
+            element.attrib['id'] = str(index)
+
+        root = copy.deepcopy(self._document_shell)
+        root.replace(root.body, body)
+        return etree.tostring(root, encoding='UTF-8', xml_declaration=True, standalone=True)
+
+    def render(self, context: Dict, output: Union[str, BinaryIO]):
+        """Render naar een pad of een (leeg, seekable) file object"""
+        parts = self.render_parts(context)
+        if isinstance(output, (str, os.PathLike)):
+            with open(output, 'w+b') as f:
+                self._write(parts, f)
+        else:
+            self._write(parts, output)
+        return output
+
+    def _write(self, parts: Dict[str, bytes], f: BinaryIO):
+        f.write(self._static_package)
+        with zipfile.ZipFile(f, 'a') as package:
+            for name, data in parts.items():
+                # writestr vult offset, CRC en groottes in op de ZipInfo: per write een kopie
+                package.writestr(copy.copy(self._infos[name]), data)
+
+
+class DocxtplTemplate:
+    """
+    Zelfde interface als CompiledTemplate, met de publieke DocxTemplate API
+    Elke render parset de template opnieuw; enkel gebruikt als de geïnstalleerde
+    docxtpl niet DOCXTPL_VERSION is.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        stat = os.stat(path)
+        self.mtime = stat.st_mtime_ns
+        self.size = stat.st_size
+
+        with open(path, 'rb') as f:
+            self._source = f.read()
+        self.version = hashlib.sha256(self._source).hexdigest()[:16]
+        self.variables: Set[str] = DocxTemplate(io.BytesIO(self._source)).get_undeclared_template_variables(jinja_env)
+
+    is_current = CompiledTemplate.is_current
+
+    def render(self, context: Dict, output: Union[str, BinaryIO]):
+        template = DocxTemplate(io.BytesIO(self._source))
+        template.render(context, autoescape=True)
+        template.save(output)
+        return output
+
+
+def _template_class():
+    if docxtpl.__version__ == DOCXTPL_VERSION:
+        return CompiledTemplate
+    warnings.warn(
+        f'docxtpl {docxtpl.__version__} is niet getest met CompiledTemplate '
+        f'(verwacht {DOCXTPL_VERSION}): templates worden zonder cache gerenderd'
+    )
+    return DocxtplTemplate
+
+
+_templates: Dict[str, CompiledTemplate] = {}
+_lock = threading.Lock()
+
+
+def get_template(path: str) -> CompiledTemplate:
+    """
+    Gecompileerde template uit de proces cache
+    Opnieuw geladen als het bestand gewijzigd is (mtime of grootte).
+    """
+    key = os.path.abspath(path)
+    template = _templates.get(key)
+    if template is not None and template.is_current():
+        return template
+
+    with _lock:
+        template = _templates.get(key)
+        if template is None or not template.is_current():
+            template = _template_class()(path)
+            _templates[key] = template
+    return template
+
+
+def clear_templates():
+    with _lock:
+        _templates.clear()
@@ -0,0 +1,251 @@
+# backend/uploads.py
+"""
+Streaming upload parsing
+Leest de request body in chunks (multipart of raw) zonder het bestand volledig
+in geheugen of in een tijdelijke spool te zetten. Het bestandstype wordt
+bepaald uit de eerste bytes, zodat niet-ondersteunde bestanden meteen
+geweigerd worden.
+"""
+
+import os
+import tempfile
+import zipfile
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from werkzeug.sansio.multipart import (
+    Data, Epilogue, Field, File, MultipartDecoder, NeedData, Preamble
+)
+
+
+CHUNK_SIZE = 64 * 1024
+MAX_FIELD_SIZE = 4 * 1024
+
+# Magic bytes -> extensie
+FILE_SIGNATURES = [
+    (b'%PDF-', 'pdf'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+]
+# Batch uploads aanvaarden ook een ZIP met alle documenten van een dossier
+ZIP_SIGNATURES = FILE_SIGNATURES + [(b'PK\x03\x04', 'zip')]
+SNIFF_SIZE = max(len(signature) for signature, _ in ZIP_SIGNATURES)
+
+MAX_ZIP_MEMBERS = 20
+MAX_ZIP_MEMBER_SIZE = 16 * 1024 * 1024
+
+
+class UploadError(ValueError):
+    """Ongeldige upload; `status` is de HTTP status code voor de client"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_file_type(head: bytes, signatures=FILE_SIGNATURES) -> Optional[str]:
+    """Extensie op basis van de eerste bytes, None als het type niet ondersteund is"""
+    for signature, extension in signatures:
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+def sniff_chunks(chunks: Iterator[bytes],
+                 signatures=FILE_SIGNATURES) -> Tuple[str, Iterator[bytes]]:
+    """
+    Lees net genoeg chunks om het bestandstype te bepalen
+    Geeft (extensie, iterator over alle chunks) terug; UploadError (415) als het
+    type niet ondersteund is, nog voor de rest van het bestand gelezen wordt.
+    """
+    head = b''
+    buffered = []
+    for chunk in chunks:
+        buffered.append(chunk)
+        head += chunk[:SNIFF_SIZE]
+        if len(head) >= SNIFF_SIZE:
+            break
+
+    if not head:
+        raise UploadError('Leeg bestand')
+
+    extension = sniff_file_type(head, signatures)
+    if extension is None:
+        names = [name.upper() for _, name in signatures]
+        raise UploadError(
+            f"Bestandstype niet ondersteund (enkel {', '.join(names[:-1])} of {names[-1]})", 415
+        )
+
+    def replay():
+        yield from buffered
+        yield from chunks
+
+    return extension, replay()
+
+
+def iter_raw_chunks(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    return iter(lambda: stream.read(chunk_size), b'')
+
+
+def iter_multipart_events(stream: BinaryIO, boundary: bytes,
+                          chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """
+    Incrementele multipart parser: Field, File en Data events
+    De buffer van de decoder blijft begrensd tot enkele chunks.
+    """
+    decoder = MultipartDecoder(boundary, max_form_memory_size=chunk_size * 4)
+
+    def next_event():
+        # Afgebroken of misvormde body (client weg, verkeerde boundary): 400, geen 500
+        try:
+            return decoder.next_event()
+        except ValueError:
+            raise UploadError('Ongeldige multipart body')
+
+    while True:
+        chunk = stream.read(chunk_size)
+        try:
+            decoder.receive_data(chunk if chunk else None)
+        except ValueError:
+            raise UploadError('Ongeldige multipart body')
+
+        event = next_event()
+        while not isinstance(event, (NeedData, Epilogue)):
+            if not isinstance(event, Preamble):
+                yield event
+            event = next_event()
+
+        if isinstance(event, Epilogue):
+            return
+
+
+def iter_part_data(events: Iterator) -> Iterator[bytes]:
+    """Data van het huidige multipart deel, tot het einde van dat deel"""
+    for event in events:
+        if not isinstance(event, Data):
+            raise UploadError('Ongeldige multipart body')
+        if event.data:
+            yield event.data
+        if not event.more_data:
+            return
+
+
+def read_field(events: Iterator) -> str:
+    value = b''
+    for data in iter_part_data(events):
+        value += data
+        if len(value) > MAX_FIELD_SIZE:
+            raise UploadError('Formulierveld te groot')
+    return value.decode('utf-8', errors='replace')
+
+
+def stream_multipart_files(stream: BinaryIO, boundary: str, handle_file,
+                           chunk_size: int = CHUNK_SIZE) -> Tuple[Dict, List]:
+    """
+    Verwerk een multipart upload met meerdere bestanden in één doorgang
+    Voor elk bestandsdeel wordt handle_file(name, filename, form, chunks)
+    aangeroepen met de velden die er vóór kwamen en een iterator over de
+    bestandsdata. Geeft (form, resultaten van handle_file) terug; None
+    resultaten (overgeslagen delen) worden weggelaten.
+    """
+    events = iter_multipart_events(stream, boundary.encode('latin-1'), chunk_size)
+    form = {}
+    results = []
+
+    for event in events:
+        if isinstance(event, Field):
+            form[event.name] = read_field(events)
+        elif isinstance(event, File):
+            chunks = iter_part_data(events)
+            result = handle_file(event.name, event.filename, dict(form), chunks)
+            if result is not None:
+                results.append(result)
+            # Overgeslagen of onvolledig gelezen delen leegmaken
+            for _ in chunks:
+                pass
+
+    return form, results
+
+
+def stream_multipart_upload(stream: BinaryIO, boundary: str, handle_file,
+                            chunk_size: int = CHUNK_SIZE) -> Tuple[Dict, object]:
+    """
+    Verwerk een multipart upload met één bestand
+    Voor het eerste 'file' deel wordt handle_file(filename, form, chunks)
+    aangeroepen; andere bestandsdelen worden overgeslagen. Geeft (form,
+    resultaat van handle_file) terug.
+    """
+    handled = []
+
+    def handle_first_file(name, filename, form, chunks):
+        if name != 'file' or handled:
+            return None
+        handled.append(True)
+        return handle_file(filename, form, chunks)
+
+    form, results = stream_multipart_files(stream, boundary, handle_first_file, chunk_size)
+    return form, results[0] if results else None
+
+
+def doc_type_from_filename(filename: str, doc_types: Iterable[str]) -> Optional[str]:
+    """
+    Document type afleiden uit een bestandsnaam (voor documenten in een ZIP)
+    'epc.pdf', 'EPC_2024.pdf' en 'kadaster - perceel 12.pdf' worden herkend;
+    bij overlap wint het langste type.
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0].lower()
+    for doc_type in sorted(doc_types, key=len, reverse=True):
+        if stem == doc_type:
+            return doc_type
+        if stem.startswith(doc_type) and stem[len(doc_type)] in '_- ':
+            return doc_type
+    return None
+
+
+def iter_zip_documents(chunks: Iterator[bytes], max_members: int = MAX_ZIP_MEMBERS,
+                       max_member_size: int = MAX_ZIP_MEMBER_SIZE,
+                       chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, Iterator[bytes]]]:
+    """
+    Documenten uit een ZIP archief, gesorteerd op naam
+    Een ZIP kan niet sequentieel gelezen worden; het archief gaat eerst naar
+    een tijdelijk bestand. Geeft (bestandsnaam, chunks) per document; mappen
+    en verborgen bestanden (__MACOSX, .DS_Store) worden overgeslagen.
+    """
+    with tempfile.TemporaryFile() as archive_file:
+        for chunk in chunks:
+            archive_file.write(chunk)
+        archive_file.seek(0)
+
+        try:
+            archive = zipfile.ZipFile(archive_file)
+        except zipfile.BadZipFile:
+            raise UploadError('Ongeldig ZIP bestand')
+
+        with archive:
+            members = [
+                info for info in archive.infolist()
+                if not info.is_dir() and not any(
+                    part.startswith(('.', '__MACOSX')) for part in info.filename.split('/')
+                )
+            ]
+            if len(members) > max_members:
+                raise UploadError(f'Te veel bestanden in ZIP (max {max_members})', 413)
+
+            for info in sorted(members, key=lambda info: info.filename):
+                if info.file_size > max_member_size:
+                    raise UploadError(f'Bestand te groot in ZIP: {info.filename}', 413)
+                yield info.filename, _iter_zip_member(archive, info, max_member_size, chunk_size)
+
+
+def _iter_zip_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo,
+                     max_size: int, chunk_size: int) -> Iterator[bytes]:
+    # file_size uit de header is niet te vertrouwen: ook tijdens het uitpakken begrenzen
+    size = 0
+    try:
+        with archive.open(info) as member:
+            for chunk in iter(lambda: member.read(chunk_size), b''):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadError(f'Bestand te groot in ZIP: {info.filename}', 413)
+                yield chunk
+    except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+        raise UploadError(f'Kan {info.filename} niet uitpakken: {e}')
@@ -0,0 +1,191 @@
+# backend/validation.py
+"""
+Declaratieve validatie van contracten
+Elke regel declareert van welke velden (form_data) en documenten ze afhangt.
+Bij een wijziging worden enkel de geraakte regels opnieuw geëvalueerd; het
+resultaat per regel staat in contract['validation']['issues'], zodat de
+validatie na elke write up-to-date is zonder alles opnieuw te controleren.
+
+Een regel toevoegen:
+
+    @rule('prijs.minimum', fields=['prijs_totaal'])
+    def check_minimum(form_data, documents):
+        if ...:
+            yield 'warning', 'Koopprijs is opvallend laag'
+"""
+
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from backend.fields import EMAIL_FIELDS, REQUIRED_DOCUMENTS, REQUIRED_FIELDS, as_number
+
+
+# Verhogen als regels wijzigen: opgeslagen validaties worden dan volledig herberekend
+RULES_VERSION = 1
+
+
+class Rule(NamedTuple):
+    name: str
+    fields: frozenset
+    documents: frozenset
+    check: Callable
+
+
+RULES: List[Rule] = []
+
+
+def rule(name: str, fields: Iterable[str] = (), documents: Iterable[str] = ()):
+    """Registreer een regel; check(form_data, documents) yield't (niveau, melding)"""
+    def register(check):
+        RULES.append(Rule(name, frozenset(fields), frozenset(documents), check))
+        return check
+    return register
+
+
+# Verplichte documenten
+for _doc_type in REQUIRED_DOCUMENTS:
+    def _check_document(form_data, documents, doc_type=_doc_type):
+        if doc_type not in documents:
+            yield 'error', f'Document {doc_type} is verplicht'
+
+    rule(f'document.{_doc_type}', documents=[_doc_type])(_check_document)
+
+
+# Verplichte velden
+for _field, _label in REQUIRED_FIELDS.items():
+    def _check_required(form_data, documents, field=_field, label=_label):
+        if not form_data.get(field):
+            yield 'error', f'{label} is verplicht'
+
+    rule(f'required.{_field}', fields=[_field])(_check_required)
+
+
+# Business logic validaties
+@rule('prijs.voorschot', fields=['prijs_totaal', 'voorschot_bedrag'])
+def check_voorschot(form_data, documents):
+    if not (form_data.get('prijs_totaal') and form_data.get('voorschot_bedrag')):
+        return
+
+    # Bij het schrijven al omgezet naar getallen (backend.fields)
+    prijs = as_number(form_data['prijs_totaal'], None)
+    voorschot = as_number(form_data['voorschot_bedrag'], None)
+    if prijs is None or voorschot is None:
+        yield 'error', 'Prijs en voorschot moeten numerieke waarden zijn'
+        return
+
+    if voorschot > prijs:
+        yield 'error', 'Voorschot kan niet hoger zijn dan de koopprijs'
+
+    if voorschot < 2500:
+        yield 'warning', 'Voorschot is lager dan gebruikelijk minimum (€2.500)'
+
+    if voorschot > prijs * 0.3:
+        yield 'warning', 'Voorschot is hoger dan 30% van de koopprijs'
+
+
+# Email validatie
+for _field in EMAIL_FIELDS:
+    def _check_email(form_data, documents, field=_field):
+        if form_data.get(field) and '@' not in str(form_data[field]):
+            yield 'error', f'{field} is geen geldig email adres'
+
+    rule(f'email.{_field}', fields=[_field])(_check_email)
+
+
+# Opzoektabellen: welk veld / document raakt welke regels
+RULE_ORDER = {r.name: index for index, r in enumerate(RULES)}
+RULES_BY_FIELD: Dict[str, List[Rule]] = {}
+RULES_BY_DOCUMENT: Dict[str, List[Rule]] = {}
+for _rule in RULES:
+    for _field in _rule.fields:
+        RULES_BY_FIELD.setdefault(_field, []).append(_rule)
+    for _doc_type in _rule.documents:
+        RULES_BY_DOCUMENT.setdefault(_doc_type, []).append(_rule)
+
+
+def affected_rules(fields: Iterable[str] = (), documents: Iterable[str] = ()) -> List[Rule]:
+    affected = {}
+    for field in fields:
+        for r in RULES_BY_FIELD.get(field, ()):
+            affected[r.name] = r
+    for doc_type in documents:
+        for r in RULES_BY_DOCUMENT.get(doc_type, ()):
+            affected[r.name] = r
+    return list(affected.values())
+
+
+def _summarize(issues: Dict[str, List]) -> Dict:
+    """Meldingen in de volgorde van de regels, zoals de volledige validatie ze geeft"""
+    errors = []
+    warnings = []
+    for name in sorted(issues, key=lambda name: RULE_ORDER.get(name, len(RULE_ORDER))):
+        for level, message in issues[name]:
+            (errors if level == 'error' else warnings).append(message)
+
+    return {
+        'is_valid': len(errors) == 0,
+        'errors': errors,
+        'warnings': warnings,
+        'validated_at': datetime.now().isoformat(),
+        'rules_version': RULES_VERSION,
+        'issues': issues
+    }
+
+
+def _evaluate(rules: Iterable[Rule], contract: Dict, issues: Dict[str, List]) -> Dict[str, List]:
+    form_data = contract.get('form_data', {})
+    documents = contract.get('documents', {})
+    for r in rules:
+        found = [[level, message] for level, message in r.check(form_data, documents)]
+        if found:
+            issues[r.name] = found
+        else:
+            issues.pop(r.name, None)
+    return issues
+
+
+def is_current(validation: Optional[Dict]) -> bool:
+    """True als de opgeslagen validatie door deze versie van de regels gemaakt werd"""
+    return bool(validation) and validation.get('rules_version') == RULES_VERSION
+
+
+def validate(contract: Dict) -> Dict:
+    """Volledige validatie van alle regels"""
+    return _summarize(_evaluate(RULES, contract, {}))
+
+
+def current_validation(contract: Dict) -> Dict:
+    """De opgeslagen validatie, of een volledige als die ontbreekt of verouderd is"""
+    validation = contract.get('validation')
+    return validation if is_current(validation) else validate(contract)
+
+
+def revalidate(contract: Dict, fields: Iterable[str] = (), documents: Iterable[str] = ()) -> Dict:
+    """
+    Werk contract['validation'] bij na een wijziging van de gegeven velden/documenten
+    Enkel de geraakte regels worden opnieuw geëvalueerd.
+    """
+    validation = contract.get('validation')
+    if not is_current(validation):
+        contract['validation'] = validate(contract)
+        return contract['validation']
+
+    rules = affected_rules(fields, documents)
+    if rules:
+        issues = _evaluate(rules, contract, dict(validation.get('issues', {})))
+        contract['validation'] = _summarize(issues)
+    return contract['validation']
+
+
+def public_validation(validation: Dict) -> Dict:
+    """Validatie zoals de API ze teruggeeft, zonder de interne resultaten per regel"""
+    return {
+        key: validation.get(key)
+        for key in ('is_valid', 'errors', 'warnings', 'validated_at')
+    }
+
+
+def changed_fields(old: Dict, new: Dict) -> List[str]:
+    """Velden van `new` die een andere waarde hebben dan in `old`"""
+    missing = object()
+    return [key for key, value in new.items() if old.get(key, missing) != value]
@@ -0,0 +1,163 @@
+# backend/warmup.py
+"""
+Warmup bij het opstarten
+De request handlers importeren DocumentProcessor en ContractGenerator pas bij
+het eerste gebruik; zonder warmup betaalt het eerste request van elke worker
+de import van python-docx, lxml, docxtpl en PyPDF2, het compileren van de
+parser regexen en het opbouwen van het basisdocument.
+
+Onder gunicorn draait de warmup één keer in het master proces, voor de
+workers geforkt worden (pre_fork in gunicorn.conf.py, met preload_app): alle
+workers delen dan het opgewarmde geheugen copy-on-write. Zonder hook start
+/health de warmup in de achtergrond; /health is pas groen als ze klaar is.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+# Beschikbare stappen, in volgorde van uitvoering
+WARMUP_STEPS = ('imports', 'parsers', 'templates', 'render')
+
+
+def _imports():
+    import docx  # noqa: F401
+    import docxtpl  # noqa: F401
+    import lxml.etree  # noqa: F401
+    import PyPDF2  # noqa: F401
+    import backend.document_processor  # noqa: F401
+    import backend.word_generator  # noqa: F401
+
+
+def _parsers():
+    from backend.document_processor import DocumentProcessor
+
+    for parser_class in DocumentProcessor.PARSERS.values():
+        parser_class.compiled_patterns()
+
+
+def _templates():
+    from backend.template_engine import get_template
+    from backend.word_generator import ContractGenerator, get_base_document
+
+    get_base_document()
+    generator = ContractGenerator()
+    if generator.has_template():
+        get_template(generator.template_path)
+
+
+def _render():
+    from backend.fields import TEMPLATE_FIELDS
+    from backend.word_generator import ContractGenerator
+
+    form_data = dict({field: 'warmup' for field in TEMPLATE_FIELDS},
+                     prijs_totaal=1, voorschot_bedrag=0)
+    generator = ContractGenerator()
+    generator.fingerprint(form_data)
+    generator.generate_bytes(form_data)
+
+
+STEPS = {
+    'imports': _imports,
+    'parsers': _parsers,
+    'templates': _templates,
+    'render': _render,
+}
+
+
+class Warmup:
+    """
+    Opwarmen van imports, regexen, templates en een dummy render
+    Configuratie via environment:
+        WARMUP   komma-gescheiden stappen: imports,parsers,templates,render (default alle),
+                 'none' om uit te schakelen
+    """
+
+    def __init__(self, steps: List[str] = None):
+        if steps is None:
+            configured = os.getenv('WARMUP', ','.join(WARMUP_STEPS)).strip()
+            steps = [] if configured == 'none' else [s.strip() for s in configured.split(',') if s.strip()]
+        unknown = [step for step in steps if step not in STEPS]
+        if unknown:
+            raise ValueError(f"Onbekende warmup stap(pen): {', '.join(unknown)}")
+
+        self.steps = [step for step in WARMUP_STEPS if step in steps]
+        self._lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self.report: Optional[Dict] = None
+        if not self.steps:
+            # Niets op te warmen (WARMUP=none): meteen gezond, ook zonder pre_fork hook
+            self.report = {
+                'pid': os.getpid(),
+                'steps': {},
+                'errors': {},
+                'total_ms': 0.0,
+                'finished_at': datetime.now().isoformat()
+            }
+
+    @property
+    def done(self) -> bool:
+        return self.report is not None
+
+    def run(self) -> Dict:
+        """Voer de warmup uit (één keer; na een fork geërfd door de workers)"""
+        if self.report is not None:
+            return self.report
+
+        with self._lock:
+            if self.report is not None:
+                return self.report
+
+            from backend.metrics import metrics
+
+            started = time.perf_counter()
+            timings = {}
+            errors = {}
+            for step in self.steps:
+                step_started = time.perf_counter()
+                try:
+                    # De dummy render telt niet mee in /api/metrics
+                    with metrics.suppressed():
+                        STEPS[step]()
+                except Exception as e:
+                    # Een mislukte stap houdt de worker niet tegen; ze gebeurt dan bij het eerste request
+                    errors[step] = str(e)
+                timings[step] = round((time.perf_counter() - step_started) * 1000, 1)
+
+            self.report = {
+                'pid': os.getpid(),
+                'steps': timings,
+                'errors': errors,
+                'total_ms': round((time.perf_counter() - started) * 1000, 1),
+                'finished_at': datetime.now().isoformat()
+            }
+        return self.report
+
+    def start_background(self):
+        """Warmup in een achtergrond thread van dit proces (als geen hook ze uitvoerde)"""
+        if self.report is not None:
+            return
+        pid = os.getpid()
+        with self._thread_lock:
+            if self._thread_pid != pid:
+                self._thread = threading.Thread(target=self.run, name='warmup', daemon=True)
+                self._thread.start()
+                self._thread_pid = pid
+
+    def status(self) -> Dict:
+        if self.report is not None:
+            return dict(self.report, state='done')
+        return {'state': 'running' if self._thread_pid == os.getpid() else 'pending', 'steps': self.steps}
+
+
+def format_report(report: Dict) -> str:
+    steps = ', '.join(f'{step} {ms} ms' for step, ms in report['steps'].items())
+    line = f"Warmup klaar in {report['total_ms']} ms (pid {report['pid']}): {steps or 'geen stappen'}"
+    if report['errors']:
+        line += f" - mislukt: {', '.join(report['errors'])}"
+    return line
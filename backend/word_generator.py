@@ -1,36 +1,244 @@
 # backend/word_generator.py
 """
 Word Document Generator voor Makelaar Contracten
-Gebruikt python-docx voor simple contracts
-Voor template-based: gebruik docxtpl (zie comments)
+Template-based via docxtpl (gecompileerde template, zie template_engine.py);
+zonder template wordt een eenvoudig contract opgebouwd met python-docx,
+vertrekkend van een opgemaakt basisdocument dat één keer per proces gebouwd wordt
 """
 
 from docx import Document
+from docx.document import Document as DocumentObject
+from docx.opc.oxml import serialize_part_xml
 from docx.shared import Pt, Inches, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.table import Table
+from docx.text.paragraph import Paragraph
 from datetime import datetime
+import copy
+import hashlib
+import io
+import json
 import os
-from typing import Dict
+import threading
+import zipfile
+from typing import BinaryIO, Dict, List, Union
+
+from backend.fields import TEMPLATE_FIELDS, as_number
+from backend.metrics import metrics
+from backend.template_engine import get_template
+
+
+# Verhogen bij elke wijziging aan generate_simple_contract (invalideert fingerprints)
+SIMPLE_CONTRACT_VERSION = 1
+
+
+class BaseDocument:
+    """
+    Opgemaakt skelet voor generate_simple_contract
+    Document() pakt python-docx's standaard template uit en parset alle
+    onderdelen; dat gebeurt hier één keer per proces, samen met de Normal
+    stijl (Arial 11pt) en de vaste tekstblokken (algemene bepalingen,
+    handtekening tabel, footer). Een contract start van een kopie van enkel
+    het document element; styles, thema, settings, ... worden als reeds
+    gecomprimeerd zip pakket hergebruikt.
+    """
+
+    def __init__(self):
+        document = Document()
+
+        # Styling
+        style = document.styles['Normal']
+        font = style.font
+        font.name = 'Arial'
+        font.size = Pt(11)
+
+        # Alleen-lezen gedeeld tussen renders: stijl opzoekingen, sectie breedte
+        self.part = _StyleIdCache(document.part)
+        self._document_name = document.part.partname.lstrip('/')
+        self._shell = copy.deepcopy(document.element)
+
+        # Vaste tekstblokken, opgebouwd met de python-docx API op een kladdocument
+        self._blocks = {}
+        scratch = self.new_document()
+
+        start = len(scratch.element.body) - 1
+        scratch.add_heading('ALGEMENE BEPALINGEN', 1)
+        p = scratch.add_paragraph()
+        p.add_run('Staat: ').bold = True
+        p.add_run('Het goed wordt verkocht in de huidige staat, zonder waarborg voor zichtbare of verborgen gebreken.\n\n')
+        p.add_run('Eigendomsoverdracht: ').bold = True
+        p.add_run('De eigendom gaat over bij het verlijden van de authentieke akte.\n\n')
+        p.add_run('Kosten: ').bold = True
+        p.add_run('De kosten van de authentieke akte komen ten laste van de koper.\n\n')
+        start = self._block(scratch, 'bepalingen', start)
+
+        # Handtekening tabel: headers en ruimte voor handtekening
+        table = scratch.add_table(rows=4, cols=2)
+        table.style = 'Light Grid Accent 1'
+        table.cell(0, 0).text = 'De Verkoper'
+        table.cell(0, 1).text = 'De Koper'
+        table.cell(1, 0).text = '\n\n\n'
+        table.cell(1, 1).text = '\n\n\n'
+        start = self._block(scratch, 'handtekeningen', start)
+
+        # Footer
+        scratch.add_page_break()
+        p = scratch.add_paragraph()
+        p.add_run('Dit contract is gegenereerd door Makelaar Contract Generator.\n').italic = True
+        p.add_run('Voor officieel gebruik dient dit contract door een notaris geverifieerd te worden.').italic = True
+        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        self._block(scratch, 'footer', start)
+
+        # Alle onderdelen behalve document.xml één keer comprimeren
+        source = io.BytesIO()
+        document.save(source)
+        static = io.BytesIO()
+        with zipfile.ZipFile(source) as package, zipfile.ZipFile(static, 'w', zipfile.ZIP_DEFLATED) as out:
+            for info in package.infolist():
+                if info.filename == self._document_name:
+                    self._document_info = info
+                else:
+                    out.writestr(info, package.read(info))
+        self._static_package = static.getvalue()
+
+    def _block(self, scratch: DocumentObject, name: str, start: int) -> int:
+        """Bewaar de elementen die sinds `start` aan het kladdocument toegevoegd werden"""
+        body = scratch.element.body
+        end = len(body) - 1  # sectPr blijft laatste
+        self._blocks[name] = [body[index] for index in range(start, end)]
+        return end
+
+    def new_document(self) -> DocumentObject:
+        """
+        Leeg, opgemaakt document; goedkoop (enkel het document element wordt gekopieerd)
+        Enkel de body mag gewijzigd worden: styles, numbering, secties, headers en
+        afbeeldingen horen bij het gedeelde part en het vaste pakket, en worden niet
+        opgeslagen. Het part laat daarom enkel stijl opzoekingen toe.
+        """
+        return DocumentObject(copy.deepcopy(self._shell), self.part)
+
+    def add_block(self, doc: DocumentObject, name: str) -> List:
+        """Voeg een kopie van een vast tekstblok toe; geeft de toegevoegde elementen terug"""
+        sect_pr = doc.element.body.sectPr
+        elements = [copy.deepcopy(element) for element in self._blocks[name]]
+        for element in elements:
+            sect_pr.addprevious(element)
+        return elements
+
+    def save(self, doc: DocumentObject, output: Union[str, BinaryIO]):
+        """Schrijf naar een pad of een (leeg, seekable) file object"""
+        xml = serialize_part_xml(doc.element)
+        if isinstance(output, (str, os.PathLike)):
+            with open(output, 'w+b') as f:
+                self._write(xml, f)
+        else:
+            self._write(xml, output)
+        return output
+
+    def _write(self, xml: bytes, f: BinaryIO):
+        f.write(self._static_package)
+        with zipfile.ZipFile(f, 'a') as package:
+            # writestr vult offset, CRC en groottes in op de ZipInfo: per write een kopie
+            package.writestr(copy.copy(self._document_info), xml)
+
+
+class _StyleIdCache:
+    """
+    Alleen-lezen document part met gememoriseerde stijl opzoekingen
+    python-docx zoekt bij elke heading of stijl alle stijlen af (ook voor de
+    default stijl); de stijlen van het basisdocument wijzigen niet meer.
+    Het part wordt gedeeld door alle documenten van het proces: al de rest
+    (doc.styles, secties, headers, afbeeldingen) geeft een AttributeError in
+    plaats van het gedeelde part stil te wijzigen.
+    """
+
+    def __init__(self, part):
+        self._part = part
+        self._style_ids = {}
+
+    def get_style_id(self, style_or_name, style_type):
+        if not isinstance(style_or_name, str):
+            return self._part.get_style_id(style_or_name, style_type)
+        key = (style_or_name, style_type)
+        if key not in self._style_ids:
+            self._style_ids[key] = self._part.get_style_id(style_or_name, style_type)
+        return self._style_ids[key]
+
+    def __getattr__(self, name):
+        raise AttributeError(
+            f"'{name}' is niet beschikbaar op een document uit het basisdocument: "
+            'enkel de body kan gewijzigd worden'
+        )
+
+
+_base_document = None
+_base_lock = threading.Lock()
+
+
+def get_base_document() -> BaseDocument:
+    """Het basisdocument uit de proces cache (na een fork gedeeld, copy-on-write)"""
+    global _base_document
+    if _base_document is None:
+        with _base_lock:
+            if _base_document is None:
+                _base_document = BaseDocument()
+    return _base_document
 
 
 class ContractGenerator:
     """Genereer Word contract uit data"""
     
-    def __init__(self, template_path: str = "backend/templates/template.docx"):
-        self.template_path = template_path
+    def __init__(self, template_path: str = None):
+        # Zelfde locatie als database.get_template_path()
+        self.template_path = template_path or os.getenv(
+            'TEMPLATE_PATH', 'backend/templates/template.docx'
+        )
+    
+    def has_template(self) -> bool:
+        return os.path.exists(self.template_path)
+    
+    def template_version(self) -> str:
+        """Versie van de template (inhoud) of van het eenvoudige contract"""
+        if self.has_template():
+            return get_template(self.template_path).version
+        return f'simple-v{SIMPLE_CONTRACT_VERSION}'
+    
+    def fingerprint(self, form_data: Dict) -> str:
+        """
+        Fingerprint van het document dat generate() zou opleveren
+        Over de genormaliseerde context (prepare_data, inclusief de aktedatum)
+        en de template versie; metadata velden ('_processed_at', ...) tellen niet mee.
+        """
+        context = {
+            key: value for key, value in self.prepare_data(form_data).items()
+            if not key.startswith('_')
+        }
+        payload = json.dumps(
+            {'template': self.template_version(), 'data': context},
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def generate(self, form_data: Dict, output_path: str):
+        """Genereer met de template als die er is, anders het eenvoudige contract"""
+        if self.has_template():
+            return self.generate_from_template(form_data, output_path)
+        return self.generate_simple_contract(form_data, output_path)
     
     def generate_simple_contract(self, form_data: Dict, output_path: str):
         """
         Genereer een eenvoudig contract zonder template
         Perfect voor demo en testing
         """
-        doc = Document()
+        with metrics.stage('docx_build'):
+            doc = self._build_simple_contract(form_data)
         
-        # Styling
-        style = doc.styles['Normal']
-        font = style.font
-        font.name = 'Arial'
-        font.size = Pt(11)
+        with metrics.stage('docx_save'):
+            return get_base_document().save(doc, output_path)
+    
+    def _build_simple_contract(self, form_data: Dict) -> DocumentObject:
+        base = get_base_document()
+        doc = base.new_document()
         
         # Titel
         title = doc.add_heading('ONDERHANDSE VERKOOPOVEREENKOMST', 0)
@@ -106,7 +314,7 @@ class ContractGenerator:
         
         if form_data.get('prijs_totaal') and form_data.get('voorschot_bedrag'):
             try:
-                saldo = float(form_data['prijs_totaal']) - float(form_data['voorschot_bedrag'])
+                saldo = as_number(form_data['prijs_totaal'], None) - as_number(form_data['voorschot_bedrag'], None)
                 p.add_run('Saldo: ').bold = True
                 p.add_run(f"€ {saldo:.2f}\n")
             except:
@@ -142,18 +350,8 @@ class ContractGenerator:
             vergunning = 'Ja' if form_data.get('stedenbouw_vergunning_afgeleverd') else 'Nee'
             p.add_run(f"• Vergunning afgeleverd: {vergunning}\n")
         
-        # ALGEMENE BEPALINGEN
-        doc.add_heading('ALGEMENE BEPALINGEN', 1)
-        
-        p = doc.add_paragraph()
-        p.add_run('Staat: ').bold = True
-        p.add_run('Het goed wordt verkocht in de huidige staat, zonder waarborg voor zichtbare of verborgen gebreken.\n\n')
-        
-        p.add_run('Eigendomsoverdracht: ').bold = True
-        p.add_run('De eigendom gaat over bij het verlijden van de authentieke akte.\n\n')
-        
-        p.add_run('Kosten: ').bold = True
-        p.add_run('De kosten van de authentieke akte komen ten laste van de koper.\n\n')
+        # ALGEMENE BEPALINGEN (vaste clausules uit het basisdocument)
+        p = Paragraph(base.add_block(doc, 'bepalingen')[-1], doc._body)
         
         if form_data.get('notaris_verkoper') or form_data.get('notaris_koper'):
             p.add_run('Notarissen: ').bold = True
@@ -174,17 +372,8 @@ class ContractGenerator:
         
         doc.add_paragraph()
         
-        # Handtekening tabel
-        table = doc.add_table(rows=4, cols=2)
-        table.style = 'Light Grid Accent 1'
-        
-        # Headers
-        table.cell(0, 0).text = 'De Verkoper'
-        table.cell(0, 1).text = 'De Koper'
-        
-        # Ruimte voor handtekening
-        table.cell(1, 0).text = '\n\n\n'
-        table.cell(1, 1).text = '\n\n\n'
+        # Handtekening tabel (headers en ruimte voor handtekening uit het basisdocument)
+        table = Table(base.add_block(doc, 'handtekeningen')[0], doc._body)
         
         # Namen
         table.cell(2, 0).text = f"{form_data.get('verkoper_voornaam', '')} {form_data.get('verkoper_naam', '')}"
@@ -196,43 +385,35 @@ class ContractGenerator:
         table.cell(3, 1).text = f"Datum: {datum}"
         
         # Footer
-        doc.add_page_break()
-        p = doc.add_paragraph()
-        p.add_run('Dit contract is gegenereerd door Makelaar Contract Generator.\n').italic = True
-        p.add_run('Voor officieel gebruik dient dit contract door een notaris geverifieerd te worden.').italic = True
-        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        base.add_block(doc, 'footer')
         
-        # Save
-        doc.save(output_path)
-        return output_path
+        return doc
+    
+    def generate_bytes(self, form_data: Dict) -> bytes:
+        """Genereer het contract in geheugen (geen tijdelijke bestanden)"""
+        buffer = io.BytesIO()
+        self.generate(form_data, buffer)
+        return buffer.getvalue()
     
     def generate_from_template(self, form_data: Dict, output_path: str):
         """
         Genereer Word document uit template met docxtpl
-        Voor productie met je eigen template
-        
-        Uncomment deze code als je docxtpl wilt gebruiken:
-        
-        from docxtpl import DocxTemplate
-        
+        De template wordt één keer per proces geparsed en gecompileerd (en
+        opnieuw geladen als het bestand wijzigt); een render vult enkel de velden in.
+        """
         if not os.path.exists(self.template_path):
             raise FileNotFoundError(f"Template niet gevonden: {self.template_path}")
         
-        doc = DocxTemplate(self.template_path)
+        template = get_template(self.template_path)
         
         # Prepare context met alle velden
         context = self.prepare_data(form_data)
         
         # Render template
-        doc.render(context)
-        
-        # Save
-        doc.save(output_path)
+        with metrics.stage('template_render'):
+            template.render(context, output_path)
         
         return output_path
-        """
-        # Voor nu: gebruik simple generator
-        return self.generate_simple_contract(form_data, output_path)
     
     def prepare_data(self, form_data: Dict) -> Dict:
         """
@@ -247,26 +428,15 @@ class ContractGenerator:
         
         # Bereken saldo
         if 'prijs_totaal' in context and 'voorschot_bedrag' in context:
-            try:
-                prijs = float(context['prijs_totaal'])
-                voorschot = float(context['voorschot_bedrag'])
+            prijs = as_number(context['prijs_totaal'], None)
+            voorschot = as_number(context['voorschot_bedrag'], None)
+            if prijs is not None and voorschot is not None:
                 context['saldo_koopsom'] = f"{prijs - voorschot:.2f}"
-            except:
+            else:
                 context['saldo_koopsom'] = "0"
         
         # Zorg dat alle mogelijke velden bestaan (zelfs als leeg)
-        default_fields = [
-            'verkoper_naam', 'verkoper_voornaam', 'verkoper_adres',
-            'koper_naam', 'koper_voornaam', 'koper_adres',
-            'goed_straat', 'goed_nummer', 'goed_postcode', 'goed_gemeente',
-            'prijs_totaal', 'voorschot_bedrag', 'saldo_koopsom',
-            'epc_code', 'epc_label', 'epc_score', 'epc_datum',
-            'bodem_attest_referentie', 'bodem_attest_datum',
-            'notaris_verkoper', 'notaris_koper',
-            'makelaar_naam', 'aantal_exemplaren'
-        ]
-        
-        for field in default_fields:
+        for field in TEMPLATE_FIELDS:
             if field not in context:
                 context[field] = ""
         
@@ -285,11 +455,22 @@ class ContractGenerator:
                 'error': f'Template niet gevonden: {template_path}'
             }
         
-        # Voor nu: simpele check
+        try:
+            template = get_template(template_path)
+        except Exception as e:
+            return {
+                'valid': False,
+                'error': f'Template kan niet geladen worden: {e}'
+            }
+        
+        # Velden in de template die niet in prepare_data voorzien zijn
+        known_fields = set(self.prepare_data({}))
         return {
             'valid': True,
             'message': 'Template gevonden',
-            'path': template_path
+            'path': template_path,
+            'fields': sorted(template.variables),
+            'unknown_fields': sorted(template.variables - known_fields)
         }
 
 
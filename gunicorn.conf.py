@@ -0,0 +1,27 @@
+# gunicorn.conf.py
+"""
+Gunicorn configuratie (-c gunicorn.conf.py in railway.json en procfile)
+De app wordt in het master proces geladen en opgewarmd (backend/warmup.py)
+voor de workers geforkt worden: de workers delen de geïmporteerde modules,
+gecompileerde regexen en templates copy-on-write en zijn meteen gezond.
+Workers, threads en timeout staan in railway.json / Procfile.
+"""
+
+import time
+
+_started = time.perf_counter()
+
+# App laden in de master, zodat pre_fork hem kan opwarmen
+preload_app = True
+
+
+def pre_fork(server, worker):
+    from backend.api import warmup
+    from backend.warmup import format_report
+
+    if warmup.done:
+        return
+
+    report = warmup.run()
+    server.log.info(format_report(report))
+    server.log.info('Opstart tot eerste worker: %.1f ms', (time.perf_counter() - _started) * 1000)
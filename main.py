@@ -15,8 +15,11 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from flask import send_from_directory, send_file
-from backend.api import app, database
+from backend.api import app, database, documents, event_bus, extraction_cache, summary_cache, warmup
 from backend.database import ensure_directories
+from backend.fields import coerce
+from backend.validation import validate
+from backend.warmup import format_report
 
 # Create necessary directories
 ensure_directories()
@@ -227,14 +230,15 @@ def populate_demo_data():
         }
     }
     
-    database['contracts'][contract_id] = {
+    contract = {
         'id': contract_id,
         'created_at': datetime.now().isoformat(),
         'status': 'draft',
-        'form_data': demo_data,
-        'documents': demo_documents,
-        'validation': {}
+        'form_data': coerce(demo_data),
+        'documents': demo_documents
     }
+    contract['validation'] = validate(contract)
+    database.create_contract(contract)
     
     return jsonify({
         'success': True,
@@ -246,11 +250,16 @@ def populate_demo_data():
 def status():
     """System status endpoint"""
     from flask import jsonify
+    # Incrementele tellers: constante kost, onafhankelijk van het aantal contracten
     return jsonify({
         'status': 'online',
         'environment': os.getenv('RENDER', 'local'),
-        'contracts_count': len(database['contracts']),
-        'documents_count': sum(len(c.get('documents', {})) for c in database['contracts'].values()),
+        **database.get_statistics(),
+        'extraction_cache': extraction_cache.stats(),
+        'generated_documents': documents.stats(),
+        'summary_cache': summary_cache.stats(),
+        'events': event_bus.stats(),
+        'warmup': warmup.status(),
         'version': '1.0.0'
     })
 
@@ -269,5 +278,12 @@ if __name__ == '__main__':
     print(f"🔧 Environment: {os.getenv('RENDER_SERVICE_NAME', 'Local')}")
     print("=" * 70)
     
-    # CRITICAL: Gebruik threads voor deployment compatibility
-    app.run(host=host, port=port, debug=debug, threaded=True)
+    if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+        # Warmup in de lifespan startup van elke uvicorn worker
+        # Async modus (vereist uvicorn), zie asgi.py
+        import uvicorn
+        uvicorn.run('asgi:app', host=host, port=port, workers=int(os.getenv('WEB_CONCURRENCY', 1)))
+    else:
+        print(format_report(warmup.run()))
+        # CRITICAL: Gebruik threads voor deployment compatibility
+        app.run(host=host, port=port, debug=debug, threaded=True)